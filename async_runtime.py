@@ -0,0 +1,371 @@
+import asyncio
+import sys
+import time
+from collections import deque
+
+from call_trace import apply_record, INPUT_KINDS
+from dispatch_policy import make_policy
+from elevator_model import ELEVATOR_NUM, ELEVATOR_FLOORS, TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME, \
+    ElevatorState, MoveState, OuterTask, HallCallRegistry, StopSet, CarSnapshot, BankSnapshot, add_outer_target
+
+# 基于asyncio的电梯运行时
+# 与图形界面中的Elevator/Handler是同一套状态机（run、go_one_floor、door_operation、fault_tackle）
+# 但每台电梯是事件循环上的一个协程 不是一个线程：等待时挂在定时器上 有故障或开关门键时立即被唤醒
+# 不需要每台电梯一个线程 也不需要加锁 一个进程可以跑上千台电梯 不依赖PyQt
+
+HANDLER_RETRY_TIME = 100  # 仍有无法分配的任务时 handler隔多久再试一次 单位 毫秒
+
+
+# 每台电梯的状态 字段与图形界面的CarState相同
+class AsyncCar:
+    def __init__(self, elev_id):
+        self.elev_id = elev_id  # 电梯编号
+        self.state = ElevatorState.normal
+        self.cur_floor = 1
+        self.up_targets = StopSet()
+        self.down_targets = StopSet(descending=True)
+        self.is_open_button_clicked = False
+        self.is_close_button_clicked = False
+        self.move_state = MoveState.up
+        self.open_progress = 0.0
+        self.version = 0
+        # 正在等待的future 被唤醒时设为True 超时设为False
+        self.waiter = None
+
+    def snapshot(self):
+        # 只有一个线程 handler调度时不会让出事件循环 直接引用目标集合即可
+        return CarSnapshot(self.elev_id, self.version, self.state, self.cur_floor, self.move_state,
+                           self.up_targets, self.down_targets, self.open_progress,
+                           self.is_open_button_clicked, self.is_close_button_clicked)
+
+
+class AsyncBank:
+    def __init__(self, elevator_num=ELEVATOR_NUM, floors=ELEVATOR_FLOORS, time_per_floor=TIME_PER_FLOOR,
+                 opening_door_time=OPENING_DOOR_TIME, open_door_time=OPEN_DOOR_TIME, policy=None, speed=1.0):
+        self.elevator_num = elevator_num
+        self.floors = floors
+        self.time_per_floor = time_per_floor
+        self.opening_door_time = opening_door_time
+        self.open_door_time = open_door_time
+        self.policy = policy if policy is not None else make_policy("nearest")
+        self.speed = speed  # 倍速 为10时一秒钟跑完十秒钟的电梯运行
+
+        self.cars = [AsyncCar(i) for i in range(elevator_num)]
+        self.outer_requests = HallCallRegistry()
+        self.wait_times = []  # 每个外部任务从产生到完成所用的时间 单位 毫秒
+        self.wakeups = 0  # 电梯协程被唤醒的次数（包括定时器到期）
+        self.handler_passes = 0  # handler调度的次数
+
+        self.__loop = None
+        self.__start = 0.0
+        self.__handler_waiter = None
+        self.__handler_pending = False
+        self.__waiting = {}  # (楼层, 方向) -> 在该层等电梯的出行
+
+    # 从开始运行起经过的电梯时间 单位 毫秒
+    def now(self):
+        return (self.__loop.time() - self.__start) * 1000 * self.speed
+
+    # 等待timeout毫秒 或者被wake提前唤醒 返回(是否被唤醒, 实际等待的毫秒数)
+    # timeout为None时一直等到被唤醒
+    async def __wait(self, car, timeout):
+        start = self.__loop.time()
+        car.waiter = self.__loop.create_future()
+        timer = None
+        if timeout is not None:
+            timer = self.__loop.call_later(max(timeout, 0) / 1000 / self.speed, self.__resolve, car.waiter, False)
+        woken = await car.waiter
+        car.waiter = None
+        if timer is not None:
+            timer.cancel()
+        self.wakeups += 1
+        return woken, (self.__loop.time() - start) * 1000 * self.speed
+
+    @staticmethod
+    def __resolve(waiter, woken):
+        if not waiter.done():
+            waiter.set_result(woken)
+
+    # 有新目标、故障、开关门键时唤醒电梯 对应car.wakeup.wakeAll()
+    def wake(self, car):
+        if car.waiter is not None:
+            self.__resolve(car.waiter, True)
+
+    def wake_handler(self):
+        self.__handler_pending = True
+        if self.__handler_waiter is not None and not self.__handler_waiter.done():
+            self.__handler_waiter.set_result(True)
+
+    # 整组电梯的快照 可供界面轮询
+    def snapshot(self):
+        return BankSnapshot(sum(car.version for car in self.cars), tuple(car.snapshot() for car in self.cars),
+                            tuple(self.outer_requests.keys()))
+
+    # 以下几个函数对应图形界面中的各个按钮 与Simulation的接口相同 可以回放运行记录
+    def call_hall(self, floor, move_state):
+        if all(car.state == ElevatorState.fault for car in self.cars):
+            return None
+        task = self.outer_requests.add(floor, move_state, created_at=self.now())
+        if task is not None:
+            self.wake_handler()
+        return task
+
+    # 目的楼层派梯直接交给这台电梯的停靠 不经过handler
+    def call_assigned(self, elev_id, floor, move_state):
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.fault or not add_outer_target(OuterTask(floor, move_state), car.state,
+                                                                     car.cur_floor, car.up_targets, car.down_targets):
+            return False
+        car.version += 1
+        self.wake(car)
+        return True
+
+    def call_car(self, elev_id, floor):
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.fault or floor == car.cur_floor:
+            return
+        if floor > car.cur_floor:
+            car.up_targets.add(floor)
+        else:
+            car.down_targets.add(floor)
+        car.version += 1
+        self.wake(car)
+
+    def toggle_fault(self, elev_id):
+        car = self.cars[elev_id]
+        if car.state != ElevatorState.fault:
+            # 与模拟引擎相同 按下故障键时立即清除任务 即使电梯还没来得及醒来故障就又恢复了
+            self.fault_tackle(car)
+        else:
+            car.state = ElevatorState.normal
+            self.wake_handler()
+        car.version += 1
+        self.wake(car)
+
+    def press_open(self, elev_id):
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.closing_door or car.state == ElevatorState.open_door:
+            car.is_open_button_clicked = True
+            car.is_close_button_clicked = False
+            self.wake(car)
+
+    def press_close(self, elev_id):
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.opening_door or car.state == ElevatorState.open_door:
+            car.is_close_button_clicked = True
+            car.is_open_button_clicked = False
+            self.wake(car)
+
+    # 对应Elevator.go_one_floor 到达前被故障打断则返回
+    async def go_one_floor(self, car, move_state):
+        car.state = ElevatorState.going_up if move_state == MoveState.up else ElevatorState.going_down
+        car.version += 1
+        remaining = self.time_per_floor
+        while remaining > 0:
+            woken, waited = await self.__wait(car, remaining)
+            remaining -= waited
+            # 如果此时出故障了..
+            if car.state == ElevatorState.fault:
+                self.fault_tackle(car)
+                return
+            if not woken:
+                break
+
+        car.cur_floor += 1 if move_state == MoveState.up else -1
+        car.state = ElevatorState.normal
+        car.version += 1
+        # 电梯位置变了 之前分配不出去的任务也许可以分配了
+        self.wake_handler()
+
+    # 对应Elevator.door_operation 门正常关好则返回True 被故障打断则返回False
+    async def door_operation(self, car):
+        opening_time = 0.0  # 门打开的程度 单位 毫秒
+        open_time = 0.0  # 门完全打开后维持了多久
+        car.state = ElevatorState.opening_door
+        car.version += 1
+        while True:
+            if car.state == ElevatorState.fault:
+                self.fault_tackle(car)
+                return False
+
+            elif car.is_open_button_clicked:
+                # 门正在关上..
+                if car.state == ElevatorState.closing_door:
+                    car.state = ElevatorState.opening_door
+                # 门已经开了，延续开门时间
+                if car.state == ElevatorState.open_door:
+                    open_time = 0
+                car.is_open_button_clicked = False
+
+            elif car.is_close_button_clicked:
+                car.state = ElevatorState.closing_door
+                open_time = 0
+                car.is_close_button_clicked = False
+
+            # 等到当前阶段结束 或者中途被按钮、故障打断
+            state = car.state
+            if state == ElevatorState.opening_door:
+                woken, waited = await self.__wait(car, self.opening_door_time - opening_time)
+                opening_time = min(opening_time + waited, self.opening_door_time)
+                if not woken:
+                    opening_time = self.opening_door_time
+                    if car.state == state:
+                        car.state = ElevatorState.open_door
+            elif state == ElevatorState.open_door:
+                woken, waited = await self.__wait(car, self.open_door_time - open_time)
+                open_time += waited
+                if not woken and car.state == state:
+                    car.state = ElevatorState.closing_door
+            else:  # 门正在关闭
+                woken, waited = await self.__wait(car, opening_time)
+                opening_time = max(opening_time - waited, 0.0)
+                if not woken and car.state == state:
+                    # 门关好了
+                    car.open_progress = 0.0
+                    car.state = ElevatorState.normal
+                    car.version += 1
+                    return True
+            car.open_progress = opening_time / self.opening_door_time
+            car.version += 1
+
+    # 对应Elevator.fault_tackle
+    def fault_tackle(self, car):
+        car.state = ElevatorState.fault
+        car.open_progress = 0.0
+        car.is_open_button_clicked = False
+        car.is_close_button_clicked = False
+        # 把原先分配给它的任务交给handler重新分配
+        self.outer_requests.release_elevator(car.elev_id)
+        self.wake_handler()
+        car.up_targets.clear()
+        car.down_targets.clear()
+        car.version += 1
+
+    # 对应Elevator.finish_targets
+    def finish_targets(self, car, targets):
+        if targets:
+            targets.pop_first()
+        car.version += 1
+        for outer_task in self.outer_requests.finish_floor(car.cur_floor):
+            self.wait_times.append(self.now() - outer_task.created_at)
+            # 在这一层等这个方向的乘客上电梯 按下目的楼层
+            for trip in self.__waiting.pop((outer_task.target, outer_task.move_state), ()):
+                self.call_car(car.elev_id, trip.destination)
+        self.wake_handler()
+
+    # 对应Elevator.run
+    async def car_loop(self, car):
+        while True:
+            if car.state == ElevatorState.fault:
+                self.fault_tackle(car)
+                # 故障时无事可做 等到故障恢复再醒来
+                while car.state == ElevatorState.fault:
+                    await self.__wait(car, None)
+                continue
+
+            if car.move_state == MoveState.up:
+                targets, forward, other = car.up_targets, 1, car.down_targets
+            else:
+                targets, forward, other = car.down_targets, -1, car.up_targets
+            if targets:
+                if targets.first() == car.cur_floor:
+                    if await self.door_operation(car):
+                        self.finish_targets(car, targets)
+                    continue
+                elif (targets.first() - car.cur_floor) * forward > 0:
+                    await self.go_one_floor(car, car.move_state)
+                    continue
+            # 当运行方向上没有目标而出现反方向目标时 更换状态
+            elif other:
+                car.move_state = MoveState.down if car.move_state == MoveState.up else MoveState.up
+                car.version += 1
+                continue
+            # 没有可执行的任务时 等到有新目标或故障时再醒来
+            await self.__wait(car, None)
+
+    # 对应Handler.run
+    async def handler_loop(self):
+        while True:
+            while not self.__handler_pending:
+                self.__handler_waiter = self.__loop.create_future()
+                timer = None
+                if self.outer_requests.has_unassigned():
+                    timer = self.__loop.call_later(HANDLER_RETRY_TIME / 1000 / self.speed, self.__resolve,
+                                                   self.__handler_waiter, False)
+                woken = await self.__handler_waiter
+                self.__handler_waiter = None
+                if timer is not None:
+                    timer.cancel()
+                if not woken:
+                    break
+            self.__handler_pending = False
+            self.handler_passes += 1
+
+            if not self.outer_requests.has_unassigned():
+                continue
+            cars = [car.snapshot() for car in self.cars]
+            for outer_task, elev_id in self.policy.assign(cars, self.outer_requests.unassigned(), self.floors):
+                car = self.cars[elev_id]
+                if car.state != ElevatorState.fault and \
+                        add_outer_target(outer_task, car.state, car.cur_floor, car.up_targets, car.down_targets):
+                    self.outer_requests.assign(outer_task, elev_id)
+                    car.version += 1
+                    self.wake(car)
+
+    # 按出行的时刻依次按下外部按钮 乘客在电梯到达后上电梯并按下目的楼层
+    async def feed(self, trips):
+        for trip in trips:
+            delay = (trip.time - self.now()) / 1000 / self.speed
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.__waiting.setdefault((trip.origin, trip.move_state), deque()).append(trip)
+            self.call_hall(trip.origin, trip.move_state)
+
+    # 按记录中的时刻回放按钮 见call_trace.py
+    async def replay(self, records):
+        for record in records:
+            if record.kind not in INPUT_KINDS:
+                continue
+            delay = (record.time - self.now()) / 1000 / self.speed
+            if delay > 0:
+                await asyncio.sleep(delay)
+            apply_record(self, record)
+
+    # 运行duration毫秒（电梯时间）inputs为同时运行的输入协程 例如feed(trips)
+    async def run(self, duration, *inputs):
+        self.__loop = asyncio.get_running_loop()
+        self.__start = self.__loop.time()
+        tasks = [asyncio.ensure_future(self.car_loop(car)) for car in self.cars]
+        tasks.append(asyncio.ensure_future(self.handler_loop()))
+        tasks += [asyncio.ensure_future(coroutine) for coroutine in inputs]
+        await asyncio.sleep(duration / 1000 / self.speed)
+        for task in tasks:
+            task.cancel()
+        # 协程中途出错的话 在这里抛出 不要悄悄丢掉
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                raise result
+
+
+if __name__ == '__main__':
+    # 用法: python async_runtime.py [电梯数] [层数] [运行秒数] [倍速] [每小时出行次数]
+    from workload import UniformTraffic
+
+    elevator_num = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    floors = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 60
+    speed = float(sys.argv[4]) if len(sys.argv) > 4 else 10
+    rate = float(sys.argv[5]) if len(sys.argv) > 5 else elevator_num * 40
+
+    bank = AsyncBank(elevator_num, floors, speed=speed, policy=make_policy("eta"))
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    asyncio.run(bank.run(seconds * 1000, bank.feed(UniformTraffic(rate, floors, seed=0))))
+    wall = time.perf_counter() - start_wall
+    cpu = time.process_time() - start_cpu
+    print(elevator_num, "台电梯", floors, "层 运行", seconds, "秒 实际用时", round(wall, 2), "秒 CPU",
+          round(cpu, 2), "秒")
+    print("电梯被唤醒", bank.wakeups, "次 handler调度", bank.handler_passes, "次")
+    if bank.wait_times:
+        print("完成外部任务", len(bank.wait_times), "个 平均等待",
+              round(sum(bank.wait_times) / len(bank.wait_times) / 1000, 2), "秒")
@@ -0,0 +1,214 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from call_trace import TraceWriter
+from dispatch_cost import has_numpy
+from dispatch_policy import has_scipy, make_policy
+from elevator_model import TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME
+from sim_engine import Simulation
+from workload import HOUR, PATTERNS, DayTraffic
+
+# 调度和电梯逻辑的基准测试
+# 用标准的交通流量驱动模拟引擎 输出JSON 方便在不同提交之间比较
+# 用法: python benchmark.py [输出文件] [--quick] [--threaded 秒数] [--policy 调度策略]
+#       python benchmark.py compare 旧结果 新结果 [允许变差的比例]
+
+# 标准配置 (名称, 电梯数, 层数, 流量类型, 每小时出行次数, 小时数)
+# 流量类型为workload.PATTERNS中的一种 或者day表示一整天（此时出行次数为峰值）
+SUITE = [
+    ("5x20-up_peak", 5, 20, "up_peak", 900, 1),
+    ("5x20-lunch", 5, 20, "lunch", 900, 1),
+    ("5x20-down_peak", 5, 20, "down_peak", 900, 1),
+    ("5x20-day", 5, 20, "day", 1200, 24),
+    ("16x40-up_peak", 16, 40, "up_peak", 3000, 1),
+    ("16x40-lunch", 16, 40, "lunch", 3000, 1),
+    ("32x60-uniform", 32, 60, "uniform", 5000, 1),
+]
+# --quick时只跑这些
+QUICK_SUITE = ["5x20-up_peak", "5x20-lunch", "16x40-up_peak"]
+SEED = 2022
+
+# 结果中越小越好的指标 compare时检查这些
+LOWER_IS_BETTER = ["hall_wait.avg", "hall_wait.p95", "hall_wait.p99", "rider_wait.avg", "rider_wait.p95",
+                   "rider_wait.p99", "ride_time.avg", "ride_time.p95", "handler_cpu"]
+# 越大越好的指标
+HIGHER_IS_BETTER = ["calls_per_hour", "passengers_per_hour"]
+
+
+# 平均值和百分位数 单位 秒
+def summarize(times):
+    if not times:
+        return {"count": 0, "avg": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(times)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] / 1000
+
+    return {"count": len(ordered), "avg": sum(ordered) / len(ordered) / 1000, "p95": percentile(95),
+            "p99": percentile(99), "max": ordered[-1] / 1000}
+
+
+def make_traffic(pattern, rate, floors, hours, seed):
+    if pattern == "day":
+        return DayTraffic(rate, floors, seed)
+    return PATTERNS[pattern](rate, floors, seed, until=hours * HOUR)
+
+
+def run_case(name, elevator_num, floors, pattern, rate, hours, seed=SEED, trace_path=None, policy="nearest",
+             time_per_floor=TIME_PER_FLOOR, opening_door_time=OPENING_DOOR_TIME, open_door_time=OPEN_DOOR_TIME):
+    sim = Simulation(elevator_num, floors, time_per_floor, opening_door_time, open_door_time,
+                     make_policy(policy, time_per_floor, opening_door_time, open_door_time))
+    if trace_path is not None:
+        sim.trace = TraceWriter(trace_path)
+    sim.feed(make_traffic(pattern, rate, floors, hours, seed))
+    # numpy和scipy在第一次用到时才导入 先导入好 不算在调度时间里
+    has_numpy()
+    has_scipy()
+    start = time.perf_counter()
+    sim.run(until=hours * HOUR)
+    wall_time = time.perf_counter() - start
+    if sim.trace is not None:
+        sim.trace.close()
+    return {
+        "name": name, "elevators": elevator_num, "floors": floors, "pattern": pattern, "rate": rate,
+        "hours": hours, "seed": seed, "policy": policy, "time_per_floor": time_per_floor,
+        "opening_door_time": opening_door_time, "open_door_time": open_door_time,
+        "hall_wait": summarize(sim.wait_times),  # 外部按钮从按下到完成
+        "rider_wait": summarize(sim.rider_wait_times),  # 乘客从到达到上电梯
+        "ride_time": summarize(sim.ride_times),  # 乘客从上电梯到下电梯
+        "calls_per_hour": len(sim.wait_times) / hours,
+        "passengers_per_hour": len(sim.ride_times) / hours,
+        "unfinished_calls": len(sim.outer_requests),
+        "handler_cpu": sim.dispatch_cpu,  # 秒
+        "events": sim.events_processed,
+        "wall_time": wall_time,
+    }
+
+
+# 在多线程版本（elevator_core.py）中按实际时间回放一段记录 统计锁竞争和handler的CPU时间
+# 线程是死循环 因此放在子进程中运行 结束时直接退出
+def threaded_run(seconds, speed=1.0, policy="nearest"):
+    fd, trace_path = tempfile.mkstemp(suffix=".trc")
+    os.close(fd)
+    # 流量比标准配置大得多 让锁竞争更明显
+    run_case("threaded", 5, 20, "lunch", 7200, seconds * speed / 3600, trace_path=trace_path)
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "threaded-child", trace_path, str(seconds),
+                             str(speed), policy], stdout=subprocess.PIPE, check=True)
+    os.remove(trace_path)
+    return json.loads(result.stdout.decode().splitlines()[-1])
+
+
+def threaded_child(trace_path, seconds, speed, policy):
+    import elevator_core as core
+
+    core.clock.set_speed(speed)
+    handler, elevators = core.start(make_policy(policy))
+    core.TraceReplayer(trace_path).start()
+    time.sleep(seconds)
+
+    locks = [core.mutex, core.snapshot_mutex] + [car.lock for car in core.cars]
+    result = {
+        "seconds": seconds, "speed": speed, "policy": policy,
+        "handler_passes": handler.passes,
+        "handler_assigned": handler.assigned,
+        "handler_cpu": handler.cpu_time,
+        "dispatch_latency_avg": handler.total_latency / handler.assigned if handler.assigned else 0.0,  # 毫秒
+        "dispatch_latency_max": handler.max_latency,
+        "locks": [{"name": lock.name, "acquisitions": lock.acquisitions, "contended": lock.contended,
+                   "wait_ms": lock.wait_time} for lock in locks],
+    }
+    print(json.dumps(result))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(quick=False, threaded_seconds=0, policy="nearest"):
+    report = {"commit": current_commit(), "python": platform.python_version(), "policy": policy, "cases": []}
+    for case in SUITE:
+        if quick and case[0] not in QUICK_SUITE:
+            continue
+        result = run_case(*case, policy=policy)
+        report["cases"].append(result)
+        print(result["name"], "平均等待", round(result["hall_wait"]["avg"], 2), "秒 p99",
+              round(result["hall_wait"]["p99"], 2), "秒 用时", round(result["wall_time"], 2), "秒", file=sys.stderr)
+    if threaded_seconds:
+        report["threaded"] = threaded_run(threaded_seconds, policy=policy)
+    return report
+
+
+def metric(case, path):
+    value = case
+    for key in path.split("."):
+        value = value[key]
+    return value
+
+
+# 比较两次的结果 返回变差超过tolerance比例的指标
+def compare(old, new, tolerance=0.05):
+    regressions = []
+    old_cases = {case["name"]: case for case in old["cases"]}
+    for case in new["cases"]:
+        base = old_cases.get(case["name"])
+        if base is None:
+            continue
+        for path in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            before, after = metric(base, path), metric(case, path)
+            if before == 0:
+                continue
+            change = (after - before) / before
+            worse = change > tolerance if path in LOWER_IS_BETTER else change < -tolerance
+            # handler的CPU时间受机器负载影响较大 太小的值不比较
+            if path == "handler_cpu" and max(before, after) < 0.05:
+                worse = False
+            print(case["name"], path, round(before, 3), "->", round(after, 3),
+                  "(" + ("+" if change >= 0 else "") + str(round(change * 100, 1)) + "%)", "变差" if worse else "")
+            if worse:
+                regressions.append((case["name"], path, before, after))
+    return regressions
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args and args[0] == "threaded-child":
+        threaded_child(args[1], float(args[2]), float(args[3]), args[4])
+    elif args and args[0] == "compare":
+        with open(args[1]) as f:
+            old = json.load(f)
+        with open(args[2]) as f:
+            new = json.load(f)
+        regressions = compare(old, new, float(args[3]) if len(args) > 3 else 0.05)
+        print("共", len(regressions), "项指标变差")
+        sys.exit(1 if regressions else 0)
+    else:
+        quick = "--quick" in args
+        threaded_seconds = 0
+        if "--threaded" in args:
+            i = args.index("--threaded")
+            threaded_seconds = float(args[i + 1])
+            del args[i:i + 2]
+        policy = "nearest"
+        if "--policy" in args:
+            i = args.index("--policy")
+            policy = args[i + 1]
+            del args[i:i + 2]
+        args = [arg for arg in args if arg != "--quick"]
+        report = run_suite(quick, threaded_seconds, policy)
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if args:
+            with open(args[0], "w") as f:
+                f.write(output)
+        else:
+            print(output)
@@ -0,0 +1,183 @@
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+from enum import IntEnum
+
+from elevator_model import ElevatorState, MoveState
+
+# 运行记录（trace）
+# 记录每个外部按钮、内部按钮、故障键、开关门键、handler的分配、电梯到达楼层和门的每个阶段
+# 文件只追加写 开头是MAGIC 之后是定长的二进制记录 可以边读边回放 不需要整个读进内存
+
+MAGIC = b"ELVTRC1\n"
+# 每条记录: 时刻(毫秒) 类型 电梯编号 楼层 附加值
+RECORD = struct.Struct("<dBhhb")
+# 写文件的线程每次写入的记录数
+BATCH_SIZE = 4096
+
+
+class TraceKind(IntEnum):
+    hall_call = 1  # 外部上下键 附加值为方向
+    car_call = 2  # 内部数字键
+    fault = 3  # 故障键
+    open = 4  # 开门键
+    close = 5  # 关门键
+    assign = 6  # handler把外部任务分配给电梯 附加值为方向
+    arrive = 7  # 电梯到达楼层
+    door = 8  # 门进入新的阶段 附加值为ElevatorState
+    assigned_call = 9  # 目的楼层派梯直接交给某台电梯的停靠 不经过handler 附加值为方向
+
+
+# 由乘客产生的记录 回放时只重新施加这些 其余的由调度和电梯重新产生
+INPUT_KINDS = {TraceKind.hall_call, TraceKind.car_call, TraceKind.fault, TraceKind.open, TraceKind.close,
+               TraceKind.assigned_call}
+
+TraceRecord = namedtuple("TraceRecord", ["time", "kind", "elev_id", "floor", "arg"])
+
+
+# 带缓冲的记录器 record只把记录放进列表 攒够一批后交给后台线程打包写入文件
+# 可以被多个线程同时调用
+class TraceWriter:
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.records = 0  # 已记录的条数
+        self.__file = open(path, "ab")
+        if self.__file.tell() == 0:
+            self.__file.write(MAGIC)
+        self.__buffer = []
+        self.__lock = threading.Lock()
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__write_loop, name="trace-writer", daemon=True)
+        self.__thread.start()
+
+    def record(self, at, kind, elev_id=-1, floor=0, arg=0):
+        with self.__lock:
+            self.__buffer.append((at, kind, elev_id, floor, arg))
+            self.records += 1
+            if len(self.__buffer) >= self.batch_size:
+                self.__queue.put(self.__buffer)
+                self.__buffer = []
+
+    # 把缓冲中的记录交给写文件的线程
+    def flush(self):
+        with self.__lock:
+            if self.__buffer:
+                self.__queue.put(self.__buffer)
+                self.__buffer = []
+
+    def close(self):
+        self.flush()
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__file.close()
+
+    def __write_loop(self):
+        while True:
+            batch = self.__queue.get()
+            if batch is None:
+                return
+            self.__file.write(b"".join(RECORD.pack(*record) for record in batch))
+            self.__file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# 逐条读取记录 每次只读一批
+def read_trace(path, batch_size=BATCH_SIZE):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " 不是运行记录文件")
+        while True:
+            chunk = f.read(RECORD.size * batch_size)
+            # 写入时被中断的话 最后一条可能不完整 丢掉即可
+            chunk = chunk[:len(chunk) - len(chunk) % RECORD.size]
+            if not chunk:
+                return
+            for at, kind, elev_id, floor, arg in RECORD.iter_unpack(chunk):
+                yield TraceRecord(at, TraceKind(kind), elev_id, floor, arg)
+
+
+# 把一条乘客产生的记录施加到target上
+# target需要有call_hall/call_car/toggle_fault/press_open/press_close 例如Simulation
+def apply_record(target, record):
+    if record.kind == TraceKind.hall_call:
+        target.call_hall(record.floor, MoveState(record.arg))
+    elif record.kind == TraceKind.car_call:
+        target.call_car(record.elev_id, record.floor)
+    elif record.kind == TraceKind.fault:
+        target.toggle_fault(record.elev_id)
+    elif record.kind == TraceKind.open:
+        target.press_open(record.elev_id)
+    elif record.kind == TraceKind.close:
+        target.press_close(record.elev_id)
+    elif record.kind == TraceKind.assigned_call:
+        target.call_assigned(record.elev_id, record.floor, MoveState(record.arg))
+
+
+# 以最快速度回放到模拟引擎中 每条记录到期时才读取下一条
+class SimulationReplay:
+    def __init__(self, sim, records):
+        self.sim = sim
+        self.records = (record for record in records if record.kind in INPUT_KINDS)
+        self.__schedule_next()
+
+    def __schedule_next(self):
+        record = next(self.records, None)
+        if record is not None:
+            self.sim.inject(record.time, self.__fire, record)
+
+    def __fire(self, record):
+        apply_record(self.sim, record)
+        self.__schedule_next()
+
+
+# 按原来的时间间隔回放 speed为倍速 每条记录到期时调用handle(record)
+def replay_realtime(records, handle, speed=1.0):
+    start = time.perf_counter()
+    for record in records:
+        if record.kind not in INPUT_KINDS:
+            continue
+        delay = start + record.time / 1000 / speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        handle(record)
+
+
+def describe(record):
+    if record.kind in (TraceKind.hall_call, TraceKind.assign, TraceKind.assigned_call):
+        detail = str(record.floor) + "楼 " + MoveState(record.arg).name
+    elif record.kind == TraceKind.door:
+        detail = str(record.floor) + "楼 " + ElevatorState(record.arg).name
+    elif record.kind in (TraceKind.car_call, TraceKind.arrive):
+        detail = str(record.floor) + "楼"
+    else:
+        detail = ""
+    elevator = str(record.elev_id) + "号电梯 " if record.elev_id >= 0 else ""
+    return str(round(record.time, 1)) + " " + record.kind.name + " " + elevator + detail
+
+
+if __name__ == '__main__':
+    # 用法: python call_trace.py dump 记录文件      逐条输出记录
+    #       python call_trace.py replay 记录文件    以最快速度回放到模拟引擎中
+    command, path = sys.argv[1], sys.argv[2]
+    if command == "dump":
+        for record in read_trace(path):
+            print(describe(record))
+    elif command == "replay":
+        from sim_engine import Simulation
+        sim = Simulation()
+        SimulationReplay(sim, read_trace(path))
+        start = time.perf_counter()
+        sim.run()
+        print("回放到", round(sim.now / 1000, 1), "秒 用时", round(time.perf_counter() - start, 2), "秒 共处理",
+              sim.events_processed, "个事件")
+        if sim.wait_times:
+            print("完成外部任务", len(sim.wait_times), "个 平均等待",
+                  round(sum(sim.wait_times) / len(sim.wait_times) / 1000, 2), "秒")
@@ -0,0 +1,331 @@
+import json
+import struct
+import sys
+import time
+from array import array
+from collections import deque
+
+from dispatch_policy import POLICIES
+from elevator_model import ElevatorState, MoveState, StopSet
+from parking import IdleParking
+from passengers import DestinationDispatch
+from sim_engine import Simulation
+from workload import Trip
+
+# 模拟引擎的检查点
+# 把整组电梯的状态（包括正在运行到一半、门开到一半的电梯）、外部任务、等电梯和电梯里的乘客以及统计数据
+# 打包成紧凑的二进制 恢复只要几毫秒 可以先把模拟运行到高峰时段 再从同一个检查点分出多个不同的后续运行
+# 外部输入（出行流、random_traffic、回放）和运行记录不在检查点中 恢复后由调用方重新接上
+# 例如 sim.feed(UpPeak(rate, sim.floors, seed, start=sim.now))
+
+MAGIC = b"ELVCKP4\n"
+# 模拟的参数和时钟: 电梯数 层数 运行一层的时间 开门时间 门打开后维持的时间 当前时刻 已处理的事件数 调度的CPU时间
+HEADER = struct.Struct("<IIddddQd")
+# 乘客的统计: 载客量（-1为不限） 正在等电梯的人数 同时等电梯的最多人数 满载没上去的人次
+PASSENGERS = struct.Struct("<iQQQ")
+# 每台电梯: 状态 当前楼层 扫描方向 门已经打开的时间 动作开始的时刻 是否有动作 令牌 动作结束的时刻和序号 乘客数
+CAR = struct.Struct("<BIBdd?QdQI")
+# 电梯里的乘客: 出行的时刻 起点 终点 上电梯的时刻
+RIDER = struct.Struct("<dIId")
+# 外部任务: 楼层 方向 产生的时刻 分配到的电梯（-1为未分配）
+HALL_CALL = struct.Struct("<IBdi")
+# 在某层等电梯的乘客: 楼层 方向 人数 之后是每人的出行
+WAITING = struct.Struct("<IBI")
+# 空闲停靠: 层数 半衰期 最小比例 时段长度 权重为1的时刻 停靠次数 之后是各时段的权重和合计 再之后是派去停靠的楼层
+PARKING = struct.Struct("<IddQdQ")
+PARKED = struct.Struct("<II")
+# 目的楼层派梯分到某台电梯的乘客: 电梯编号 楼层 人数 之后是每人的出行
+ASSIGNED_WAITING = struct.Struct("<III")
+# 每5分钟送达的乘客数: 第几个5分钟 人数
+DELIVERED = struct.Struct("<QI")
+TRIP = struct.Struct("<dII")
+COUNT = struct.Struct("<I")
+
+
+def pack_str(text):
+    data = text.encode("utf-8")
+    return COUNT.pack(len(data)) + data
+
+
+# 目标楼层的位掩码 楼层很多时超过64位 按需要的字节数保存
+def pack_mask(mask):
+    data = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    return COUNT.pack(len(data)) + data
+
+
+def pack_floats(values):
+    return COUNT.pack(len(values)) + array("d", values).tobytes()
+
+
+# 空闲停靠学到的需求 没有则为一个0
+def pack_parking(parking):
+    if parking is None:
+        return COUNT.pack(0)
+    parts = [COUNT.pack(1), PARKING.pack(parking.floors, parking.half_life, parking.min_share, parking.slot,
+                                         parking.origin, parking.parks),
+             pack_floats([weight for weights in parking.weights for weight in weights]), pack_floats(parking.totals),
+             COUNT.pack(len(parking.parked))]
+    parts.extend(PARKED.pack(elev_id, floor) for elev_id, floor in parking.parked.items())
+    return b"".join(parts)
+
+
+def unpack_parking(reader):
+    if not reader.count():
+        return None
+    floors, half_life, min_share, slot, origin, parks = reader.unpack(PARKING)
+    parking = IdleParking(floors, half_life, min_share, slot)
+    parking.origin = origin
+    parking.parks = parks
+    weights = reader.floats()
+    size = len(parking.weights[0])
+    parking.weights = [weights[i:i + size] for i in range(0, len(weights), size)]
+    parking.totals = reader.floats()
+    for _ in range(reader.count()):
+        elev_id, floor = reader.unpack(PARKED)
+        parking.parked[elev_id] = floor
+    return parking
+
+
+# 把模拟引擎当前的状态打包为bytes
+def dumps(sim):
+    parts = [MAGIC, HEADER.pack(sim.elevator_num, sim.floors, sim.time_per_floor, sim.opening_door_time,
+                                sim.open_door_time, sim.now, sim.events_processed, sim.dispatch_cpu),
+             pack_str(sim.policy.name or ""),
+             # 调度策略的参数 例如分区数、每次调度的矩阵元素上限 恢复时按同样的参数重新创建
+             pack_str(json.dumps(sim.policy.params())),
+             PASSENGERS.pack(-1 if sim.capacity is None else sim.capacity, sim.waiting_now, sim.max_waiting,
+                             sim.left_behind)]
+    # 目的楼层派梯的楼层 没有则为0个
+    floors = [] if sim.destination_dispatch is None else sorted(sim.destination_dispatch.floors)
+    parts.append(COUNT.pack(len(floors)))
+    parts.extend(COUNT.pack(floor) for floor in floors)
+    parts.append(pack_parking(sim.parking))
+    for car in sim.cars:
+        parts.append(CAR.pack(car.state.value, car.cur_floor, car.move_state.value, car.door_level, car.phase_start,
+                              car.busy, car.token, car.due, car.due_seq, len(car.riders)))
+        parts.append(pack_mask(car.up_targets.mask))
+        parts.append(pack_mask(car.down_targets.mask))
+        parts.extend(RIDER.pack(trip.time, trip.origin, trip.destination, boarded_at)
+                     for trip, boarded_at in car.riders)
+
+    # 未分配的按加入的先后 已分配的按每台电梯分配的先后 恢复后handler看到的顺序与保存时相同
+    hall_calls = [(task, -1) for task in sim.outer_requests.unassigned()]
+    for car in sim.cars:
+        hall_calls.extend((task, car.elev_id) for task in sim.outer_requests.assigned_to(car.elev_id))
+    parts.append(COUNT.pack(len(hall_calls)))
+    parts.extend(HALL_CALL.pack(task.target, task.move_state.value, task.created_at, elev_id)
+                 for task, elev_id in hall_calls)
+
+    waiting = [(key, trips) for key, trips in sim.waiting.items() if trips]
+    parts.append(COUNT.pack(len(waiting)))
+    for (floor, move_state), trips in waiting:
+        parts.append(WAITING.pack(floor, move_state.value, len(trips)))
+        parts.extend(TRIP.pack(*trip) for trip in trips)
+
+    assigned_waiting = [(key, trips) for key, trips in sim.assigned_waiting.items() if trips]
+    parts.append(COUNT.pack(len(assigned_waiting)))
+    for (elev_id, floor), trips in assigned_waiting:
+        parts.append(ASSIGNED_WAITING.pack(elev_id, floor, len(trips)))
+        parts.extend(TRIP.pack(*trip) for trip in trips)
+
+    parts.append(COUNT.pack(len(sim.delivered)))
+    parts.extend(DELIVERED.pack(interval, count) for interval, count in sim.delivered.items())
+
+    for values in (sim.wait_times, sim.rider_wait_times, sim.ride_times):
+        parts.append(pack_floats(values))
+    return b"".join(parts)
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def count(self):
+        return self.unpack(COUNT)[0]
+
+    def bytes(self):
+        size = self.count()
+        data = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return bytes(data)
+
+    def mask(self):
+        return int.from_bytes(self.bytes(), "little")
+
+    def floats(self):
+        values = array("d")
+        size = self.count() * values.itemsize
+        values.frombytes(self.data[self.offset:self.offset + size])
+        self.offset += size
+        return values.tolist()
+
+
+# 从dumps的结果恢复出一个新的模拟引擎 policy不给则按保存时的名字和参数重新创建调度策略
+def loads(data, policy=None):
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("不是检查点")
+    reader = Reader(data)
+    reader.offset = len(MAGIC)
+    elevator_num, floors, time_per_floor, opening_door_time, open_door_time, now, events_processed, dispatch_cpu = \
+        reader.unpack(HEADER)
+    policy_name = reader.bytes().decode("utf-8")
+    policy_params = json.loads(reader.bytes().decode("utf-8"))
+    if policy is None:
+        policy = POLICIES[policy_name or "nearest"](**policy_params)
+    capacity, waiting_now, max_waiting, left_behind = reader.unpack(PASSENGERS)
+    sim = Simulation(elevator_num, floors, time_per_floor, opening_door_time, open_door_time, policy,
+                     None if capacity < 0 else capacity)
+    sim.now = now
+    sim.events_processed = events_processed
+    sim.dispatch_cpu = dispatch_cpu
+    sim.waiting_now = waiting_now
+    sim.max_waiting = max_waiting
+    sim.left_behind = left_behind
+    dispatch_floors = [reader.count() for _ in range(reader.count())]
+    if dispatch_floors:
+        sim.destination_dispatch = DestinationDispatch(dispatch_floors, time_per_floor, opening_door_time,
+                                                       open_door_time)
+    sim.parking = unpack_parking(reader)
+
+    for car in sim.cars:
+        state, car.cur_floor, move_state, car.door_level, car.phase_start, car.busy, car.token, car.due, \
+            car.due_seq, rider_num = reader.unpack(CAR)
+        car.state = ElevatorState(state)
+        car.move_state = MoveState(move_state)
+        car.up_targets = StopSet.from_mask(reader.mask())
+        car.down_targets = StopSet.from_mask(reader.mask(), descending=True)
+        for _ in range(rider_num):
+            at, origin, destination, boarded_at = reader.unpack(RIDER)
+            car.riders.append((Trip(at, origin, destination), boarded_at))
+
+    for _ in range(reader.count()):
+        floor, move_state, created_at, elev_id = reader.unpack(HALL_CALL)
+        task = sim.outer_requests.add(floor, MoveState(move_state), created_at=created_at)
+        if elev_id >= 0:
+            sim.outer_requests.assign(task, elev_id)
+
+    for _ in range(reader.count()):
+        floor, move_state, trip_num = reader.unpack(WAITING)
+        sim.waiting[(floor, MoveState(move_state))] = deque(Trip(*reader.unpack(TRIP)) for _ in range(trip_num))
+
+    for _ in range(reader.count()):
+        elev_id, floor, trip_num = reader.unpack(ASSIGNED_WAITING)
+        sim.assigned_waiting[(elev_id, floor)] = deque(Trip(*reader.unpack(TRIP)) for _ in range(trip_num))
+        sim.cars[elev_id].assigned += trip_num
+
+    for _ in range(reader.count()):
+        interval, count = reader.unpack(DELIVERED)
+        sim.delivered[interval] = count
+
+    sim.wait_times = reader.floats()
+    sim.rider_wait_times = reader.floats()
+    sim.ride_times = reader.floats()
+    sim.resume_cars()
+    return sim
+
+
+def save(sim, path):
+    with open(path, "wb") as f:
+        f.write(dumps(sim))
+
+
+def load(path, policy=None):
+    with open(path, "rb") as f:
+        return loads(f.read(), policy)
+
+
+# 从sim当前的状态分出一个独立的模拟引擎 两者之后互不影响
+def fork(sim, policy=None):
+    return loads(dumps(sim), policy)
+
+
+# 模拟中可以比较的状态 时钟、统计、每台电梯（含乘客）、外部任务和等电梯的乘客
+def sim_state(sim):
+    return (sim.now, sim.wait_times, sim.rider_wait_times, sim.ride_times, sim.left_behind, sim.delivered,
+            [(car.state, car.cur_floor, car.move_state, car.up_targets.mask, car.down_targets.mask, car.door_level,
+              car.busy, car.riders, car.assigned) for car in sim.cars],
+            sorted((task.target, task.move_state.value, task.created_at, task.elevator if task.elevator is not None
+                    else -1) for task in sim.outer_requests),
+            {key: list(trips) for key, trips in sim.waiting.items() if trips},
+            {key: list(trips) for key, trips in sim.assigned_waiting.items() if trips})
+
+
+# 检查点的自检: 在运行到一半（电梯正在运行、开关门）时分出一个副本 两者接上同样的出行再运行hours小时
+# 中途让一台电梯故障再恢复 最后比较两者的状态 返回是否相同
+def check_fork(sim, traffic, hours):
+    from workload import HOUR
+
+    branch = fork(sim)
+    if sim_state(branch) != sim_state(sim):
+        return False
+    end = sim.now + hours * HOUR
+    for s in (sim, branch):
+        s.feed(traffic(s.now, end))
+        s.inject(s.now + hours * HOUR / 3, s.toggle_fault, 1)
+        s.inject(s.now + hours * HOUR / 2, s.toggle_fault, 1)
+        s.run(until=end)
+    return sim_state(branch) == sim_state(sim)
+
+
+if __name__ == '__main__' and sys.argv[1:2] == ["--check"]:
+    # 用法: python checkpoint.py --check
+    # 各种调度策略（含非默认的参数）、载客量、目的楼层派梯和空闲停靠的组合 分别检查分出的运行与不中断的运行完全相同
+    # 不同时以状态1退出
+    from dispatch_policy import BatchPolicy, EtaPolicy, NearestCar, ZoningPolicy
+    from workload import HOUR, LunchPeak, UpPeak
+
+    failed = 0
+    for policy in [NearestCar, EtaPolicy, lambda: ZoningPolicy(zones=3, zone_penalty=3000),
+                   lambda: BatchPolicy(max_batch=8, max_cells=256)]:
+        for capacity, destination, parking in [(None, False, False), (8, True, True), (12, False, True)]:
+            sim = Simulation(8, 30, policy=policy(), capacity=capacity)
+            if destination:
+                sim.destination_dispatch = DestinationDispatch()
+            if parking:
+                sim.parking = IdleParking(30)
+            sim.feed(UpPeak(3000, 30, seed=1, until=0.3 * HOUR + 1234.5))
+            sim.run(until=0.3 * HOUR + 1234.5)
+            same = check_fork(sim, lambda start, until: LunchPeak(4000, 30, seed=2, start=start, until=until), 1)
+            failed += not same
+            print(sim.policy.name, sim.policy.params(), "载客量", capacity, "目的楼层派梯" if destination else "",
+                  "空闲停靠" if parking else "", "相同" if same else "不同!")
+    sys.exit(1 if failed else 0)
+
+elif __name__ == '__main__':
+    # 用法: python checkpoint.py 检查点文件 [预热小时数] [峰值每小时出行次数] [分出的运行数] [之后运行的小时数]
+    # 以工作日交通从0点运行到预热小时数（默认8.5 即早高峰中间）后保存检查点
+    # 再从检查点分出几个运行 每个接上不同随机种子的早高峰出行 比较它们的等待时间
+    from workload import HOUR, DayTraffic, UpPeak
+
+    path = sys.argv[1]
+    warm_up = float(sys.argv[2]) if len(sys.argv) > 2 else 8.5
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 1200
+    forks = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    hours = float(sys.argv[5]) if len(sys.argv) > 5 else 0.5
+
+    sim = Simulation()
+    sim.feed(DayTraffic(rate, sim.floors, seed=0))
+    start = time.perf_counter()
+    sim.run(until=warm_up * HOUR)
+    print("预热", warm_up, "小时 用时", round(time.perf_counter() - start, 2), "秒")
+
+    start = time.perf_counter()
+    save(sim, path)
+    print("保存检查点", len(dumps(sim)), "字节 用时", round((time.perf_counter() - start) * 1000, 2), "毫秒")
+
+    for seed in range(forks):
+        start = time.perf_counter()
+        branch = load(path)
+        restore_time = time.perf_counter() - start
+        waited = len(branch.wait_times)
+        branch.feed(UpPeak(rate, branch.floors, seed=seed + 1, start=branch.now, until=branch.now + hours * HOUR))
+        branch.run(until=branch.now + hours * HOUR)
+        wait_times = branch.wait_times[waited:]
+        print("分支", seed, "恢复用时", round(restore_time * 1000, 2), "毫秒 之后完成外部任务", len(wait_times),
+              "个 平均等待", round(sum(wait_times) / max(len(wait_times), 1) / 1000, 2), "秒")
@@ -0,0 +1,351 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+import elevator_core
+from dispatch_policy import make_policy
+from elevator_core import clock, event_log, registry, call_halls, call_car, toggle_fault, press_open, press_close
+from elevator_model import ELEVATOR_NUM, ELEVATOR_FLOORS, MoveState
+
+# 无界面运行时的本地控制接口 供楼宇管理系统的集成测试等外部程序驱动电梯
+# 监听TCP或Unix套接字 每行一个JSON 一行可以是一条命令 也可以是一批命令组成的数组
+#   {"op": "hall_call", "floor": 3, "dir": "up"}     楼层的上行/下行键
+#   {"op": "car_call", "car": 0, "floor": 7}         电梯内部的数字键
+#   {"op": "fault", "car": 1}                        故障键 再按一次恢复
+#   {"op": "open", "car": 0} / {"op": "close", "car": 0}
+#   {"op": "subscribe", "interval": 50}              之后每隔interval毫秒（实际时间）推送有变化的电梯状态
+# 每批处理完回复一行 {"type": "ack", "id": 批次的id, "done": 成功的条数, "errors": [[下标, 原因], ...]}
+# 格式不对的命令、所有电梯故障时的外部按钮、故障电梯的数字键和开关门键都算出错 连接不会因此断开
+# 批次可以写成 {"id": 1, "commands": [...]} 以便对应回复
+# 一批中连续的外部按钮只加一次锁 按钮都只短暂持有各自的锁 状态从快照读取 不会拖慢电梯的运行
+# 用法见文件末尾
+
+DEFAULT_ADDRESS = ("127.0.0.1", 8765)
+STREAM_INTERVAL = 50  # 默认的状态推送间隔 单位 毫秒
+
+DIRECTIONS = {"up": MoveState.up, "down": MoveState.down}
+
+
+class CommandError(ValueError):
+    pass
+
+
+# bool也是int的子类 true/false不能当作数字
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def parse_floor(command):
+    floor = command.get("floor")
+    if not is_int(floor) or not 1 <= floor <= ELEVATOR_FLOORS:
+        raise CommandError("楼层应为1到" + str(ELEVATOR_FLOORS))
+    return floor
+
+
+def parse_car(command):
+    elev_id = command.get("car")
+    if not is_int(elev_id) or not 0 <= elev_id < ELEVATOR_NUM:
+        raise CommandError("电梯编号应为0到" + str(ELEVATOR_NUM - 1))
+    return elev_id
+
+
+def parse_hall_call(command):
+    floor = parse_floor(command)
+    direction = command.get("dir")
+    # 数组、对象不能作为字典的键 先检查类型
+    move_state = DIRECTIONS.get(direction) if isinstance(direction, str) else None
+    if move_state is None:
+        raise CommandError("方向应为up或down")
+    # 1楼只能向上 顶楼只能向下
+    if (floor == ELEVATOR_FLOORS and move_state == MoveState.up) or (floor == 1 and move_state == MoveState.down):
+        raise CommandError("该楼层没有这个方向的按钮")
+    return floor, move_state
+
+
+# 其余命令 op -> 检查参数并按下按钮的函数 按钮返回False表示电梯故障而不接受
+BUTTONS = {
+    "car_call": lambda command: call_car(parse_car(command), parse_floor(command)),
+    "fault": lambda command: toggle_fault(parse_car(command)),
+    "open": lambda command: press_open(parse_car(command)),
+    "close": lambda command: press_close(parse_car(command)),
+}
+
+
+# 电梯快照转为JSON
+def car_to_json(car):
+    return {"car": car.elev_id, "version": car.version, "state": car.state.name, "floor": car.cur_floor,
+            "move": car.move_state.name, "up": list(car.up_targets), "down": list(car.down_targets),
+            "door": car.open_progress}
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.send_lock = threading.Lock()  # 回复和状态推送来自两个线程
+        self.closed = threading.Event()
+        self.streamer = None
+
+    def send(self, message):
+        data = (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self.send_lock:
+            self.wfile.write(data)
+
+    def handle(self):
+        server = self.server
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            batch_id = None
+            try:
+                message = json.loads(line)
+            except ValueError:
+                self.send({"type": "ack", "id": None, "done": 0, "errors": [[-1, "不是JSON"]]})
+                continue
+            if isinstance(message, dict) and "commands" in message:
+                batch_id = message.get("id")
+                commands = message["commands"]
+            elif isinstance(message, list):
+                commands = message
+            else:
+                commands = [message]
+            if not isinstance(commands, list):
+                self.send({"type": "ack", "id": batch_id, "done": 0, "errors": [[-1, "commands应为数组"]]})
+                continue
+            done, errors = self.apply(commands)
+            server.batch_counter.inc()
+            server.command_counter.inc(done)
+            self.send({"type": "ack", "id": batch_id, "done": done, "errors": errors})
+
+    # 按顺序执行一批命令 连续的外部按钮攒起来一次按下 返回(成功的条数, 出错的命令)
+    def apply(self, commands):
+        done = 0
+        errors = []
+        hall_calls = []
+        hall_indexes = []  # 攒起来的外部按钮在这一批中的下标
+        for i, command in enumerate(commands):
+            try:
+                if not isinstance(command, dict):
+                    raise CommandError("命令应为JSON对象")
+                op = command.get("op")
+                if not isinstance(op, str):
+                    raise CommandError("op应为字符串")
+                if op == "hall_call":
+                    hall_calls.append(parse_hall_call(command))
+                    hall_indexes.append(i)
+                    continue
+                if hall_calls:
+                    done += self.press_halls(hall_calls, hall_indexes, errors)
+                    hall_calls = []
+                    hall_indexes = []
+                if op == "subscribe":
+                    self.subscribe(command.get("interval", STREAM_INTERVAL))
+                elif op in BUTTONS:
+                    if not BUTTONS[op](command):
+                        raise CommandError("电梯出现故障 不接受这个按钮")
+                else:
+                    raise CommandError("未知的命令" + str(op))
+                done += 1
+            except CommandError as e:
+                errors.append([i, str(e)])
+        if hall_calls:
+            done += self.press_halls(hall_calls, hall_indexes, errors)
+        errors.sort()
+        return done, errors
+
+    # 按下攒起来的外部按钮 所有电梯均已故障时它们都算出错 返回成功的条数
+    @staticmethod
+    def press_halls(hall_calls, indexes, errors):
+        if call_halls(hall_calls):
+            return len(hall_calls)
+        errors.extend([i, "所有电梯均已故障"] for i in indexes)
+        return 0
+
+    def subscribe(self, interval):
+        if not isinstance(interval, (int, float)) or isinstance(interval, bool) or interval <= 0:
+            raise CommandError("推送间隔应为正数")
+        self.interval = interval
+        if self.streamer is None:
+            self.streamer = threading.Thread(target=self.stream, name="control-stream", daemon=True)
+            self.streamer.start()
+
+    # 每隔interval毫秒检查一次快照 只推送版本变了的电梯 外部任务变了时附上全部外部任务
+    # 第一次推送全部电梯
+    def stream(self):
+        last = None
+        while not self.closed.wait(self.interval / 1000):
+            snapshot = elevator_core.bank_snapshot
+            if last is not None and last.version == snapshot.version:
+                continue
+            message = {"type": "state", "version": snapshot.version, "time": clock.now()}
+            message["cars"] = [car_to_json(car) for i, car in enumerate(snapshot.cars)
+                               if last is None or last.cars[i].version != car.version]
+            if last is None or last.hall_calls is not snapshot.hall_calls:
+                message["hall_calls"] = [[floor, move_state.name] for floor, move_state in snapshot.hall_calls]
+            last = snapshot
+            try:
+                self.send(message)
+            except OSError:
+                return
+
+    def finish(self):
+        self.closed.set()
+        super().finish()
+
+
+class ControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        super().__init__(address, ControlHandler)
+        add_counters(self)
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class UnixControlServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, path):
+            super().__init__(path, ControlHandler)
+            add_counters(self)
+
+        def server_close(self):
+            super().server_close()
+            os.remove(self.server_address)
+
+
+def add_counters(server):
+    server.batch_counter = registry.counter("elevator_control_batches", "控制接口收到的批次数")
+    server.command_counter = registry.counter("elevator_control_commands", "控制接口执行的命令数")
+
+
+# address为(主机, 端口)或Unix套接字的路径 在后台线程中开始服务 返回服务器
+def serve(address=DEFAULT_ADDRESS):
+    if isinstance(address, str):
+        server = UnixControlServer(address)
+    else:
+        server = ControlServer(address)
+    threading.Thread(target=server.serve_forever, name="control-server", daemon=True).start()
+    return server
+
+
+# 简单的客户端 用于测试和压测
+class ControlClient:
+    def __init__(self, address=DEFAULT_ADDRESS):
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+
+    def send(self, commands, batch_id=None):
+        message = {"id": batch_id, "commands": commands}
+        self.sock.sendall((json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8"))
+
+    # 读取一行回复或推送 连接关闭时返回None
+    def receive(self):
+        line = self.rfile.readline()
+        return json.loads(line) if line else None
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+def parse_address(text):
+    if ":" in text:
+        host, port = text.rsplit(":", 1)
+        return host, int(port)
+    return text
+
+
+# 以batch_size条一批发送count条随机的外部按钮和内部按钮 不等回复 另一个线程读取回复
+# 返回(每秒命令数, 最后一批从发送到收到回复的时间 单位 毫秒)
+def load_test(address, count, batch_size):
+    import random
+    if count < 1 or batch_size < 1:
+        raise ValueError("命令数和每批条数应为正整数")
+    client = ControlClient(address)
+    batches = (count + batch_size - 1) // batch_size
+    received = threading.Event()
+    acked = []
+
+    def read_acks():
+        while len(acked) < batches:
+            message = client.receive()
+            if message is None:
+                break
+            if message["type"] == "ack":
+                acked.append(message)
+        received.set()
+
+    threading.Thread(target=read_acks, daemon=True).start()
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for i in range(batches):
+        commands = []
+        for _ in range(min(batch_size, count - i * batch_size)):
+            if rng.random() < 0.3:
+                floor = rng.randint(1, ELEVATOR_FLOORS - 1)
+                commands.append({"op": "hall_call", "floor": floor, "dir": "up"})
+            else:
+                commands.append({"op": "car_call", "car": rng.randrange(ELEVATOR_NUM),
+                                 "floor": rng.randint(1, ELEVATOR_FLOORS)})
+        if i == batches - 1:
+            last_sent = time.perf_counter()
+        client.send(commands, i)
+    received.wait()
+    elapsed = time.perf_counter() - start
+    client.close()
+    return count / elapsed, (time.perf_counter() - last_sent) * 1000
+
+
+if __name__ == '__main__':
+    # 用法: python control_server.py [--listen 主机:端口|Unix套接字路径] [--seconds 运行秒数] [--speed 倍速]
+    #                                [--policy 调度策略] [--log 日志文件]
+    #       python control_server.py load [主机:端口|Unix套接字路径] [命令数] [每批条数]
+    # 第一种不打开界面启动电梯和handler 在--listen上提供控制接口 默认127.0.0.1:8765 不给--seconds则一直运行
+    # 第二种向正在运行的服务器发送随机按钮 输出每秒处理的命令数
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        address = parse_address(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_ADDRESS
+        count = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+        batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else 100
+        if count < 1 or batch_size < 1:
+            sys.exit("命令数和每批条数应为正整数\n"
+                     "用法: python control_server.py load [主机:端口|Unix套接字路径] [命令数] [每批条数]")
+        rate, latency = load_test(address, count, batch_size)
+        print("每秒", round(rate), "条命令 最后一批的回复延迟", round(latency, 2), "毫秒")
+        sys.exit()
+
+    options = {}
+    for option in ["--listen", "--seconds", "--speed", "--policy", "--log"]:
+        if option in sys.argv:
+            i = sys.argv.index(option)
+            options[option] = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+    if "--speed" in options:
+        clock.set_speed(float(options["--speed"]))
+    if "--log" in options:
+        event_log.set_file(options["--log"])
+
+    handler, elevators = elevator_core.start(make_policy(options.get("--policy", "nearest")))
+    server = serve(parse_address(options["--listen"]) if "--listen" in options else DEFAULT_ADDRESS)
+    print("控制接口", server.server_address)
+    try:
+        if "--seconds" in options:
+            time.sleep(float(options["--seconds"]))
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    server.server_close()
+    event_log.close()
+    print("执行命令", server.command_counter.value, "条 共", server.batch_counter.value, "批")
+    print(handler.report())
+    print(elevator_core.lock_report())
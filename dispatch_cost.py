@@ -0,0 +1,219 @@
+from elevator_model import MoveState, ElevatorState, calc_distance
+
+# handler的距离计算
+# 任务和电梯都很多时（上百台电梯、上千个任务）用numpy一次算出所有任务到所有电梯的距离
+# 结果与逐个调用calc_distance完全相同
+
+# numpy是可选的 没有安装时退回逐个计算
+# 导入numpy要100毫秒左右 第一次需要距离矩阵时才导入 规模小的运行不必付出这个开销
+numpy = None
+numpy_checked = False
+
+
+def has_numpy():
+    global numpy, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy
+        except ImportError:
+            pass
+    return numpy is not None
+
+
+# 任务数×电梯数不小于这个值时才用numpy 规模太小时numpy的固定开销反而更大
+VECTORIZE_MIN_SIZE = 2048
+
+
+# 每台电梯到各个任务的距离缓存 做法与dispatch_policy.EtaCache相同
+# calc_distance只取决于电梯的出发楼层、扫描方向和这个方向上最远的任务楼层 开关门、途中加入更近的目标时都不变
+# 以这几个量为键 没变时同一楼层同一方向的任务直接查表 每台电梯只保留当前的一张表
+class DistanceCache:
+    def __init__(self):
+        # 电梯编号 -> [上次查询的快照, 键, {楼层×2+是否向上: 距离}]
+        self.__tables = {}
+        self.hits = 0
+        self.misses = 0
+
+    # 这台电梯当前的表 同一个快照对象（一次调度中的各个任务）不必再算键
+    def __table(self, car):
+        entry = self.__tables.get(car.elev_id)
+        if entry is not None and entry[0] is car:
+            return entry[2]
+        origin = car.cur_floor
+        if car.state == ElevatorState.going_up:
+            origin += 1
+        elif car.state == ElevatorState.going_down:
+            origin -= 1
+        targets = car.up_targets if car.move_state == MoveState.up else car.down_targets
+        key = (origin, car.move_state, targets.last() if targets else -1)
+        if entry is None or entry[1] != key:
+            entry = self.__tables[car.elev_id] = [car, key, {}]
+        entry[0] = car
+        return entry[2]
+
+    # 与calc_distance相同 car为没有故障的电梯的快照
+    def lookup(self, car, outer_task):
+        table = self.__table(car)
+        # 用整数作键 枚举的哈希比较慢
+        task_key = outer_task.target * 2 + (outer_task.move_state is MoveState.up)
+        distance = table.get(task_key)
+        if distance is not None:
+            self.hits += 1
+            return distance
+        self.misses += 1
+        distance = table[task_key] = calc_distance(outer_task, car.state, car.cur_floor, car.move_state,
+                                                   car.up_targets, car.down_targets)
+        return distance
+
+
+# 逐个调用calc_distance 与原来Handler.run中的两重循环相同 给了cache时查缓存
+class ScalarDistances:
+    def __init__(self, tasks, cars, floors, cache=None):
+        self.tasks = tasks
+        self.cars = list(cars)
+        self.floors = floors
+        self.cache = cache
+
+    # 第k个任务距离最短的电梯编号 找不到则为-1
+    def nearest(self, k):
+        outer_task = self.tasks[k]
+        min_distance = self.floors + 1
+        target_id = -1
+        for car in self.cars:
+            # 符合要求的电梯，必须没有故障
+            if car.state == ElevatorState.fault:
+                continue
+            if self.cache is not None:
+                distance = self.cache.lookup(car, outer_task)
+            else:
+                distance = calc_distance(outer_task, car.state, car.cur_floor, car.move_state,
+                                         car.up_targets, car.down_targets)
+            # 寻找最小值
+            if distance < min_distance:
+                min_distance = distance
+                target_id = car.elev_id
+        return target_id
+
+    # 某台电梯分配到任务后 换成它新的快照
+    def update_car(self, car):
+        self.cars[car.elev_id] = car
+
+
+# 用numpy一次算出所有任务到所有电梯的距离矩阵 行为任务 列为电梯
+class DistanceMatrix:
+    def __init__(self, tasks, cars, floors):
+        self.floors = floors
+        self.task_floor = numpy.array([task.target for task in tasks], dtype=numpy.int64)
+        self.task_up = numpy.array([task.move_state == MoveState.up for task in tasks])
+        self.distances = self.__distances(self.task_floor[:, None], self.task_up[:, None],
+                                          *(numpy.array(column) for column in zip(*map(self.__car_columns, cars))))
+        self.__next_row = 0  # 之前的任务已经分配过了 更新某台电梯时只需要重算后面的行
+
+    # 一台电梯参与计算的几个量：出发楼层 是否向上扫描 运行方向上是否有任务 最远的任务楼层 是否故障
+    @staticmethod
+    def __car_columns(car):
+        # 如果已经上行/下行了 就设成已经到达目的地的楼层了
+        origin = car.cur_floor
+        if car.state == ElevatorState.going_up:
+            origin += 1
+        elif car.state == ElevatorState.going_down:
+            origin -= 1
+        move_up = car.move_state == MoveState.up
+        targets = car.up_targets if move_up else car.down_targets
+        return origin, move_up, len(targets) > 0, targets.last() if targets else 0, car.state == ElevatorState.fault
+
+    # 与calc_distance相同的规则 参数可以是任意能广播的数组
+    def __distances(self, task_floor, task_up, origin, move_up, has_targets, farthest, fault):
+        # 如果电梯运行方向无任务，或者电梯朝着按键所在楼层而来且运行方向与理想方向相同 则直接算绝对值
+        coming = (move_up == task_up) & numpy.where(task_up, task_floor >= origin, task_floor <= origin)
+        direct = numpy.logical_not(has_targets) | coming
+        # 其余情况则算最远任务楼层到目标楼层的绝对值和最远楼层到当前电梯楼层的绝对值之和
+        distances = numpy.where(direct, numpy.abs(origin - task_floor),
+                                numpy.abs(origin - farthest) + numpy.abs(task_floor - farthest))
+        # 故障的电梯不参与
+        return numpy.where(fault, self.floors + 1, distances)
+
+    def nearest(self, k):
+        self.__next_row = k + 1
+        row = self.distances[k]
+        target_id = int(row.argmin())  # 有多个最小值时取编号最小的 与逐个比较时相同
+        return target_id if row[target_id] < self.floors + 1 else -1
+
+    def update_car(self, car):
+        rows = slice(self.__next_row, None)
+        self.distances[rows, car.elev_id] = self.__distances(self.task_floor[rows], self.task_up[rows],
+                                                             *self.__car_columns(car))
+
+
+# 任务数×电梯数较大且装有numpy时用距离矩阵 否则逐个计算（给了cache时查缓存）
+def distance_table(tasks, cars, floors, cache=None):
+    if len(tasks) * len(cars) >= VECTORIZE_MIN_SIZE and has_numpy():
+        return DistanceMatrix(tasks, cars, floors)
+    return ScalarDistances(tasks, cars, floors, cache)
+
+
+# 随机生成一组电梯的快照 各台电梯的状态、楼层、方向和上下行目标都随机 有的电梯故障
+def random_bank(rng, elevator_num, floors):
+    from elevator_model import LOBBY, CarSnapshot, StopSet
+
+    cars = []
+    for elev_id in range(elevator_num):
+        state = rng.choice(list(ElevatorState))
+        if state == ElevatorState.going_up:
+            cur_floor = rng.randint(LOBBY, floors - 1)
+        elif state == ElevatorState.going_down:
+            cur_floor = rng.randint(LOBBY + 1, floors)
+        else:
+            cur_floor = rng.randint(LOBBY, floors)
+        up = StopSet(rng.sample(range(cur_floor + 1, floors + 1), rng.randint(0, min(3, floors - cur_floor))))
+        down = StopSet(rng.sample(range(LOBBY, cur_floor), rng.randint(0, min(3, cur_floor - LOBBY))),
+                       descending=True)
+        cars.append(CarSnapshot(elev_id, 0, state, cur_floor, rng.choice(list(MoveState)), up, down, 0, False,
+                                False))
+    return cars
+
+
+if __name__ == '__main__':
+    # 用法: python dispatch_cost.py [组数] [电梯数] [层数] [任务数] [随机种子]
+    # 在随机的电梯组和任务上 按nearest策略的顺序逐个分配任务 比较逐个计算、查缓存和numpy距离矩阵选出的电梯
+    # 三者的分配必须完全相同 不同时输出第一处不同并以状态1退出
+    import random
+    import sys
+    from dispatch_policy import tentative_assign
+    from elevator_model import LOBBY, OuterTask
+
+    banks = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    elevator_num = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    floors = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+    task_num = int(sys.argv[4]) if len(sys.argv) > 4 else 200
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+    if not has_numpy():
+        print("没有安装numpy 无法比较")
+        sys.exit(1)
+
+    rng = random.Random(seed)
+    cache = DistanceCache()
+    assigned = 0
+    for bank in range(banks):
+        cars = random_bank(rng, elevator_num, floors)
+        tasks = [OuterTask(rng.randint(LOBBY, floors), rng.choice(list(MoveState))) for _ in range(task_num)]
+        tables = [ScalarDistances(tasks, cars, floors), ScalarDistances(tasks, cars, floors, cache),
+                  DistanceMatrix(tasks, cars, floors)]
+        current = list(cars)
+        for k, outer_task in enumerate(tasks):
+            chosen = [table.nearest(k) for table in tables]
+            if len(set(chosen)) != 1:
+                print("第", bank, "组 第", k, "个任务", outer_task.target, outer_task.move_state.name,
+                      "逐个计算/缓存/矩阵选出的电梯不同:", chosen)
+                sys.exit(1)
+            if chosen[0] == -1:
+                continue
+            car = tentative_assign(current[chosen[0]], outer_task)
+            if car is not None:
+                current[car.elev_id] = car
+                for table in tables:
+                    table.update_car(car)
+                assigned += 1
+    print(banks, "组", elevator_num, "台", floors, "层 每组", task_num, "个任务 分配相同 共分配", assigned, "个",
+          "缓存命中", cache.hits, "次 未命中", cache.misses, "次")
@@ -0,0 +1,384 @@
+import time
+
+from dispatch_cost import DistanceCache, distance_table
+from elevator_model import TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME, LOBBY, ElevatorState, MoveState, \
+    add_outer_target, can_add_outer_target
+
+# handler的调度策略
+# 策略只读取电梯的快照和未分配的外部任务 返回分配方案[(任务, 电梯编号), ...]
+# 真正的分配仍由handler（或模拟引擎）在电梯的锁下完成 因此策略不需要关心加锁
+# 图形界面和模拟引擎都可以通过--policy选择策略
+
+
+# scipy是可选的 没有安装时用下面的匈牙利算法
+# 导入scipy.optimize要好几百毫秒 只有创建BatchPolicy时才导入
+linear_sum_assignment = None
+scipy_checked = False
+
+
+def has_scipy():
+    global linear_sum_assignment, scipy_checked
+    if not scipy_checked:
+        scipy_checked = True
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except ImportError:
+            pass
+    return linear_sum_assignment is not None
+
+
+# 不能分配时的代价 用一个很大的有限值 避免inf参与运算
+INFEASIBLE = 1e12
+
+
+# 假设把任务交给这台电梯 返回分配后的快照 电梯不能接受则返回None
+# 只修改快照中目标集合的副本 不影响真正的电梯
+def tentative_assign(car, outer_task):
+    up = car.up_targets.copy()
+    down = car.down_targets.copy()
+    if not add_outer_target(outer_task, car.state, car.cur_floor, up, down):
+        return None
+    return car._replace(up_targets=up, down_targets=down)
+
+
+# 每台电梯的预计到达时间缓存
+# 电梯的位置、方向和目标只在到达、按键、分配和故障时才变 handler每次调度却要把每个任务对每台电梯重算一遍
+# 以电梯的状态（运行状态 楼层 扫描方向 上下行目标）为键 状态没变时同一个外部任务直接查表
+# 每台电梯只保留当前状态的一张表 状态一变整张表作废 表中的项在第一次用到时才计算
+class EtaCache:
+    def __init__(self, eta):
+        self.eta = eta  # eta(快照, 任务) 见EtaPolicy.eta
+        # 电梯编号 -> [上次查询的快照, 状态, {楼层×2+是否向上: 预计到达时间 不能接受为None}]
+        self.__tables = {}
+        self.hits = 0
+        self.misses = 0
+
+    # 这台电梯当前状态的表 同一个快照对象（一次调度中的各个任务）不必再比较状态
+    def __table(self, car):
+        entry = self.__tables.get(car.elev_id)
+        if entry is not None and entry[0] is car:
+            return entry[2]
+        key = (car.state, car.cur_floor, car.move_state, car.up_targets.mask, car.down_targets.mask)
+        if entry is None or entry[1] != key:
+            entry = self.__tables[car.elev_id] = [car, key, {}]
+        entry[0] = car
+        return entry[2]
+
+    # 把任务交给这台电梯后到达任务楼层所需的时间 car为还没有加入任务的快照 电梯不能接受则返回None
+    def lookup(self, car, outer_task):
+        table = self.__table(car)
+        # 用整数作键 枚举的哈希比较慢
+        task_key = outer_task.target * 2 + (outer_task.move_state is MoveState.up)
+        eta = table.get(task_key, -1)
+        if eta != -1:
+            self.hits += 1
+            return eta
+        self.misses += 1
+        if can_add_outer_target(outer_task, car.state, car.cur_floor, car.up_targets, car.down_targets):
+            eta = table[task_key] = self.eta(car, outer_task)
+        else:
+            eta = table[task_key] = None
+        return eta
+
+
+class DispatchPolicy:
+    name = None
+
+    # cars为按编号排列的CarSnapshot tasks为按加入顺序排列的未分配任务 floors为楼层数
+    def assign(self, cars, tasks, floors):
+        raise NotImplementedError
+
+    # 构造函数的参数 POLICIES[name](**params())得到同样的策略 检查点中保存这些参数
+    def params(self):
+        return {}
+
+
+# 原来的最近电梯规则：按顺序给每个任务挑选距离最短的电梯 距离见calc_distance
+# 任务不多时逐个比较 每台电梯的距离查DistanceCache 见dispatch_cost.py
+class NearestCar(DispatchPolicy):
+    name = "nearest"
+
+    def __init__(self):
+        self.cache = DistanceCache()
+
+    def assign(self, cars, tasks, floors):
+        cars = list(cars)
+        distances = distance_table(tasks, cars, floors, self.cache)
+        assignments = []
+        for k, outer_task in enumerate(tasks):
+            target_id = distances.nearest(k)
+            # 假如找到了 对应添加任务..
+            if target_id != -1:
+                car = tentative_assign(cars[target_id], outer_task)
+                if car is not None:
+                    cars[target_id] = car
+                    distances.update_car(car)
+                    assignments.append((outer_task, target_id))
+        return assignments
+
+
+# 按预计到达时间分配：沿着电梯的扫描路线 算上途中每一次停靠的开关门时间
+# 同样按顺序逐个分配 每分配一个任务 这台电梯的路线上就多了一站
+class EtaPolicy(DispatchPolicy):
+    name = "eta"
+
+    def __init__(self, time_per_floor=TIME_PER_FLOOR, opening_door_time=OPENING_DOOR_TIME,
+                 open_door_time=OPEN_DOOR_TIME):
+        self.time_per_floor = time_per_floor
+        self.opening_door_time = opening_door_time
+        self.open_door_time = open_door_time
+        # 每停靠一次所需的时间 开门 维持 关门
+        self.stop_time = 2 * opening_door_time + open_door_time
+        self.cache = EtaCache(self.eta)
+
+    def params(self):
+        return {"time_per_floor": self.time_per_floor, "opening_door_time": self.opening_door_time,
+                "open_door_time": self.open_door_time}
+
+    # 电梯接受任务后到达任务楼层所需的时间 单位 毫秒
+    # 任务楼层总是加入它所在方向的目标中 而下面只数途中（不含任务楼层）的停靠
+    # 所以car加入任务前后算出的结果相同 不需要先生成加入任务后的快照
+    def eta(self, car, outer_task):
+        target = outer_task.target
+        origin = car.cur_floor
+        if car.state == ElevatorState.going_up:
+            origin += 1
+        elif car.state == ElevatorState.going_down:
+            origin -= 1
+        up, down = car.up_targets, car.down_targets
+        # 任务在哪个方向上处理 与add_outer_target的规则相同
+        upward = target > car.cur_floor or (target == car.cur_floor and outer_task.move_state == MoveState.up)
+
+        # 门正在开关时 当前楼层还在目标中 按一次完整的停靠估计
+        if upward:
+            if car.move_state == MoveState.up or not down:
+                floors = abs(target - origin)
+                stops = up.count_range(origin, target - 1)
+            else:
+                # 先向下走完所有下行目标 再掉头向上
+                turn = down.last()
+                floors = abs(origin - turn) + target - turn
+                stops = len(down) + up.count_range(turn, target - 1)
+        else:
+            if car.move_state == MoveState.down or not up:
+                floors = abs(origin - target)
+                stops = down.count_range(target + 1, origin)
+            else:
+                # 先向上走完所有上行目标 再掉头向下
+                turn = up.last()
+                floors = abs(turn - origin) + turn - target
+                stops = len(up) + down.count_range(target + 1, turn)
+        return floors * self.time_per_floor + stops * self.stop_time
+
+    # 把任务交给这台电梯的代价 越小越好 car为还没有加入任务的快照 电梯不能接受则返回None
+    def cost(self, car, outer_task, floors):
+        return self.cache.lookup(car, outer_task)
+
+    def assign(self, cars, tasks, floors):
+        cars = list(cars)
+        assignments = []
+        for outer_task in tasks:
+            best_cost = None
+            best_car = None
+            for car in cars:
+                # 符合要求的电梯，必须没有故障
+                if car.state == ElevatorState.fault:
+                    continue
+                cost = self.cost(car, outer_task, floors)
+                if cost is None:
+                    continue
+                # 代价相同时取编号最小的
+                if best_cost is None or cost < best_cost:
+                    best_cost = cost
+                    best_car = car
+            if best_car is not None:
+                cars[best_car.elev_id] = tentative_assign(best_car, outer_task)
+                assignments.append((outer_task, best_car.elev_id))
+        return assignments
+
+
+# 分区调度 适合早高峰：把大堂以上的楼层平均分成若干区 每台电梯负责一个区
+# 大堂的任务交给预计到达时间最短的电梯 其余楼层的任务优先交给负责该区的电梯
+# 负责的电梯太远（比别的电梯慢zone_penalty毫秒以上）或故障时才交给别的电梯
+class ZoningPolicy(EtaPolicy):
+    name = "zoning"
+
+    def __init__(self, zones=None, zone_penalty=6000, time_per_floor=TIME_PER_FLOOR,
+                 opening_door_time=OPENING_DOOR_TIME, open_door_time=OPEN_DOOR_TIME):
+        super().__init__(time_per_floor, opening_door_time, open_door_time)
+        self.zones = zones  # 分区数 不给则每台电梯一个区
+        self.zone_penalty = zone_penalty
+        self.__car_num = 1
+
+    def params(self):
+        return dict(super().params(), zones=self.zones, zone_penalty=self.zone_penalty)
+
+    # 大堂以上没有楼层时（floors <= LOBBY）只有一个区
+    def zone_of_floor(self, floor, floors):
+        if floors <= LOBBY:
+            return 0
+        zones = self.zones or self.__car_num
+        return (floor - LOBBY - 1) * zones // (floors - LOBBY)
+
+    def zone_of_car(self, elev_id):
+        return elev_id % (self.zones or self.__car_num)
+
+    def cost(self, car, outer_task, floors):
+        cost = super().cost(car, outer_task, floors)
+        if cost is not None and outer_task.target != LOBBY and \
+                self.zone_of_car(car.elev_id) != self.zone_of_floor(outer_task.target, floors):
+            cost += self.zone_penalty
+        return cost
+
+    def assign(self, cars, tasks, floors):
+        self.__car_num = len(cars)
+        return super().assign(cars, tasks, floors)
+
+
+# 最小代价的指派 cost为n行m列的代价矩阵 返回每一行分到的列（没有分到为-1）
+# 每一列最多分给一行 行数多于列数时多出来的行分不到
+def min_cost_assignment(cost):
+    if not cost or not cost[0]:
+        return [-1] * len(cost)
+    if has_scipy():
+        rows, columns = linear_sum_assignment(cost)
+        result = [-1] * len(cost)
+        for i, j in zip(rows, columns):
+            result[i] = int(j)
+        return result
+    if len(cost) > len(cost[0]):
+        transposed = hungarian([list(column) for column in zip(*cost)])
+        result = [-1] * len(cost)
+        for j, i in enumerate(transposed):
+            result[i] = j
+        return result
+    return hungarian(cost)
+
+
+# 匈牙利算法 要求行数不多于列数 复杂度为O(行数^2×列数)
+def hungarian(cost):
+    n, m = len(cost), len(cost[0])
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)  # 每一列分到的行 从1开始编号 0表示没有
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        min_v = [float("inf")] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            u_i0 = u[i0]
+            delta = float("inf")
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = row[j - 1] - u_i0 - v[j]
+                    if reduced < min_v[j]:
+                        min_v[j] = reduced
+                        way[j] = j0
+                    if min_v[j] < delta:
+                        delta = min_v[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_v[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    result = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            result[p[j] - 1] = j - 1
+    return result
+
+
+# 成批分配：每一轮把最早的若干个任务和所有电梯一起求最小总预计到达时间的指派
+# 每台电梯每轮最多分到一个任务 分完后更新它的路线再进行下一轮
+# 每次调度最多计算max_cells个代价矩阵的元素 用完后剩下的任务留到下一次调度 调度延迟与积压的任务数无关
+# 元素数是确定的 模拟引擎中回放、检查点的分支和基准测试的结果与机器快慢无关
+# 多线程的handler还可以再给一个实际时间的预算budget 构造矩阵时就检查 超出后同样留到下一次
+class BatchPolicy(EtaPolicy):
+    name = "batch"
+
+    def __init__(self, budget=None, max_batch=64, max_cells=2048, time_per_floor=TIME_PER_FLOOR,
+                 opening_door_time=OPENING_DOOR_TIME, open_door_time=OPEN_DOOR_TIME):
+        super().__init__(time_per_floor, opening_door_time, open_door_time)
+        self.budget = budget  # 每次调度的时间预算 单位 秒 不给则只按max_cells限制
+        self.max_batch = max_batch  # 每一轮参与指派的任务数上限
+        self.max_cells = max_cells  # 每次调度计算的代价矩阵元素数上限
+        self.rounds = 0  # 已求解的指派轮数
+        self.deferred = 0  # 用完预算而把任务留到下一次调度的次数
+        # 导入scipy要几百毫秒 在创建时导入 不算在第一次调度里
+        has_scipy()
+
+    def params(self):
+        return dict(super().params(), budget=self.budget, max_batch=self.max_batch, max_cells=self.max_cells)
+
+    def assign(self, cars, tasks, floors):
+        deadline = None if self.budget is None else time.perf_counter() + self.budget
+        cars = list(cars)
+        pending = list(tasks)
+        assignments = []
+        cells = self.max_cells
+        while pending:
+            if cells <= 0:
+                self.deferred += 1
+                break
+            # 电梯多于max_cells时每次也至少分配一个任务
+            size = min(self.max_batch, len(pending), max(1, cells // max(len(cars), 1)))
+            # cost[i][j]为把第i个任务交给第j台电梯的代价 真正选中时才生成分配后的快照
+            cost = []
+            for outer_task in pending[:size]:
+                if deadline is not None and time.perf_counter() > deadline:
+                    break
+                cost.append([self.__matrix_cost(car, outer_task, floors) for car in cars])
+            if not cost:
+                self.deferred += 1
+                break
+            batch = pending[:len(cost)]
+            cells -= len(cost) * len(cars)
+            self.rounds += 1
+
+            assigned = set()
+            for i, j in enumerate(min_cost_assignment(cost)):
+                if j != -1 and cost[i][j] < INFEASIBLE:
+                    cars[j] = tentative_assign(cars[j], batch[i])
+                    assignments.append((batch[i], j))
+                    assigned.add(i)
+            if not assigned:
+                break
+            pending = [outer_task for i, outer_task in enumerate(batch) if i not in assigned] + pending[len(batch):]
+        return assignments
+
+    def __matrix_cost(self, car, outer_task, floors):
+        if car.state == ElevatorState.fault:
+            return INFEASIBLE
+        cost = self.cost(car, outer_task, floors)
+        return INFEASIBLE if cost is None else cost
+
+
+POLICIES = {
+    "nearest": NearestCar,
+    "eta": EtaPolicy,
+    "zoning": ZoningPolicy,
+    "batch": BatchPolicy,
+}
+
+
+def make_policy(name, time_per_floor=TIME_PER_FLOOR, opening_door_time=OPENING_DOOR_TIME,
+                open_door_time=OPEN_DOOR_TIME):
+    if name == "nearest":
+        return NearestCar()
+    return POLICIES[name](time_per_floor=time_per_floor, opening_door_time=opening_door_time,
+                          open_door_time=open_door_time)
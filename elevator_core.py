@@ -0,0 +1,777 @@
+import sys
+import threading
+import time
+
+# 电梯的数据模型和handler的距离计算
+from call_trace import INPUT_KINDS, TraceKind, TraceWriter, apply_record, read_trace
+from dispatch_policy import make_policy
+from elevator_model import ELEVATOR_NUM, ELEVATOR_FLOORS, TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME, \
+    ElevatorState, MoveState, OuterTask, OuterTaskState, HallCallRegistry, StopSet, CarSnapshot, BankSnapshot, add_outer_target
+from event_log import EventLog
+from metrics import MetricsExporter, MetricsRegistry
+from sim_clock import SimClock
+
+# 多线程版本的电梯和handler 不依赖PyQt 可以在没有显示环境的机器上运行
+# 每台电梯和handler各一个线程 按模拟时钟运行 按钮由call_hall/call_car/toggle_fault/press_open/press_close按下
+# 图形界面（elevator_simulator.py）只是在这之上画出快照、把点击交给这些函数
+# 单独运行时回放一段运行记录 见文件末尾的用法
+
+HANDLER_RETRY_TIME = 100  # 仍有无法分配的任务时 handler隔多久再试一次 单位 毫秒（模拟时间）
+
+# 模拟时钟 电梯运行、开关门、handler重试、运行记录和界面上门的动画都按它计时 见sim_clock.py
+clock = SimClock()
+
+# 运行指标 锁、handler、每台电梯各状态的时间和界面每帧用时 启动时给了--metrics则定期写入文件 见metrics.py
+registry = MetricsRegistry()
+
+# 事件日志 电梯、handler和按钮的消息都记在这里 界面的输出框只显示最近的RING_SIZE条 见event_log.py
+event_log = EventLog(clock.now)
+
+
+# 带等待时间和持有时间统计的互斥锁 用于比较不同加锁方式下的锁竞争
+# 在条件变量上等待时要用self.wait 等待的时间不算持有
+class TimedMutex:
+    def __init__(self, name):
+        self.name = name
+        self.__lock = threading.Lock()
+        self.acquisitions = 0  # 加锁次数
+        self.contended = 0  # 需要等待的次数
+        self.wait_time = 0.0  # 累计等待时间 单位 毫秒
+        self.__locked_at = 0.0
+        self.__wait_histogram = registry.histogram("elevator_lock_wait_seconds", "拿不到锁时的等待时间", lock=name)
+        self.__hold_histogram = registry.histogram("elevator_lock_hold_seconds", "每次持有锁的时间", lock=name)
+
+    def lock(self):
+        # 先试一下 拿不到再计时等待
+        if not self.__lock.acquire(False):
+            start = time.perf_counter()
+            self.__lock.acquire()
+            self.__locked_at = time.perf_counter()
+            waited = self.__locked_at - start
+            self.wait_time += waited * 1000
+            self.contended += 1
+            self.__wait_histogram.observe(waited)
+        else:
+            self.__locked_at = time.perf_counter()
+        self.acquisitions += 1
+
+    def unlock(self):
+        self.__hold_histogram.observe(time.perf_counter() - self.__locked_at)
+        self.__lock.release()
+
+    # 与这把锁配合使用的条件变量 唤醒（notify_all）时需已持有这把锁
+    def condition(self):
+        return threading.Condition(self.__lock)
+
+    # 在condition上等待 等待期间放开锁 timeout为实际时间 单位 毫秒 不给则一直等到被唤醒
+    # 超时返回False
+    def wait(self, condition, timeout=None):
+        self.__hold_histogram.observe(time.perf_counter() - self.__locked_at)
+        woken = condition.wait(None if timeout is None else timeout / 1000)
+        self.__locked_at = time.perf_counter()
+        return woken
+
+    def report(self):
+        return self.name + ": 加锁" + str(self.acquisitions) + "次 等待" + str(self.contended) + "次 共" + \
+            str(round(self.wait_time, 3)) + "毫秒"
+
+
+# 每台电梯的状态 由自己的锁保护
+class CarState:
+    def __init__(self, elev_id):
+        self.elev_id = elev_id  # 电梯编号
+        self.lock = TimedMutex(str(elev_id) + "号电梯")
+        # 有新目标、故障或恢复时唤醒电梯 与self.lock配合使用
+        self.wakeup = self.lock.condition()
+        self.state = ElevatorState.normal  # 电梯的状态 默认正常
+        self.cur_floor = 1  # 当前楼层 默认在1楼
+        self.up_targets = StopSet()  # 当前需要向上运行处理的目标有哪些
+        self.down_targets = StopSet(descending=True)  # 当前需要向下运行处理的目标有哪些
+        # 内部的开门/关门键是否被按（True/False） 默认开门关门键没按
+        self.is_open_button_clicked = False
+        self.is_close_button_clicked = False
+        self.move_state = MoveState.up  # 扫描运行状态 默认向上（一开始在1楼 只能向上咯
+        self.open_progress = 0.0  # 开门的进度条 范围为0-1的浮点数 默认门没开
+        self.version = 0  # 每发布一次快照加一
+        # 上一次记录下来的楼层和状态 用于在运行记录中只记下到达楼层和门的阶段变化
+        self.traced_floor = self.cur_floor
+        self.traced_state = self.state
+        # 每种状态下累计的模拟时间 单位 秒 用于统计利用率
+        self.state_seconds = {state: registry.counter("elevator_car_state_seconds", "电梯在各状态下的模拟时间",
+                                                      car=elev_id, state=state.name) for state in ElevatorState}
+        self.timed_state = self.state
+        self.state_since = clock.now()
+
+    def snapshot(self):
+        return CarSnapshot(self.elev_id, self.version, self.state, self.cur_floor, self.move_state,
+                           self.up_targets.copy(), self.down_targets.copy(), self.open_progress,
+                           self.is_open_button_clicked, self.is_close_button_clicked, clock.now())
+
+    # 状态变化后发布新的快照并返回 调用时需已持有self.lock
+    def publish(self):
+        self.version += 1
+        snapshot = self.snapshot()
+        publish_car(snapshot)
+        if self.state != self.timed_state:
+            self.count_state_time(snapshot.updated_at)
+        if trace is not None:
+            self.trace_changes()
+        return snapshot
+
+    # 把上一种状态下停留的时间记入指标 调用时需已持有self.lock
+    def count_state_time(self, now):
+        self.state_seconds[self.timed_state].inc((now - self.state_since) / 1000)
+        self.timed_state = self.state
+        self.state_since = now
+
+    def trace_changes(self):
+        if self.cur_floor != self.traced_floor:
+            record_trace(TraceKind.arrive, self.elev_id, self.cur_floor)
+        if self.state != self.traced_state and (self.state in DOOR_STATES or self.traced_state in DOOR_STATES):
+            record_trace(TraceKind.door, self.elev_id, self.cur_floor, self.state.value)
+        self.traced_floor = self.cur_floor
+        self.traced_state = self.state
+
+
+DOOR_STATES = (ElevatorState.opening_door, ElevatorState.open_door, ElevatorState.closing_door)
+
+# 运行记录 启动时给了--trace才记录 见call_trace.py 记录中的时刻为模拟时间
+trace = None
+
+
+def record_trace(kind, elev_id=-1, floor=0, arg=0):
+    if trace is not None:
+        trace.record(clock.now(), kind, elev_id, floor, arg)
+
+
+# 一些全局变量
+# 外部按钮产生的需求
+outer_requests = HallCallRegistry()
+# 每台电梯的状态
+cars = [CarState(i) for i in range(ELEVATOR_NUM)]
+
+# mutex互斥锁 保护outer_requests
+# 加锁顺序：需要同时持有时 先拿电梯自己的锁 再拿mutex
+mutex = TimedMutex("外部任务")
+
+# 当前的快照 整体替换而不修改 读的一方直接拿这个引用即可
+bank_snapshot = BankSnapshot(0, tuple(car.snapshot() for car in cars), ())
+# 只用于串行化快照的发布 持有时间极短
+snapshot_mutex = TimedMutex("快照发布")
+
+
+def publish_car(car_snapshot):
+    global bank_snapshot
+    snapshot_mutex.lock()
+    snapshots = list(bank_snapshot.cars)
+    snapshots[car_snapshot.elev_id] = car_snapshot
+    bank_snapshot = BankSnapshot(bank_snapshot.version + 1, tuple(snapshots), bank_snapshot.hall_calls)
+    snapshot_mutex.unlock()
+
+
+# 外部任务变化后发布新的快照 调用时需已持有mutex
+def publish_hall_calls():
+    global bank_snapshot
+    hall_calls = tuple(outer_requests.keys())
+    snapshot_mutex.lock()
+    bank_snapshot = BankSnapshot(bank_snapshot.version + 1, bank_snapshot.cars, hall_calls)
+    snapshot_mutex.unlock()
+
+
+# 所有锁的等待时间报告
+def lock_report():
+    return "\n".join(lock.report() for lock in [mutex, snapshot_mutex] + [car.lock for car in cars])
+
+
+# handler的唤醒条件 与mutex配合使用
+# 有新的外部任务、任务完成或电梯状态变化时唤醒handler
+handler_wakeup = mutex.condition()
+# handler是否有待处理的事件
+handler_pending = False
+
+
+# 空闲电梯的停靠 设为parking.IdleParking时 电梯没有任务时开往需求大的楼层 由mutex保护
+parking = None
+
+
+# 没有任务的电梯由parking决定是否开往别的楼层停靠 加入了目标则返回True 调用时需已持有car.lock
+def park(car):
+    if parking is None:
+        return False
+    mutex.lock()
+    floor = parking.choose(car.elev_id, bank_snapshot.cars, clock.now())
+    mutex.unlock()
+    if floor is None:
+        return False
+    if floor > car.cur_floor:
+        car.up_targets.add(floor)
+    else:
+        car.down_targets.add(floor)
+    car.publish()
+    event_log.log("park", car.elev_id, car.elev_id, "号电梯空闲 开往", floor, "楼停靠")
+    return True
+
+
+# 通知handler重新调度 调用时需已持有mutex
+def wake_handler():
+    global handler_pending
+    handler_pending = True
+    handler_wakeup.notify_all()
+
+
+class Elevator(threading.Thread):
+    def __init__(self, elev_id):
+        super().__init__(name="elevator-" + str(elev_id), daemon=True)  # 父类构造函数
+        self.elev_id = elev_id  # 电梯编号
+        self.car = cars[elev_id]  # 电梯的状态
+        self.wakeups = 0  # 被唤醒（包括等待超时）的次数
+
+    # 在car.wakeup上最多等待timeout毫秒（模拟时间） 等待时放开电梯的锁 返回实际经过的模拟毫秒数
+    # 故障键、开关门键和新目标都会唤醒电梯 不需要每隔一段时间醒来检查
+    # 修改倍速时也会被唤醒 再按新的倍速等待剩下的时间
+    def wait(self, timeout):
+        start = clock.now()
+        if timeout > 0:
+            wall_time = clock.wall_time(timeout)
+            if wall_time is None:  # 暂停中
+                self.car.lock.wait(self.car.wakeup)
+            else:
+                # 倍速很大时等待时间不足1毫秒 不取整
+                self.car.lock.wait(self.car.wakeup, wall_time)
+        self.wakeups += 1
+        return clock.now() - start
+
+    # 移动一层楼
+    # 方向由参数确定 可以是
+    # MoveState.up or MoveState.down
+    def go_one_floor(self, move_state):
+        car = self.car
+        # 修改电梯运行状态
+        if move_state == MoveState.up:
+            car.state = ElevatorState.going_up
+        elif move_state == MoveState.down:
+            car.state = ElevatorState.going_down
+        car.publish()
+
+        moved_time = 0.0
+        while moved_time < TIME_PER_FLOOR:
+            # 等待时放开锁 新目标等唤醒不影响运行 继续等剩下的时间
+            moved_time += self.wait(TIME_PER_FLOOR - moved_time)
+            # 如果此时出故障了..
+            if car.state == ElevatorState.fault:
+                self.fault_tackle()
+                return
+            # 故障后在等待期间又恢复了 电梯没来得及处理故障 也当作故障处理
+            if car.state not in (ElevatorState.going_up, ElevatorState.going_down):
+                self.fault_tackle()
+                car.state = ElevatorState.normal
+                car.publish()
+                return
+
+        if move_state == MoveState.up:
+            car.cur_floor += 1
+        elif move_state == MoveState.down:
+            car.cur_floor -= 1
+        car.state = ElevatorState.normal
+        car.publish()
+        event_log.log("arrive", self.elev_id, self.elev_id, "号现在在", car.cur_floor, "楼")
+        # 电梯位置变了 之前分配不出去的任务也许可以分配了
+        mutex.lock()
+        wake_handler()
+        mutex.unlock()
+
+    # 一次门的操作 包括开门和关门 门正常关好则返回True 被故障打断则返回False
+    def door_operation(self):
+        car = self.car
+        opening_time = 0.0
+        open_time = 0.0
+        car.state = ElevatorState.opening_door
+        car.publish()
+        while True:
+            if car.state == ElevatorState.fault:
+                self.fault_tackle()
+                return False
+
+            elif car.is_open_button_clicked == True:
+                # 门正在关上..
+                if car.state == ElevatorState.closing_door:
+                    car.state = ElevatorState.opening_door
+
+                # 门已经开了，延续开门时间
+                if car.state == ElevatorState.open_door:
+                    open_time = 0
+
+                car.is_open_button_clicked = False
+
+            elif car.is_close_button_clicked == True:
+                car.state = ElevatorState.closing_door
+                open_time = 0
+
+                car.is_close_button_clicked = False
+
+            # 更新时间 每个阶段只等待一次 开关门键和故障键会提前唤醒
+            # 醒来后状态变了（故障）则不计时 回到循环开头处理
+            # 门正在打开
+            if car.state == ElevatorState.opening_door:
+                waited = self.wait(OPENING_DOOR_TIME - opening_time)
+                if car.state == ElevatorState.opening_door:
+                    opening_time = min(OPENING_DOOR_TIME, opening_time + waited)
+                    car.open_progress = opening_time / OPENING_DOOR_TIME
+                    if opening_time >= OPENING_DOOR_TIME:
+                        car.state = ElevatorState.open_door
+
+            # 门已打开
+            elif car.state == ElevatorState.open_door:
+                waited = self.wait(OPEN_DOOR_TIME - open_time)
+                if car.state == ElevatorState.open_door:
+                    open_time += waited
+                    if open_time >= OPEN_DOOR_TIME:
+                        car.state = ElevatorState.closing_door
+
+            # 门正在关闭
+            elif car.state == ElevatorState.closing_door:
+                waited = self.wait(opening_time)
+                if car.state != ElevatorState.closing_door:
+                    continue
+                opening_time = max(0.0, opening_time - waited)
+                car.open_progress = opening_time / OPENING_DOOR_TIME
+                if opening_time <= 0:
+                    # 门关好了 润回去咯
+                    car.state = ElevatorState.normal
+                    car.publish()
+                    return True
+
+            # 故障后在一个时间间隔内又恢复了 电梯没来得及处理故障 也当作故障处理
+            # 否则会在这里持有锁一直空转
+            else:
+                self.fault_tackle()
+                car.state = ElevatorState.normal
+                car.publish()
+                return False
+
+            car.publish()
+
+    # 当故障发生时 清除原先的所有任务
+    def fault_tackle(self):
+        car = self.car
+        car.state = ElevatorState.fault
+        car.open_progress = 0.0
+        car.is_open_button_clicked = False
+        car.is_close_button_clicked = False
+        mutex.lock()
+        # 把原先分配给它的任务交给handler重新分配
+        outer_requests.release_elevator(self.elev_id)
+        wake_handler()
+        mutex.unlock()
+        car.up_targets.clear()
+        car.down_targets.clear()
+        car.publish()
+
+    # 到达以后 把完成的任务删去
+    def finish_targets(self, targets):
+        car = self.car
+        # 内部的任务
+        if targets:
+            targets.pop_first()
+        car.publish()
+        # 外部按钮的任务
+        mutex.lock()
+        outer_requests.finish_floor(car.cur_floor)
+        publish_hall_calls()
+        wake_handler()
+        mutex.unlock()
+
+    def run(self):
+        car = self.car
+        while True:
+            car.lock.lock()
+            if car.state == ElevatorState.fault:
+                self.fault_tackle()
+                # 故障时无事可做 等到故障恢复再醒来
+                car.lock.wait(car.wakeup)
+                car.lock.unlock()
+                continue
+
+            idle = False
+            # 向上扫描状态时
+            if car.move_state == MoveState.up:
+                if car.up_targets:
+                    if car.up_targets.first() == car.cur_floor:
+                        if self.door_operation():
+                            self.finish_targets(car.up_targets)
+                    elif car.up_targets.first() > car.cur_floor:
+                        self.go_one_floor(MoveState.up)
+                    else:
+                        idle = True
+
+                # 当没有上行目标而出现下行目标时 更换状态
+                elif car.down_targets:
+                    car.move_state = MoveState.down
+                    car.publish()
+                else:
+                    idle = True
+
+            # 向下扫描状态时
+            elif car.move_state == MoveState.down:
+                if car.down_targets:
+                    if car.down_targets.first() == car.cur_floor:
+                        if self.door_operation():
+                            self.finish_targets(car.down_targets)
+                    elif car.down_targets.first() < car.cur_floor:
+                        self.go_one_floor(MoveState.down)
+                    else:
+                        idle = True
+
+                # 当没有下行目标而出现上行目标时 更换状态
+                elif car.up_targets:
+                    car.move_state = MoveState.up
+                    car.publish()
+                else:
+                    idle = True
+
+            # 没有任务时先看是否需要开往别的楼层停靠
+            if idle and not car.up_targets and not car.down_targets and park(car):
+                idle = False
+            if idle:
+                # 没有可执行的任务时不再空转 等到有新目标或故障时再醒来
+                car.lock.wait(car.wakeup)
+
+            car.lock.unlock()
+
+
+class Handler(threading.Thread):
+    def __init__(self, policy=None):
+        super().__init__(name="handler", daemon=True)  # 父类构造函数
+        # 调度策略 见dispatch_policy.py 默认为原来的最近电梯规则
+        self.policy = policy if policy is not None else make_policy("nearest")
+        # 调度延迟的统计：外部任务从产生到分配给电梯所用的时间 单位 毫秒
+        self.passes = 0  # 被唤醒调度的次数
+        self.assigned = 0  # 分配出去的任务数
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.cpu_time = 0.0  # 调度所用的CPU时间 单位 秒
+        self.pass_counter = registry.counter("elevator_handler_passes", "handler被唤醒调度的次数")
+        self.pass_histogram = registry.histogram("elevator_handler_pass_cpu_seconds", "handler每次调度所用的CPU时间")
+        self.latency_histogram = registry.histogram("elevator_dispatch_latency_seconds", "外部任务从产生到分配给电梯的时间")
+
+    def run(self):
+        # 不知为何 这里一定要声明一下全局变量..
+        global handler_pending
+        mutex.lock()
+        while True:
+            # 没有新事件时在条件变量上睡眠 不再空转
+            # 仍有未分配的任务时（例如最近的电梯正好在该层上行中）则隔一段时间再试一次
+            while not handler_pending:
+                retry_time = clock.wall_time(HANDLER_RETRY_TIME) if outer_requests.has_unassigned() else None
+                if retry_time is not None:
+                    if not mutex.wait(handler_wakeup, retry_time):
+                        break
+                else:
+                    mutex.wait(handler_wakeup)
+            handler_pending = False
+            self.passes += 1
+            self.pass_counter.inc()
+
+            unassigned = outer_requests.unassigned()
+            # 计算距离只读快照 不需要持有任何锁
+            mutex.unlock()
+
+            # handler只处理外面按钮产生的任务安排..
+            # 由调度策略挑选电梯 再逐个交给电梯
+            start = time.thread_time()
+            for outer_task, elev_id in self.policy.assign(bank_snapshot.cars, unassigned, ELEVATOR_FLOORS):
+                self.assign(outer_task, elev_id)
+            cpu_time = time.thread_time() - start
+            self.cpu_time += cpu_time
+            self.pass_histogram.observe(cpu_time)
+
+            mutex.lock()
+
+    # 把任务交给选中的电梯 在电梯的锁下重新检查一遍 因为快照可能已经过时了
+    # 成功则返回这台电梯新的快照
+    def assign(self, outer_task, elev_id):
+        car = cars[elev_id]
+        snapshot = None
+        car.lock.lock()
+        mutex.lock()
+        if outer_task.state == OuterTaskState.unassigned and car.state != ElevatorState.fault and \
+                add_outer_target(outer_task, car.state, car.cur_floor, car.up_targets, car.down_targets):
+            # 设为等待态
+            outer_requests.assign(outer_task, elev_id)
+            mutex.unlock()
+            record_trace(TraceKind.assign, elev_id, outer_task.target, outer_task.move_state.value)
+            event_log.log("assign", elev_id, elev_id, "号电梯 ", car.up_targets.copy(), " ", car.down_targets.copy())
+            snapshot = car.publish()
+            car.wakeup.notify_all()
+
+            latency = time.perf_counter() * 1000 - outer_task.created_at
+            self.assigned += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.latency_histogram.observe(latency / 1000)
+        else:
+            mutex.unlock()
+        car.lock.unlock()
+        return snapshot
+
+    # 调度延迟报告
+    def report(self):
+        average = self.total_latency / self.assigned if self.assigned else 0.0
+        return "handler共调度" + str(self.passes) + "次 分配任务" + str(self.assigned) + "个 平均延迟" + \
+            str(round(average, 3)) + "毫秒 最大延迟" + str(round(self.max_latency, 3)) + "毫秒"
+
+
+# 电梯内部的开门键 电梯故障时不接受 返回False
+def press_open(elev_id):
+    record_trace(TraceKind.open, elev_id)
+    car = cars[elev_id]
+    car.lock.lock()
+    if car.state == ElevatorState.fault:
+        car.lock.unlock()
+        event_log.log("refused", elev_id, elev_id, "号电梯出现故障 正在维修!")
+        return False
+
+    if car.state == ElevatorState.closing_door or car.state == ElevatorState.open_door:
+        car.is_open_button_clicked = True
+        car.is_close_button_clicked = False
+        car.publish()
+        # 叫醒正在等待的电梯 马上重新开门
+        car.wakeup.notify_all()
+    car.lock.unlock()
+
+    event_log.log("open", elev_id, elev_id, "电梯开门!")
+    return True
+
+
+# 电梯内部的关门键 电梯故障时不接受 返回False
+def press_close(elev_id):
+    record_trace(TraceKind.close, elev_id)
+    car = cars[elev_id]
+    car.lock.lock()
+    if car.state == ElevatorState.fault:
+        car.lock.unlock()
+        event_log.log("refused", elev_id, elev_id, "号电梯出现故障 正在维修!")
+        return False
+
+    if car.state == ElevatorState.opening_door or car.state == ElevatorState.open_door:
+        car.is_close_button_clicked = True
+        car.is_open_button_clicked = False
+        car.publish()
+        car.wakeup.notify_all()
+    car.lock.unlock()
+
+    event_log.log("close", elev_id, elev_id, "电梯关门!")
+    return True
+
+
+# 故障键 再按一次恢复正常 总是接受 返回True
+def toggle_fault(elev_id):
+    record_trace(TraceKind.fault, elev_id)
+    car = cars[elev_id]
+    car.lock.lock()
+    if car.state != ElevatorState.fault:
+        car.state = ElevatorState.fault
+        car.publish()
+        # 空闲的电梯需要醒来处理故障 把任务交还给handler
+        car.wakeup.notify_all()
+        car.lock.unlock()
+        event_log.log("fault", elev_id, elev_id, "电梯故障!")
+
+    else:
+        car.state = ElevatorState.normal
+        car.publish()
+        car.wakeup.notify_all()
+        mutex.lock()
+        wake_handler()
+        mutex.unlock()
+        car.lock.unlock()
+        event_log.log("fault", elev_id, elev_id, "电梯正常!")
+    return True
+
+
+# 目的楼层派梯直接交给这台电梯的停靠 不经过handler 回放模拟引擎的记录时用到
+# 电梯故障或者已经要停靠该层时返回False
+def call_assigned(elev_id, floor, move_state):
+    record_trace(TraceKind.assigned_call, elev_id, floor, move_state.value)
+    car = cars[elev_id]
+    car.lock.lock()
+    if car.state == ElevatorState.fault or not add_outer_target(OuterTask(floor, move_state), car.state,
+                                                                car.cur_floor, car.up_targets, car.down_targets):
+        car.lock.unlock()
+        return False
+    car.publish()
+    car.wakeup.notify_all()
+    car.lock.unlock()
+
+    event_log.log("assign", elev_id, elev_id, "号电梯被分到", floor, "楼的乘客")
+    return True
+
+
+# 电梯内部的数字键 电梯故障时不接受 返回False
+def call_car(elev_id, floor):
+    record_trace(TraceKind.car_call, elev_id, floor)
+    car = cars[elev_id]
+    car.lock.lock()
+
+    if car.state == ElevatorState.fault:
+        car.lock.unlock()
+        event_log.log("refused", elev_id, elev_id, "号电梯出现故障 正在维修!")
+        return False
+
+    # 相同楼层不处理 但不算拒绝
+    if floor == car.cur_floor:
+        car.lock.unlock()
+        return True
+
+    if floor > car.cur_floor:
+        car.up_targets.add(floor)
+    elif floor < car.cur_floor:
+        car.down_targets.add(floor)
+    car.publish()
+    car.wakeup.notify_all()
+
+    car.lock.unlock()
+
+    event_log.log("car_call", elev_id, elev_id, "号电梯的用户请求前往", floor, "楼!")
+    return True
+
+
+# 楼层的上行/下行键
+def call_hall(floor, move_state):
+    call_halls([(floor, move_state)])
+
+
+# 一次按下多个外部按钮 calls为[(楼层, MoveState)]
+# 只加一次锁、发布一次快照、唤醒一次handler 见control_server.py
+# 所有电梯均已故障而不接受时返回False
+def call_halls(calls):
+    for floor, move_state in calls:
+        record_trace(TraceKind.hall_call, -1, floor, move_state.value)
+    if all(snapshot.state == ElevatorState.fault for snapshot in bank_snapshot.cars):
+        event_log.log("hall_call", -1, "所有电梯均已故障！")
+        return False
+
+    added = False
+    mutex.lock()
+    created_at = time.perf_counter() * 1000
+    for floor, move_state in calls:
+        if parking is not None:
+            parking.record(floor, move_state, clock.now())
+        # 同一楼层同一方向已经有未完成的任务时不重复添加
+        if outer_requests.add(floor, move_state, created_at=created_at) is not None:
+            added = True
+    if added:
+        publish_hall_calls()
+        wake_handler()
+    mutex.unlock()
+
+    for floor, move_state in calls:
+        if move_state == MoveState.up:
+            event_log.log("hall_call", -1, floor, "楼的用户上楼请求!")
+
+        elif move_state == MoveState.down:
+            event_log.log("hall_call", -1, floor, "楼的用户下楼请求!")
+    return True
+
+
+# 按下运行记录中的按钮 上面的函数与Simulation的按钮接口同名 本模块可以直接作为apply_record的target
+def replay_record(record):
+    apply_record(sys.modules[__name__], record)
+
+
+# 按原来的时间间隔回放运行记录 每条记录到期时调用handle(record) 默认直接按下记录中的按钮
+# 按模拟时钟计时 倍速、暂停和单步同样作用于回放
+class TraceReplayer(threading.Thread):
+    def __init__(self, path, handle=replay_record):
+        super().__init__(name="trace-replayer", daemon=True)  # 父类构造函数
+        self.path = path
+        self.handle = handle
+        self.replayed = 0  # 已经回放的记录数
+
+    def run(self):
+        start = clock.now()
+        for record in read_trace(self.path):
+            if record.kind in INPUT_KINDS:
+                clock.wait_until(start + record.time)
+                self.handle(record)
+                self.replayed += 1
+
+
+# 开启handler和每台电梯的线程 返回(handler, 电梯列表)
+def start(policy=None):
+    handler = Handler(policy)
+    handler.start()
+    elevators = [Elevator(i) for i in range(ELEVATOR_NUM)]
+    for elevator in elevators:
+        elevator.start()
+    return handler, elevators
+
+
+# 修改倍速后叫醒所有等待中的电梯和handler 让它们按新的倍速重新计算等待时间
+def wake_all():
+    for car in cars:
+        car.lock.lock()
+        car.wakeup.notify_all()
+        car.lock.unlock()
+    mutex.lock()
+    handler_wakeup.notify_all()
+    mutex.unlock()
+
+
+clock.add_listener(wake_all)
+
+
+# 导出指标前 把每台电梯在当前状态下已经停留的时间记进去
+def collect_state_time():
+    for car in cars:
+        car.lock.lock()
+        car.count_state_time(clock.now())
+        car.lock.unlock()
+
+
+registry.add_collector(collect_state_time)
+
+
+if __name__ == '__main__':
+    # 用法: python elevator_core.py [--replay 记录文件] [--seconds 运行秒数] [--trace 记录文件] [--speed 倍速]
+    #                               [--policy 调度策略] [--metrics 指标文件 [--metrics-interval 秒数]] [--log 日志文件]
+    #                               [--parking]
+    # 不打开界面 以--speed倍速运行--seconds秒（模拟时间为两者之积）后输出调度延迟和锁的等待时间
+    # --parking时空闲的电梯开往外部按钮多的楼层停靠 见parking.py
+    # 其余选项与elevator_simulator.py相同
+    options = {}
+    for option in ["--replay", "--seconds", "--trace", "--speed", "--policy", "--metrics", "--metrics-interval",
+                   "--log"]:
+        if option in sys.argv:
+            i = sys.argv.index(option)
+            options[option] = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+    if "--trace" in options:
+        trace = TraceWriter(options["--trace"])
+    if "--speed" in options:
+        clock.set_speed(float(options["--speed"]))
+    if "--log" in options:
+        event_log.set_file(options["--log"])
+    if "--parking" in sys.argv:
+        from parking import IdleParking
+        parking = IdleParking()
+    exporter = None
+    if "--metrics" in options:
+        exporter = MetricsExporter(registry, options["--metrics"], float(options.get("--metrics-interval", 10)))
+
+    handler, elevators = start(make_policy(options.get("--policy", "nearest")))
+    if "--replay" in options:
+        TraceReplayer(options["--replay"]).start()
+    try:
+        time.sleep(float(options.get("--seconds", 60)))
+    except KeyboardInterrupt:
+        pass
+
+    if trace is not None:
+        trace.close()
+    if exporter is not None:
+        exporter.close()
+    event_log.close()
+    print("模拟时间", round(clock.now() / 1000, 1), "秒")
+    print(handler.report())
+    print(lock_report())
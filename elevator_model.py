@@ -0,0 +1,293 @@
+from collections import namedtuple
+from enum import Enum  # 枚举类
+
+# 电梯的数据模型 不依赖PyQt 图形界面和无界面的模拟引擎共用
+
+# 一些全局变量
+ELEVATOR_NUM = 5  # 电梯数量
+ELEVATOR_FLOORS = 20  # 电梯层数
+LOBBY = 1  # 大堂所在楼层
+
+TIME_PER_FLOOR = 1000  # 运行一层电梯所需时间 单位 毫秒
+OPENING_DOOR_TIME = 1000  # 打开一扇门所需时间 单位 毫秒
+OPEN_DOOR_TIME = 1000  # 门打开后维持的时间 单位 毫秒
+
+
+# 电梯的状态 包括正常 开门中 开门 关门中 上行中 下行中 故障
+class ElevatorState(Enum):
+    normal = 0
+    opening_door = 1
+    open_door = 2
+    closing_door = 3
+    fault = 4
+    going_up = 5
+    going_down = 6
+
+
+# 电梯的扫描移动状态 包括 向上 向下
+class MoveState(Enum):
+    up = 2
+    down = 3
+
+
+# 外部按钮产生的任务的分配状态 包括未分配 等待 完成
+class OuterTaskState(Enum):
+    unassigned = 1
+    waiting = 2
+    finished = 3
+
+
+# 外部按钮按下产生的任务描述
+class OuterTask:
+    def __init__(self, target, move_state, state=OuterTaskState.unassigned, created_at=0):  # the task is unfinished by default
+        self.target = target  # 目标楼层
+        self.move_state = move_state  # 需要的电梯运行方向
+        self.state = state  # 是否完成（默认未完成）
+        self.created_at = created_at  # 任务产生的时刻（模拟引擎中为模拟时间 单位 毫秒）
+        self.elevator = None  # 分配到的电梯编号
+
+
+# 每台电梯某一方向上的目标楼层集合
+# 用一个整数的二进制位表示各层是否为目标 第n位为1表示n楼是目标
+# 插入、删除、查询、取下一站/最远一站和清空都不需要排序或移动元素 楼层很多时也一样快
+class StopSet:
+    def __init__(self, floors=(), descending=False):
+        self.mask = 0
+        self.descending = descending  # 向下运行的目标从高到低处理 例如[20,19..]
+        self.__count = 0
+        for floor in floors:
+            self.add(floor)
+
+    def add(self, floor):
+        bit = 1 << floor
+        if not self.mask & bit:
+            self.mask |= bit
+            self.__count += 1
+
+    def discard(self, floor):
+        bit = 1 << floor
+        if self.mask & bit:
+            self.mask ^= bit
+            self.__count -= 1
+
+    def clear(self):
+        self.mask = 0
+        self.__count = 0
+
+    def __contains__(self, floor):
+        return self.mask >> floor & 1 == 1
+
+    def __len__(self):
+        return self.__count
+
+    def lowest(self):
+        if not self.mask:
+            raise IndexError("没有目标楼层")
+        return (self.mask & -self.mask).bit_length() - 1
+
+    def highest(self):
+        if not self.mask:
+            raise IndexError("没有目标楼层")
+        return self.mask.bit_length() - 1
+
+    # 运行方向上的下一站 相当于原来排好序的列表的[0]
+    def first(self):
+        return self.highest() if self.descending else self.lowest()
+
+    # 运行方向上最远的一站 相当于原来排好序的列表的[-1]
+    def last(self):
+        return self.lowest() if self.descending else self.highest()
+
+    # low到high之间（含两端）有几个目标
+    def count_range(self, low, high):
+        low = max(low, 0)
+        if high < low:
+            return 0
+        return bin(self.mask >> low & ((1 << (high - low + 1)) - 1)).count("1")
+
+    # 到达下一站后把它删去 相当于原来的pop(0)
+    def pop_first(self):
+        floor = self.first()
+        self.discard(floor)
+        return floor
+
+    # 由位掩码直接建立 用于从检查点恢复
+    @staticmethod
+    def from_mask(mask, descending=False):
+        stop_set = StopSet(descending=descending)
+        stop_set.mask = mask
+        stop_set.__count = bin(mask).count("1")
+        return stop_set
+
+    def copy(self):
+        stop_set = StopSet.__new__(StopSet)
+        stop_set.mask = self.mask
+        stop_set.descending = self.descending
+        stop_set.__count = self.__count
+        return stop_set
+
+    # 按处理的先后顺序列出所有目标
+    def __iter__(self):
+        floors = []
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            floors.append(low.bit_length() - 1)
+            mask ^= low
+        if self.descending:
+            floors.reverse()
+        return iter(floors)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# 计算外部任务到某台电梯的"距离" handler据此挑选最近的电梯
+# 参数均为这台电梯当前的状态 供图形界面的handler和无界面的模拟引擎共用
+def calc_distance(outer_task, state, floor, move_state, up, down):
+    # 如果已经上行/下行了 就设成已经到达目的地的楼层了
+    origin = floor
+    if state == ElevatorState.going_up:
+        origin += 1
+    elif state == ElevatorState.going_down:
+        origin -= 1
+
+    if move_state == MoveState.up:
+        targets = up
+    else:  # down
+        targets = down
+
+    # 本身对某一种方向来说，根据这部电梯是否与它运行方向相同，是在上方还是下方，是否有任务，分为8种情况..
+    # 如果电梯运行方向无任务，则直接算绝对值
+    if not targets:
+        return abs(origin - outer_task.target)
+    # 如果电梯朝着按键所在楼层而来 且运行方向与理想方向相同 也是直接绝对值
+    elif move_state == outer_task.move_state and \
+            ((outer_task.move_state == MoveState.up and outer_task.target >= origin) or
+             (outer_task.move_state == MoveState.down and outer_task.target <= origin)):
+        return abs(origin - outer_task.target)
+    # 其余情况则算最远任务楼层到目标楼层的绝对值和最远楼层到当前电梯楼层的绝对值之和
+    else:
+        farthest = targets.last()
+        return abs(origin - farthest) + abs(outer_task.target - farthest)
+
+
+# 把外部任务加入选中电梯的目标列表 成功加入则返回True
+def add_outer_target(outer_task, state, floor, up, down):
+    if floor == outer_task.target:
+        if outer_task.move_state == MoveState.up and outer_task.target not in up and \
+                state != ElevatorState.going_up:
+            up.add(outer_task.target)
+            return True
+
+        elif outer_task.move_state == MoveState.down and outer_task.target not in down and \
+                state != ElevatorState.going_down:
+            down.add(outer_task.target)
+            return True
+
+    elif floor < outer_task.target and outer_task.target not in up:  # up
+        up.add(outer_task.target)
+        return True
+    elif floor > outer_task.target and outer_task.target not in down:  # down
+        down.add(outer_task.target)
+        return True
+
+    return False
+
+
+# add_outer_target能否把任务加入 不修改目标列表
+def can_add_outer_target(outer_task, state, floor, up, down):
+    target = outer_task.target
+    if floor == target:
+        if outer_task.move_state == MoveState.up:
+            return target not in up and state != ElevatorState.going_up
+        return target not in down and state != ElevatorState.going_down
+    if floor < target:
+        return target not in up
+    return target not in down
+
+
+# 外部按钮产生的需求的登记表
+# 按(楼层, 方向)和分配到的电梯建立索引 去重、分配、完成和故障时的重新分配都不需要遍历所有任务
+# 同一楼层同一方向最多只有一个未完成的任务 因此再多的按键也最多占用 2×楼层数 个位置
+class HallCallRegistry:
+    def __init__(self):
+        self.__tasks = {}  # (楼层, 方向) -> OuterTask
+        self.__unassigned = {}  # 未分配的任务 (楼层, 方向) -> OuterTask 保持加入的先后顺序
+        self.__by_elevator = {}  # 电梯编号 -> {(楼层, 方向): OuterTask}
+
+    # 按下外部按钮 已经有相同的未完成任务时返回None
+    def add(self, floor, move_state, created_at=0):
+        key = (floor, move_state)
+        if key in self.__tasks:
+            return None
+        task = OuterTask(floor, move_state, created_at=created_at)
+        self.__tasks[key] = task
+        self.__unassigned[key] = task
+        return task
+
+    def get(self, floor, move_state):
+        return self.__tasks.get((floor, move_state))
+
+    # 按加入顺序排列的未分配任务
+    def unassigned(self):
+        return list(self.__unassigned.values())
+
+    def has_unassigned(self):
+        return len(self.__unassigned) > 0
+
+    # 把任务分配给某台电梯 设为等待态
+    def assign(self, task, elev_id):
+        key = (task.target, task.move_state)
+        del self.__unassigned[key]
+        task.state = OuterTaskState.waiting
+        task.elevator = elev_id
+        self.__by_elevator.setdefault(elev_id, {})[key] = task
+
+    # 电梯在某层开关门后 该层的外部任务都算完成 返回完成的任务
+    def finish_floor(self, floor):
+        finished = []
+        for move_state in MoveState:
+            task = self.__tasks.pop((floor, move_state), None)
+            if task is None:
+                continue
+            self.__unassigned.pop((floor, move_state), None)
+            if task.elevator is not None:
+                del self.__by_elevator[task.elevator][(floor, move_state)]
+            task.state = OuterTaskState.finished
+            finished.append(task)
+        return finished
+
+    # 电梯故障时 把原先分配给它的任务交还给handler重新分配 返回这些任务
+    def release_elevator(self, elev_id):
+        released = list(self.__by_elevator.pop(elev_id, {}).values())
+        for task in released:
+            task.state = OuterTaskState.unassigned
+            task.elevator = None
+            self.__unassigned[(task.target, task.move_state)] = task
+        return released
+
+    # 分配给某台电梯的任务 按分配的先后顺序排列
+    def assigned_to(self, elev_id):
+        return list(self.__by_elevator.get(elev_id, {}).values())
+
+    # 未完成的任务 元素为(楼层, 方向)
+    def keys(self):
+        return self.__tasks.keys()
+
+    def __iter__(self):
+        return iter(list(self.__tasks.values()))
+
+    def __len__(self):
+        return len(self.__tasks)
+
+
+# 电梯状态的不可变快照 handler和界面读取快照时不需要加锁
+# 目标楼层为StopSet的副本 其余字段与CarState相同
+# updated_at为生成快照的时刻 门正在开关时 界面据此和open_progress推算当前的进度
+CarSnapshot = namedtuple("CarSnapshot", ["elev_id", "version", "state", "cur_floor", "move_state", "up_targets",
+                                         "down_targets", "open_progress", "is_open_button_clicked",
+                                         "is_close_button_clicked", "updated_at"], defaults=(0.0,))
+# 整组电梯的快照 hall_calls为未完成的外部任务 元素为(楼层, 方向)
+BankSnapshot = namedtuple("BankSnapshot", ["version", "cars", "hall_calls"])
+
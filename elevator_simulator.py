@@ -1,354 +1,25 @@
 import sys
-from enum import Enum  # 枚举类
-from functools import partial  # 使button的connect函数可带参数
+import time
 
 # pyqt的gui组件
-from PyQt5.QtCore import QRect, QThread, QMutex, QTimer
-from PyQt5.QtWidgets import QWidget, QPushButton, QApplication, QLabel, QTextEdit, QVBoxLayout, QHBoxLayout, QLCDNumber, \
-    QLineEdit
+from PyQt5.QtCore import QRect, QTimer
+from PyQt5.QtWidgets import QWidget, QPushButton, QApplication, QLabel, QPlainTextEdit, QVBoxLayout, QHBoxLayout, \
+    QLineEdit, QComboBox, QScrollArea
+
+# 电梯、handler和按钮都在elevator_core.py中 这里只负责显示和输入
+import elevator_core
+from call_trace import TraceWriter
+from dispatch_policy import make_policy
+from elevator_core import clock, event_log, registry, lock_report, call_car, call_hall, toggle_fault, press_open, \
+    press_close, TraceReplayer
+from elevator_model import ELEVATOR_NUM, ELEVATOR_FLOORS, MoveState
+from event_log import RING_SIZE
+from metrics import MetricsExporter
+from shaft_view import ShaftView, is_animating
+from sim_clock import SPEEDS
 
 # 窗口大小设置
-UI_SIZE = QRect(200, 200, 600, 800)
-
-# 一些全局变量
-ELEVATOR_NUM = 5  # 电梯数量
-ELEVATOR_FLOORS = 20  # 电梯层数
-
-TIME_PER_FLOOR = 1000  # 运行一层电梯所需时间 单位 毫秒
-OPENING_DOOR_TIME = 1000  # 打开一扇门所需时间 单位 毫秒
-OPEN_DOOR_TIME = 1000  # 门打开后维持的时间 单位 毫秒
-
-
-# 电梯的状态 包括正常 开门中 开门 关门中 上行中 下行中 故障
-class ElevatorState(Enum):
-    normal = 0
-    opening_door = 1
-    open_door = 2
-    closing_door = 3
-    fault = 4
-    going_up = 5
-    going_down = 6
-
-
-# 电梯的扫描移动状态 包括 向上 向下
-class MoveState(Enum):
-    up = 2
-    down = 3
-
-
-# 外部按钮产生的任务的分配状态 包括未分配 等待 完成
-class OuterTaskState(Enum):
-    unassigned = 1
-    waiting = 2
-    finished = 3
-
-
-# 外部按钮按下产生的任务描述
-class OuterTask:
-    def __init__(self, target, move_state, state=OuterTaskState.unassigned):  # the task is unfinished by default
-        self.target = target  # 目标楼层
-        self.move_state = move_state  # 需要的电梯运行方向
-        self.state = state  # 是否完成（默认未完成）
-
-
-# 一些全局变量
-# 外部按钮产生的需求
-outer_requests = []
-# 每组电梯的状态
-elevator_states = []
-# 每台电梯的当前楼层
-cur_floor = []
-# 每台电梯当前需要向上运行处理的目标有哪些（二维数组，内部仅为数字）
-up_targets = []
-# 每台电梯当前需要向下运行处理的目标有哪些（二维数组，内部仅为数字）
-down_targets = []
-# 每台电梯内部的开门/关门键是否被按（True/False）
-is_open_button_clicked = []
-is_close_button_clicked = []
-# 每台电梯当前的扫描运行状态
-move_states = []
-# 每台电梯开门的进度条 范围为0-1的浮点数
-open_progress = []
-
-# 不能简单地用list的乘法!
-# 例如 a = [[]] * 5
-# a[0].append(1)
-# a == [[1],[1],[1],[1],[1]]
-# 这是因为后面四个子list 其实只是对第1个list的引用
-for qwerty in range(ELEVATOR_NUM):
-    # inner_requests.append([])  # add list
-    elevator_states.append(ElevatorState.normal)  # 默认正常
-    cur_floor.append(1)  # 默认在1楼
-    up_targets.append([])  # 二维数组
-    down_targets.append([])  # 二维数组
-    is_close_button_clicked.append(False)  # 默认开门关门键没按
-    is_open_button_clicked.append(False)
-    move_states.append(MoveState.up)  # 默认向上（一开始在1楼 只能向上咯
-    open_progress.append(0.0)  # 默认门没开 即进度条停在0.0
-
-# mutex互斥锁
-mutex = QMutex()
-
-
-class Elevator(QThread):  # 继承Qthread
-    def __init__(self, elev_id):
-        super().__init__()  # 父类构造函数
-        self.elev_id = elev_id  # 电梯编号
-        self.time_slice = 10  # 时间间隔（单位：毫秒）
-
-    # 移动一层楼
-    # 方向由参数确定 可以是
-    # MoveState.up or MoveState.down
-    def go_one_floor(self, move_state):
-        # 修改电梯运行状态
-        if move_state == MoveState.up:
-            elevator_states[self.elev_id] = ElevatorState.going_up
-        elif move_state == MoveState.down:
-            elevator_states[self.elev_id] = ElevatorState.going_down
-
-        has_slept_time = 0
-        while has_slept_time != TIME_PER_FLOOR:
-            # 需要先放开锁 不然别的线程不能运行
-            mutex.unlock()
-            self.msleep(self.time_slice)
-            has_slept_time += self.time_slice
-            # 锁回来
-            mutex.lock()
-            # 如果此时出故障了..
-            if elevator_states[self.elev_id] == ElevatorState.fault:
-                self.fault_tackle()
-                return
-
-        if move_state == MoveState.up:
-            cur_floor[self.elev_id] += 1
-        elif move_state == MoveState.down:
-            cur_floor[self.elev_id] -= 1
-        elevator_states[self.elev_id] = ElevatorState.normal
-        print(self.elev_id, "号现在在", cur_floor[self.elev_id], "楼")
-        if elevator_states[self.elev_id] == ElevatorState.fault:
-            self.fault_tackle()
-
-    # 一次门的操作 包括开门和关门
-    def door_operation(self):
-        opening_time = 0.0
-        open_time = 0.0
-        elevator_states[self.elev_id] = ElevatorState.opening_door
-        while True:
-            if elevator_states[self.elev_id] == ElevatorState.fault:
-                self.fault_tackle()
-                break
-
-            elif is_open_button_clicked[self.elev_id] == True:
-                # 门正在关上..
-                if elevator_states[self.elev_id] == ElevatorState.closing_door:
-                    elevator_states[self.elev_id] = ElevatorState.opening_door
-
-                # 门已经开了，延续开门时间
-                if elevator_states[self.elev_id] == ElevatorState.open_door:
-                    open_time = 0
-
-                is_open_button_clicked[self.elev_id] = False
-
-            elif is_close_button_clicked[self.elev_id] == True:
-                elevator_states[self.elev_id] = ElevatorState.closing_door
-                open_time = 0
-
-                is_close_button_clicked[self.elev_id] = False
-
-            # 更新时间
-            # 门正在打开
-            if elevator_states[self.elev_id] == ElevatorState.opening_door:
-                # 需要先放开锁 不然别的线程不能运行
-                mutex.unlock()
-                self.msleep(self.time_slice)
-                opening_time += self.time_slice
-                # 锁回来
-                mutex.lock()
-                open_progress[self.elev_id] = opening_time / OPENING_DOOR_TIME
-                if opening_time == OPENING_DOOR_TIME:
-                    elevator_states[self.elev_id] = ElevatorState.open_door
-
-            # 门已打开
-            elif elevator_states[self.elev_id] == ElevatorState.open_door:
-                # 需要先放开锁 不然别的线程不能运行
-                mutex.unlock()
-                self.msleep(self.time_slice)
-                open_time += self.time_slice
-                # 锁回来
-                mutex.lock()
-                if open_time == OPEN_DOOR_TIME:
-                    elevator_states[self.elev_id] = ElevatorState.closing_door
-
-            # 门正在关闭
-            elif elevator_states[self.elev_id] == ElevatorState.closing_door:
-                # 需要先放开锁 不然别的线程不能运行
-                mutex.unlock()
-                self.msleep(self.time_slice)
-                opening_time -= self.time_slice
-                # 锁回来
-                mutex.lock()
-                open_progress[self.elev_id] = opening_time / OPENING_DOOR_TIME
-                if opening_time == 0:
-                    # 门关好了 润回去咯
-                    elevator_states[self.elev_id] = ElevatorState.normal
-                    break
-
-    # 当故障发生时 清除原先的所有任务
-    def fault_tackle(self):
-        elevator_states[self.elev_id] = ElevatorState.fault
-        open_progress[self.elev_id] = 0.0
-        is_open_button_clicked[self.elev_id] = False
-        is_close_button_clicked[self.elev_id] = False
-        elevator_states[self.elev_id] = ElevatorState.fault
-        for outer_task in outer_requests:
-            if outer_task.state == OuterTaskState.waiting:
-                if outer_task.target in up_targets[self.elev_id] or outer_task.target in down_targets[self.elev_id]:
-                    outer_task.state = OuterTaskState.unassigned  # 把原先分配给它的任务交给handler重新分配
-        up_targets[self.elev_id] = []
-        down_targets[self.elev_id] = []
-
-    def run(self):
-        while True:
-            mutex.lock()
-            if elevator_states[self.elev_id] == ElevatorState.fault:
-                self.fault_tackle()
-                mutex.unlock()
-                continue
-
-            # 向上扫描状态时
-            if move_states[self.elev_id] == MoveState.up:
-                if up_targets[self.elev_id] != []:
-                    if up_targets[self.elev_id][0] == cur_floor[self.elev_id]:
-                        self.door_operation()
-                        # 到达以后 把完成的任务删去
-                        # 内部的任务
-                        if up_targets != []:
-                            up_targets[self.elev_id].pop(0)
-                        # 外部按钮的任务
-                        for outer_task in outer_requests:
-                            if outer_task.target == cur_floor[self.elev_id]:
-                                outer_task.state = OuterTaskState.finished  # 交给handler处理
-                    elif up_targets[self.elev_id][0] > cur_floor[self.elev_id]:
-                        self.go_one_floor(MoveState.up)
-
-                # 当没有上行目标而出现下行目标时 更换状态
-                elif up_targets[self.elev_id] == [] and down_targets[self.elev_id] != []:
-                    move_states[self.elev_id] = MoveState.down
-
-            # 向下扫描状态时
-            elif move_states[self.elev_id] == MoveState.down:
-                if down_targets[self.elev_id] != []:
-                    if down_targets[self.elev_id][0] == cur_floor[self.elev_id]:
-                        self.door_operation()
-                        # 到达以后 把完成的任务删去
-                        # 内部的任务
-                        if down_targets != []:
-                            down_targets[self.elev_id].pop(0)
-                        # 外部按钮的任务
-                        for outer_task in outer_requests:
-                            if outer_task.target == cur_floor[self.elev_id]:
-                                outer_task.state = OuterTaskState.finished
-
-                    elif down_targets[self.elev_id][0] < cur_floor[self.elev_id]:
-                        self.go_one_floor(MoveState.down)
-
-                # 当没有下行目标而出现上行目标时 更换状态
-                elif down_targets[self.elev_id] == [] and up_targets[self.elev_id] != []:
-                    move_states[self.elev_id] = MoveState.up
-
-            mutex.unlock()
-
-
-class Handler(QThread):
-    def __init__(self):
-        super().__init__()  # 父类构造函数
-
-    def run(self):
-        while True:
-            mutex.lock()
-            # 不知为何 这里一定要声明一下全局变量..
-            global outer_requests
-
-            # handler只处理外面按钮产生的任务安排..
-            # 找到距离最短的电梯编号..
-            for outer_task in outer_requests:
-                if outer_task.state == OuterTaskState.unassigned:  # 如果未分配..
-                    min_distance = ELEVATOR_FLOORS + 1
-                    target_id = -1
-                    for i in range(ELEVATOR_NUM):
-                        # 符合要求的电梯，必须没有故障
-                        if elevator_states[i] == ElevatorState.fault:
-                            continue
-
-                        # 如果已经上行/下行了 就设成已经到达目的地的楼层了
-                        origin = cur_floor[i]
-                        if elevator_states[i] == ElevatorState.going_up:
-                            origin += 1
-                        elif elevator_states[i] == ElevatorState.going_down:
-                            origin -= 1
-
-
-                        if move_states[i] == MoveState.up:
-                            targets = up_targets[i]
-                        else:  # down
-                            targets = down_targets[i]
-
-                        # 本身对某一种方向来说，根据这部电梯是否与它运行方向相同，是在上方还是下方，是否有任务，分为8种情况..
-                        # 如果电梯运行方向无任务，则直接算绝对值
-                        if targets == []:
-                            distance = abs(origin - outer_task.target)
-                        # 如果电梯朝着按键所在楼层而来 且运行方向与理想方向相同 也是直接绝对值
-                        elif move_states[i] == outer_task.move_state and \
-                                ((outer_task.move_state == MoveState.up and outer_task.target >= origin) or
-                                 (outer_task.move_state == MoveState.down and outer_task.target <= origin)):
-                            distance = abs(origin - outer_task.target)
-                        # 其余情况则算最远任务楼层到目标楼层的绝对值和最远楼层到当前电梯楼层的绝对值之和
-                        else:
-                            distance = abs(origin - targets[-1]) + abs(outer_task.target - targets[-1])
-
-                        # 寻找最小值
-                        if distance < min_distance:
-                            min_distance = distance
-                            target_id = i
-
-                    # 假如找到了 对应添加任务..
-                    if target_id != -1:
-                        if cur_floor[target_id] == outer_task.target:
-                            if outer_task.move_state == MoveState.up and outer_task.target not in up_targets[
-                                target_id] and elevator_states[target_id] != ElevatorState.going_up:
-                                up_targets[target_id].append(outer_task.target)
-                                up_targets[target_id].sort()
-                                print(up_targets)
-                                # 设为等待态
-                                outer_task.state = OuterTaskState.waiting
-
-                            elif outer_task.move_state == MoveState.down and outer_task.target not in down_targets[
-                                target_id] and elevator_states[target_id] != ElevatorState.going_down:
-                                down_targets[target_id].append(outer_task.target)
-                                down_targets[target_id].sort(reverse=True)  # 这里需要降序！ 例如，[20,19,..1]
-                                print(down_targets)
-                                # 设为等待态
-                                outer_task.state = OuterTaskState.waiting
-
-                        elif cur_floor[target_id] < outer_task.target and outer_task.target not in up_targets[
-                            target_id]:  # up
-                            up_targets[target_id].append(outer_task.target)
-                            up_targets[target_id].sort()
-                            print(up_targets)
-                            # 设为等待态
-                            outer_task.state = OuterTaskState.waiting
-                        elif cur_floor[target_id] > outer_task.target and outer_task.target not in down_targets[
-                            target_id]:  # down
-                            down_targets[target_id].append(outer_task.target)
-                            down_targets[target_id].sort(reverse=True)  # 这里需要降序！ 例如，[20,19,..1]
-                            print(down_targets)
-                            # 设为等待态
-                            outer_task.state = OuterTaskState.waiting
-
-            # 查看哪些任务已经完成了 移除已经完成的..
-            outer_requests = [task for task in outer_requests if task.state != OuterTaskState.finished]
-
-            mutex.unlock()
+UI_SIZE = QRect(200, 200, 800, 800)
 
 
 # 图形化界面 同时处理画面更新和输入
@@ -356,14 +27,19 @@ class ElevatorUi(QWidget):
     def __init__(self):
         super().__init__()  # 父类构造函数
         self.output = None
-        # 各种需要更新的按钮 显示屏等收集
-        self.__floor_displayers = []
-        self.__inner_num_buttons = []
-        self.__inner_open_buttons = []
-        self.__inner_close_buttons = []
-        self.__outer_up_buttons = []
-        self.__outer_down_buttons = []
-        self.__inner_fault_buttons = []
+        self.shaft = None  # 电梯井的示意图 见shaft_view.py
+
+        # 上一帧画出的内容 没有变化就不再重画
+        self.__rendered = None  # 上一帧画出的快照
+        self.__clock_shown = None  # 上一帧显示的模拟时间 单位 秒
+        self.__event_shown = 0  # 输出框中最后一个事件的序号
+        # 每帧用时的统计 单位 毫秒
+        self.frames = 0  # 画过的帧数
+        self.frames_skipped = 0  # 没有变化而跳过的帧数
+        self.frame_time_total = 0.0
+        self.frame_time_max = 0.0
+        self.frame_histogram = registry.histogram("elevator_ui_frame_seconds", "界面每帧用时（不含跳过的帧）")
+        self.skip_counter = registry.counter("elevator_ui_frames_skipped", "没有变化而跳过的帧数")
 
         # 定时器 用于定时更新UI界面
         self.timer = QTimer()
@@ -379,76 +55,21 @@ class ElevatorUi(QWidget):
         h1 = QHBoxLayout()
         self.setLayout(h1)
 
-        h2 = QHBoxLayout()
-        h1.addLayout(h2)
-
-        for i in range(ELEVATOR_NUM):
-            v2 = QVBoxLayout()
-            h2.addLayout(v2)
-            # 电梯上方的LCD显示屏
-            floor_display = QLCDNumber()
-            floor_display.setFixedSize(100, 50)
-            self.__floor_displayers.append(floor_display)
-            v2.addWidget(floor_display)
-            self.__inner_num_buttons.append([])
-            for j in range(ELEVATOR_FLOORS):
-                # 内部数字按键
-                button = QPushButton(str(ELEVATOR_FLOORS - j))
-                button.setFixedSize(100, 25)
-                button.clicked.connect(partial(self.__inner_num_button_clicked, i, ELEVATOR_FLOORS - j))
-                button.setStyleSheet("background-color : rgb(255,255,255)")
-                self.__inner_num_buttons[i].append(button)
-                v2.addWidget(button)
-            # 故障按钮
-            fault_button = QPushButton("故障")
-            fault_button.setFixedSize(100, 30)
-            fault_button.clicked.connect(partial(self.__inner_fault_button_clicked, i))
-            self.__inner_fault_buttons.append(fault_button)
-            v2.addWidget(fault_button)
-            h3 = QHBoxLayout()
-            # 开门按钮
-            open_button = QPushButton("开门")
-            open_button.setFixedSize(50, 30)
-            open_button.clicked.connect(partial(self.__inner_open_button_clicked, i))
-            self.__inner_open_buttons.append(open_button)
-            # 关门按钮
-            close_button = QPushButton("关门")
-            close_button.setFixedSize(50, 30)
-            close_button.clicked.connect(partial(self.__inner_close_button_clicked, i))
-            self.__inner_close_buttons.append(close_button)
-            v2.addLayout(h3)
-            h3.addWidget(open_button)
-            h3.addWidget(close_button)
-
-        v3 = QVBoxLayout()
-        h1.addLayout(v3)
-        for i in range(ELEVATOR_FLOORS):
-            h4 = QHBoxLayout()
-            v3.addLayout(h4)
-            label = QLabel(str(ELEVATOR_FLOORS - i))
-            h4.addWidget(label)
-            if i != 0:
-                # 给2楼到顶楼放置上行按钮
-                up_button = QPushButton("↑")
-                up_button.setFixedSize(30, 30)
-                up_button.clicked.connect(
-                    partial(self.__outer_direction_button_clicked, ELEVATOR_FLOORS - i, MoveState.up))
-                self.__outer_up_buttons.append(up_button)  # 从顶楼往下一楼开始..
-                h4.addWidget(up_button)
-
-            if i != ELEVATOR_FLOORS - 1:
-                # 给1楼到顶楼往下一楼放置下行按钮
-                down_button = QPushButton("↓")
-                down_button.setFixedSize(30, 30)
-                down_button.clicked.connect(
-                    partial(self.__outer_direction_button_clicked, ELEVATOR_FLOORS - i, MoveState.down))
-                self.__outer_down_buttons.append(down_button)  # 从顶楼开始..到2楼
-                h4.addWidget(down_button)
+        # 所有电梯和楼层画在一个控件中 楼层或电梯多时可以滚动
+        self.shaft = ShaftView(ELEVATOR_NUM, ELEVATOR_FLOORS, clock.now)
+        self.shaft.car_call_clicked.connect(call_car)
+        self.shaft.hall_call_clicked.connect(call_hall)
+        self.shaft.fault_clicked.connect(toggle_fault)
+        self.shaft.open_clicked.connect(press_open)
+        self.shaft.close_clicked.connect(press_close)
+        scroll_area = QScrollArea()
+        scroll_area.setWidget(self.shaft)
+        h1.addWidget(scroll_area, 1)
 
         v1 = QVBoxLayout()
         h1.addLayout(v1)
-        label = QLabel("2052329 方必诚\n按下数字键表示电梯将前往该层\n按↑↓键表示此楼有人需要搭乘\n电梯内部按钮黄色表示被按下\n渐变表示开门关门\n外部按钮粉色被按下表明该楼需要停靠\n\n"
-                       "输入数字后点击按钮产生任务")
+        label = QLabel("2052329 方必诚\n点击电梯井中的格子表示电梯将前往该层\n按↑↓键表示此楼有人需要搭乘\n黄色表示电梯将要停靠该层\n"
+                       "蓝色为电梯 渐变表示开门关门\n外部按钮粉色被按下表明该楼需要停靠\n\n输入数字后点击按钮产生任务")
         v1.addWidget(label)
 
         # 接收用户输入的产生任务的数量
@@ -460,9 +81,27 @@ class ElevatorUi(QWidget):
         button.clicked.connect(self.__generate_tasks)
         v1.addWidget(button)
 
+        # 模拟时钟的倍速 暂停和单步
+        h5 = QHBoxLayout()
+        v1.addLayout(h5)
+        self.speed_box = QComboBox()
+        for speed in SPEEDS:
+            self.speed_box.addItem(str(speed) + "×" if speed else "暂停", speed)
+        self.__show_speed()
+        self.speed_box.activated.connect(lambda index: self.set_speed(self.speed_box.itemData(index)))
+        h5.addWidget(self.speed_box)
+        button = QPushButton("单步")
+        button.clicked.connect(self.step)
+        h5.addWidget(button)
+        self.clock_label = QLabel()
+        h5.addWidget(self.clock_label)
+
         # 输出电梯信息
-        self.output = QTextEdit()
-        self.output.setText("此处输出电梯运转信息：\n")
+        # 只保留最近的RING_SIZE行 长时间运行也不会越来越慢
+        self.output = QPlainTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setMaximumBlockCount(RING_SIZE)
+        self.output.setPlainText("此处输出电梯运转信息：")
         v1.addWidget(self.output)
 
         # 设置定时
@@ -478,178 +117,110 @@ class ElevatorUi(QWidget):
             if random.randint(0, 100) < 30:  # 30% 产生外部任务
                 rand = random.randint(1, ELEVATOR_FLOORS)
                 if rand == 1:  # 1楼只能向上
-                    self.__outer_direction_button_clicked(1, MoveState.up)
+                    call_hall(1, MoveState.up)
                 elif rand == ELEVATOR_FLOORS:  # 顶楼只能向下
-                    self.__outer_direction_button_clicked(rand, MoveState.down)
+                    call_hall(rand, MoveState.down)
                 else:  # 其余则随机指派方向
-                    self.__outer_direction_button_clicked(rand, random.choice([MoveState.up, MoveState.down]))
+                    call_hall(rand, random.choice([MoveState.up, MoveState.down]))
             else:  # 产生内部任务
-                self.__inner_num_button_clicked(random.randint(0, ELEVATOR_NUM - 1), random.randint(1, ELEVATOR_FLOORS))
-
-    def __inner_open_button_clicked(self, elevator_id):
-        mutex.lock()
-        if elevator_states[elevator_id] == ElevatorState.fault:
-            self.output.append(str(elevator_id) + "号电梯出现故障 正在维修!")
-            mutex.unlock()
-            return
-
-        if elevator_states[elevator_id] == ElevatorState.closing_door or elevator_states[
-            elevator_id] == ElevatorState.open_door:
-            is_open_button_clicked[elevator_id] = True
-            is_close_button_clicked[elevator_id] = False
-        mutex.unlock()
-
-        self.__inner_open_buttons[elevator_id].setStyleSheet("background-color : yellow")
-        self.output.append(str(elevator_id) + "电梯开门!")
-
-    def __inner_close_button_clicked(self, elevator_id):
-        mutex.lock()
-        if elevator_states[elevator_id] == ElevatorState.fault:
-            self.output.append(str(elevator_id) + "号电梯出现故障 正在维修!")
-            mutex.unlock()
-            return
-
-        if elevator_states[elevator_id] == ElevatorState.opening_door or elevator_states[
-            elevator_id] == ElevatorState.open_door:
-            is_close_button_clicked[elevator_id] = True
-            is_open_button_clicked[elevator_id] = False
-        mutex.unlock()
-
-        self.__inner_close_buttons[elevator_id].setStyleSheet("background-color : yellow")
-        self.output.append(str(elevator_id) + "电梯关门!")
-
-    def __inner_fault_button_clicked(self, elevator_id):
-        mutex.lock()
-        if elevator_states[elevator_id] != ElevatorState.fault:
-            elevator_states[elevator_id] = ElevatorState.fault
-            mutex.unlock()
-
-            self.__inner_fault_buttons[elevator_id].setStyleSheet("background-color : yellow")
-            for button in self.__inner_num_buttons[elevator_id]:
-                button.setStyleSheet("background-color : rgb(255,255,255)")
-            self.__inner_open_buttons[elevator_id].setStyleSheet("background-color : None")
-            self.__inner_close_buttons[elevator_id].setStyleSheet("background-color : None")
-
-            self.output.append(str(elevator_id) + "电梯故障!")
-
-        else:
-            elevator_states[elevator_id] = ElevatorState.normal
-            mutex.unlock()
-
-            self.__inner_fault_buttons[elevator_id].setStyleSheet("background-color : None")
-            self.output.append(str(elevator_id) + "电梯正常!")
-
-    def __inner_num_button_clicked(self, elevator_id, floor):
-        mutex.lock()
-
-        if elevator_states[elevator_id] == ElevatorState.fault:
-            self.output.append(str(elevator_id) + "号电梯出现故障 正在维修!")
-            mutex.unlock()
-            return
-
-        # 相同楼层不处理
-        if floor == cur_floor[elevator_id]:
-            mutex.unlock()
-            return
-
-        if elevator_states[elevator_id] != ElevatorState.fault:
-            if floor > cur_floor[elevator_id] and floor not in up_targets[elevator_id]:
-                up_targets[elevator_id].append(floor)
-                up_targets[elevator_id].sort()
-            elif floor < cur_floor[elevator_id] and floor not in down_targets[elevator_id]:
-                down_targets[elevator_id].append(floor)
-                down_targets[elevator_id].sort(reverse=True)  # 降序 例如[20,19..]
-
-            mutex.unlock()
-
-            self.__inner_num_buttons[elevator_id][ELEVATOR_FLOORS - floor].setStyleSheet("background-color : yellow")
-            self.output.append(str(elevator_id) + "号电梯" + "的用户请求前往" + str(floor) + "楼!")
-
-    def __outer_direction_button_clicked(self, floor, move_state):
-        mutex.lock()
-
-        all_fault_flag = True
-        for state in elevator_states:
-            if state != ElevatorState.fault:
-                all_fault_flag = False
-
-        if all_fault_flag:
-            self.output.append("所有电梯均已故障！")
-            mutex.unlock()
-            return
-
-        task = OuterTask(floor, move_state)
-
-        if task not in outer_requests:
-            outer_requests.append(task)
-
-            if move_state == MoveState.up:
-                self.__outer_up_buttons[ELEVATOR_FLOORS - floor - 1].setStyleSheet("background-color : yellow")
-                self.output.append(str(floor) + "楼的用户上楼请求!")
-
-            elif move_states == MoveState.down:
-                self.__outer_down_buttons[ELEVATOR_FLOORS - floor].setStyleSheet("background-color : yellow")
-                self.output.append(str(floor) + "楼的用户下楼请求!")
-
-        mutex.unlock()
-
+                call_car(random.randint(0, ELEVATOR_NUM - 1), random.randint(1, ELEVATOR_FLOORS))
+
+    def set_speed(self, speed):
+        clock.set_speed(speed)
+        self.__show_speed()
+
+    # 前进一小段模拟时间后暂停
+    def step(self):
+        clock.step()
+        self.__show_speed()
+
+    def __show_speed(self):
+        speed = clock.speed
+        index = self.speed_box.findData(speed)
+        # 用--speed给了下拉框中没有的倍速
+        if index == -1:
+            self.speed_box.addItem(str(speed) + "×", speed)
+            index = self.speed_box.count() - 1
+        self.speed_box.setCurrentIndex(index)
+
+    # 只读取快照 不需要加锁
+    # 与上一帧比较 没有变化就跳过
     def update(self):
-        mutex.lock()
-        for i in range(ELEVATOR_NUM):
-            # 实时更新楼层
-            if elevator_states[i] == ElevatorState.going_up:
-                self.__floor_displayers[i].display("↑" + str(cur_floor[i]))
-            elif elevator_states[i] == ElevatorState.going_down:
-                self.__floor_displayers[i].display("↓" + str(cur_floor[i]))
-            else:
-                self.__floor_displayers[i].display(cur_floor[i])
-
-            # 实时更新开关门按钮
-            if not is_open_button_clicked[i]:
-                self.__inner_open_buttons[i].setStyleSheet("background-color : None")
-
-            if not is_close_button_clicked[i]:
-                self.__inner_close_buttons[i].setStyleSheet("background-color : None")
-
-            # 对内部的按钮，如果在开门或关门状态的话，则设进度条
-            if elevator_states[i] in [ElevatorState.opening_door, ElevatorState.open_door, ElevatorState.closing_door]:
-                self.__inner_num_buttons[i][ELEVATOR_FLOORS - cur_floor[i]].setStyleSheet(
-                    "background-color : rgb(255," + str(int(255 * (1 - open_progress[i]))) + ",255)")
-
-        mutex.unlock()
-        # 对外部来说，遍历任务，找出未完成的设为红色，其他设为默认none
-        for button in self.__outer_up_buttons:
-            button.setStyleSheet("background-color : None")
+        start = time.perf_counter()
+        seconds = int(clock.now() / 1000)
+        if self.__clock_shown != seconds:
+            self.__clock_shown = seconds
+            self.clock_label.setText("模拟时间 " + time.strftime("%H:%M:%S", time.gmtime(seconds)))
+        # 新的事件一帧只追加一次
+        events = event_log.events_since(self.__event_shown)
+        if events:
+            self.__event_shown = events[-1].seq
+            self.output.appendPlainText("\n".join(event.message for event in events))
+        snapshot = elevator_core.bank_snapshot
+        last = self.__rendered
+        # 电梯线程只在每个阶段的开始和结束发布快照 有电梯在运行或开关门时每一帧都要重画动画
+        if last is not None and last.version == snapshot.version and not any(is_animating(car)
+                                                                             for car in snapshot.cars):
+            self.frames_skipped += 1
+            self.skip_counter.inc()
+            return
 
-        for button in self.__outer_down_buttons:
-            button.setStyleSheet("background-color : None")
+        # 只重画电梯井露出来的部分 开销与楼层数和电梯数无关
+        self.shaft.refresh(snapshot)
 
-        mutex.lock()
-        for outer_task in outer_requests:
-            if outer_task.state != OuterTaskState.finished:
-                if outer_task.move_state == MoveState.up:  # 注意index
-                    self.__outer_up_buttons[ELEVATOR_FLOORS - outer_task.target - 1].setStyleSheet(
-                        "background-color : pink")
-                elif outer_task.move_state == MoveState.down:
-                    self.__outer_down_buttons[ELEVATOR_FLOORS - outer_task.target].setStyleSheet(
-                        "background-color : pink")
+        self.__rendered = snapshot
+        frame_time = (time.perf_counter() - start) * 1000
+        self.frames += 1
+        self.frame_time_total += frame_time
+        self.frame_time_max = max(self.frame_time_max, frame_time)
+        self.frame_histogram.observe(frame_time / 1000)
 
-        mutex.unlock()
+    # 每帧用时报告
+    def frame_report(self):
+        average = self.frame_time_total / self.frames if self.frames else 0.0
+        return "界面共画了" + str(self.frames) + "帧 跳过" + str(self.frames_skipped) + "帧 平均每帧" + \
+            str(round(average, 3)) + "毫秒 最长" + str(round(self.frame_time_max, 3)) + "毫秒"
 
 
 if __name__ == '__main__':
+    # 用法: python elevator_simulator.py [--trace 记录文件] [--replay 记录文件] [--speed 倍速] [--policy 调度策略]
+    #                                    [--metrics 指标文件 [--metrics-interval 秒数]] [--log 日志文件]
+    # --trace把运行过程记录到文件中 --replay按原来的时间间隔回放记录中的按钮 --speed为模拟时钟的初始倍速
+    # --policy为dispatch_policy.py中的调度策略 默认为nearest
+    # --metrics定期把运行指标写入文件 扩展名为.prom时为Prometheus的文本格式 否则为JSON
+    # --log把事件日志写入文件 每行一个JSON 超过10MB后轮转
+    options = {}
+    for option in ["--trace", "--replay", "--speed", "--policy", "--metrics", "--metrics-interval", "--log"]:
+        if option in sys.argv:
+            i = sys.argv.index(option)
+            options[option] = sys.argv[i + 1]
+            del sys.argv[i:i + 2]
+    if "--trace" in options:
+        elevator_core.trace = TraceWriter(options["--trace"])
+    if "--speed" in options:
+        clock.set_speed(float(options["--speed"]))
+    if "--log" in options:
+        event_log.set_file(options["--log"])
+
     app = QApplication(sys.argv)
 
     # 开启线程
-    handler = Handler()
-    handler.start()
-
-    elevators = []
-    for i in range(ELEVATOR_NUM):
-        elevators.append(Elevator(i))
-
-    for elevator in elevators:
-        elevator.start()
+    handler, elevators = elevator_core.start(make_policy(options.get("--policy", "nearest")))
 
     e = ElevatorUi()
+    if "--replay" in options:
+        # 按钮的函数都是线程安全的 回放线程直接按下 不需要交给界面线程
+        TraceReplayer(options["--replay"]).start()
+    if elevator_core.trace is not None:
+        app.aboutToQuit.connect(elevator_core.trace.close)
+    if "--metrics" in options:
+        exporter = MetricsExporter(registry, options["--metrics"], float(options.get("--metrics-interval", 10)))
+        app.aboutToQuit.connect(exporter.close)
+    app.aboutToQuit.connect(event_log.close)
+    # 退出时输出调度延迟
+    app.aboutToQuit.connect(lambda: print(handler.report()))
+    # 退出时输出每帧用时
+    app.aboutToQuit.connect(lambda: print(e.frame_report()))
+    # 退出时输出各个锁的等待时间
+    app.aboutToQuit.connect(lambda: print(lock_report()))
     sys.exit(app.exec_())
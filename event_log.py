@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+# 事件日志 代替print和界面输出框的无限追加
+# 电梯线程、handler和界面只把事件的各个部分放进一个有界的队列 不在持有锁时格式化或输出
+# 后台线程定期取出事件 格式化后放进固定大小的环形缓冲（界面的输出框只显示这些）
+# 给了文件时再以JSON行写入文件 文件超过大小后轮转
+
+QUEUE_SIZE = 100000  # 等待格式化的事件数上限 来不及处理时丢掉最早的
+RING_SIZE = 500  # 环形缓冲保留的事件数 也是界面输出框保留的行数
+DRAIN_INTERVAL = 0.05  # 后台线程每隔多久取一次事件 单位 秒
+MAX_FILE_BYTES = 10 * 1024 * 1024  # 日志文件超过这个大小就轮转
+BACKUP_COUNT = 3  # 轮转时保留的旧文件数 path.1为最近的
+
+Event = namedtuple("Event", ["seq", "time", "kind", "elev_id", "message"])
+
+
+def wall_clock_ms():
+    return time.time() * 1000
+
+
+class EventLog:
+    # now()返回事件的时刻 单位 毫秒
+    def __init__(self, now=wall_clock_ms, ring_size=RING_SIZE, queue_size=QUEUE_SIZE):
+        self.now = now
+        self.dropped = 0  # 队列满而丢掉的事件数 多个线程同时记录时只是大概的数
+        self.last_seq = 0  # 已经放进环形缓冲的最后一个事件的序号
+        self.__pending = deque(maxlen=queue_size)
+        self.__ring = deque(maxlen=ring_size)
+        self.__ring_lock = threading.Lock()
+        self.__drain_lock = threading.Lock()
+        self.__file = None
+        self.__path = None
+        self.__max_bytes = MAX_FILE_BYTES
+        self.__backup_count = BACKUP_COUNT
+        self.__closed = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="event-log", daemon=True)
+        self.__thread.start()
+
+    # 记录一个事件 消息为各个parts转成字符串后连起来 在后台线程中才做格式化
+    # parts中可变的对象（例如StopSet）需要传副本
+    def log(self, kind, elev_id, *parts):
+        if len(self.__pending) == self.__pending.maxlen:
+            self.dropped += 1
+        self.__pending.append((self.now(), kind, elev_id, parts))
+
+    # 同时写入文件 文件超过max_bytes后轮转
+    def set_file(self, path, max_bytes=MAX_FILE_BYTES, backup_count=BACKUP_COUNT):
+        with self.__drain_lock:
+            if self.__file is not None:
+                self.__file.close()
+            self.__path = path
+            self.__max_bytes = max_bytes
+            self.__backup_count = backup_count
+            self.__file = open(path, "a", encoding="utf-8")
+
+    # 环形缓冲中序号大于seq的事件 按序号排列
+    def events_since(self, seq):
+        with self.__ring_lock:
+            if not self.__ring or self.__ring[-1].seq <= seq:
+                return []
+            events = []
+            for event in reversed(self.__ring):
+                if event.seq <= seq:
+                    break
+                events.append(event)
+        events.reverse()
+        return events
+
+    # 把队列中的事件全部处理掉 可以在任意线程调用
+    def drain(self):
+        with self.__drain_lock:
+            events = []
+            seq = self.last_seq
+            while self.__pending:
+                at, kind, elev_id, parts = self.__pending.popleft()
+                seq += 1
+                events.append(Event(seq, at, kind, elev_id, "".join(str(part) for part in parts)))
+            if not events:
+                return
+            with self.__ring_lock:
+                self.__ring.extend(events)
+                self.last_seq = events[-1].seq
+            if self.__file is not None:
+                self.__file.write("".join(json.dumps(event._asdict(), ensure_ascii=False) + "\n" for event in events))
+                self.__file.flush()
+                if self.__file.tell() > self.__max_bytes:
+                    self.__rotate()
+
+    def __rotate(self):
+        self.__file.close()
+        if self.__backup_count > 0:
+            for i in range(self.__backup_count - 1, 0, -1):
+                if os.path.exists(self.__path + "." + str(i)):
+                    os.replace(self.__path + "." + str(i), self.__path + "." + str(i + 1))
+            os.replace(self.__path, self.__path + ".1")
+            self.__file = open(self.__path, "a", encoding="utf-8")
+        else:
+            self.__file = open(self.__path, "w", encoding="utf-8")
+
+    def __run(self):
+        while not self.__closed.wait(DRAIN_INTERVAL):
+            self.drain()
+
+    def close(self):
+        self.__closed.set()
+        self.__thread.join()
+        self.drain()
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
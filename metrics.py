@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# 运行指标 计数器和直方图
+# 每次更新只是加锁后加几个数 可以一直开着
+# 导出为JSON或Prometheus的文本格式 MetricsExporter在后台线程中定期写入文件
+
+# 默认的直方图分桶上界 单位 秒 从10微秒到10秒大致按1-2.5-5递增
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.__lock:
+            self.value += amount
+
+    def to_dict(self):
+        return {"value": self.value}
+
+    def samples(self, name, labels):
+        yield name + "_total", labels, self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.__lock = threading.Lock()
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个为超过所有上界的
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self.__lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    # 由分桶估计的百分位数 取所在分桶的上界
+    def percentile(self, p):
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {"count": self.count, "sum": self.sum, "avg": self.sum / self.count if self.count else 0.0,
+                "p50": self.percentile(50), "p99": self.percentile(99), "max": self.max,
+                "buckets": dict(zip([str(bound) for bound in self.buckets] + ["+Inf"], self.counts))}
+
+    def samples(self, name, labels):
+        seen = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            seen += count
+            yield name + "_bucket", labels + (("le", str(bound)),), seen
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, self.count
+
+
+# 所有指标的集合 同名的指标可以有多组标签 例如每把锁、每台电梯各一组
+class MetricsRegistry:
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__families = {}  # 名称 -> [类型, 说明, {标签: 指标}]
+        self.__collectors = []
+
+    def __get(self, cls, name, help_text, labels, *args):
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+        with self.__lock:
+            family = self.__families.setdefault(name, [cls.kind, help_text, {}])
+            if family[0] != cls.kind:
+                raise ValueError(name + " 已经是" + family[0])
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = cls(*args)
+            return metric
+
+    # 取得（没有则创建）一个计数器 labels为标签 例如counter("x", "说明", car=0)
+    def counter(self, name, help_text, **labels):
+        return self.__get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS, **labels):
+        return self.__get(Histogram, name, help_text, labels, buckets)
+
+    # 导出前调用collector() 用于补上还没有记下的部分 例如电梯在当前状态已经停留的时间
+    def add_collector(self, collector):
+        self.__collectors.append(collector)
+
+    def __collect(self):
+        for collector in self.__collectors:
+            collector()
+        with self.__lock:
+            return [(name, family[0], family[1], list(family[2].items()))
+                    for name, family in sorted(self.__families.items())]
+
+    def to_dict(self):
+        result = {}
+        for name, kind, help_text, metrics in self.__collect():
+            result[name] = {"type": kind, "help": help_text,
+                            "values": [dict(labels=dict(labels), **metric.to_dict()) for labels, metric in metrics]}
+        return result
+
+    def to_prometheus(self):
+        lines = []
+        for name, kind, help_text, metrics in self.__collect():
+            lines.append("# HELP " + name + " " + help_text)
+            lines.append("# TYPE " + name + " " + kind)
+            for labels, metric in metrics:
+                for sample_name, sample_labels, value in metric.samples(name, labels):
+                    if sample_labels:
+                        sample_name += "{" + ",".join(label + '="' + escape_label(value) + '"'
+                                                      for label, value in sample_labels) + "}"
+                    lines.append(sample_name + " " + repr(float(value)))
+        return "\n".join(lines) + "\n"
+
+    # 按扩展名选择格式 .prom为Prometheus的文本格式 其余为JSON
+    # 先写临时文件再改名 读的一方不会读到写了一半的文件
+    def write(self, path):
+        if path.endswith(".prom"):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps({"time": time.time(), "metrics": self.to_dict()}, ensure_ascii=False, indent=1)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# 每隔interval秒把registry写入path 退出时再写一次
+class MetricsExporter:
+    def __init__(self, registry, path, interval=10.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="metrics-exporter", daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            self.registry.write(self.path)
+
+    def close(self):
+        self.__stop.set()
+        self.__thread.join()
+        self.registry.write(self.path)
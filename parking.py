@@ -0,0 +1,140 @@
+import sys
+import time
+
+from elevator_model import ELEVATOR_FLOORS, ElevatorState, MoveState
+from sim_engine import DAY
+
+# 空闲电梯的停靠
+# 按一天中的时段记下各层各方向的外部按钮次数 旧的次数随时间衰减（半衰期默认一周）
+# 电梯没有任务时 不再停在最后一个停靠的楼层 而是开往当前时段外部按钮最多的楼层 例如早高峰时的大堂
+# 记录一次按钮只加一个数 挑选停靠楼层只看各台电梯和本时段各层的次数 每个事件都可以调用
+
+SLOT = 15 * 60 * 1000  # 每个时段的长度 单位 毫秒
+HALF_LIFE = 7 * DAY  # 次数的半衰期 单位 毫秒
+MIN_SHARE = 0.1  # 至少占本时段外部按钮的这个比例的楼层才值得停靠
+RESCALE_LIMIT = 1e100  # 新记录的权重超过这个数时整体缩小 防止溢出
+
+
+class IdleParking:
+    def __init__(self, floors=ELEVATOR_FLOORS, half_life=HALF_LIFE, min_share=MIN_SHARE, slot=SLOT):
+        self.floors = floors
+        self.half_life = half_life
+        self.min_share = min_share
+        self.slot = slot
+        self.slots = DAY // slot
+        # 每个时段各层各方向的权重 下标为 楼层 * 2 + (方向为下行)
+        # 不逐个衰减旧的权重 而是让新记录的权重按2^(时间/半衰期)增长 比较时效果相同
+        self.weights = [[0.0] * ((floors + 1) * 2) for _ in range(self.slots)]
+        self.totals = [0.0] * self.slots
+        self.origin = 0.0  # 权重为1的时刻
+        self.parked = {}  # 电梯编号 -> 最近一次被派去停靠的楼层
+        self.parks = 0  # 派去停靠的次数
+
+    def slot_of(self, now):
+        return int(now % DAY // self.slot)
+
+    # 外部按钮被按下
+    def record(self, floor, move_state, now):
+        weight = 2.0 ** ((now - self.origin) / self.half_life)
+        if weight > RESCALE_LIMIT:
+            self.__rescale(now)
+            weight = 1.0
+        slot = self.slot_of(now)
+        self.weights[slot][floor * 2 + (move_state == MoveState.down)] += weight
+        self.totals[slot] += weight
+
+    def __rescale(self, now):
+        factor = 2.0 ** (-(now - self.origin) / self.half_life)
+        for weights in self.weights:
+            weights[:] = [weight * factor for weight in weights]
+        self.totals = [total * factor for total in self.totals]
+        self.origin = now
+
+    # 每层两个方向合计的需求 取当前时段和下一个时段 下一个时段的需求来自前几天的记录
+    def demand(self, now):
+        slot = self.slot_of(now)
+        current = self.weights[slot]
+        following = self.weights[(slot + 1) % self.slots]
+        total = self.totals[slot] + self.totals[(slot + 1) % self.slots]
+        return [current[2 * floor] + current[2 * floor + 1] + following[2 * floor] + following[2 * floor + 1]
+                for floor in range(self.floors + 1)], total
+
+    # 空闲的电梯elev_id应该开往哪一层停靠 不需要移动时返回None
+    # cars为所有电梯的快照或状态 需求大的楼层按需求的比例分配电梯 至少一台
+    # 已经停在或正开往某层停靠的其它电梯算作该层已有的电梯
+    def choose(self, elev_id, cars, now):
+        demand, total = self.demand(now)
+        if total <= 0:
+            return None
+        hot = sorted(((weight, floor) for floor, weight in enumerate(demand) if weight >= self.min_share * total),
+                     reverse=True)
+        if not hot:
+            return None
+
+        available = 0
+        covered = {}  # 楼层 -> 停在或正开往该层停靠的其它电梯数
+        for car in cars:
+            if car.state == ElevatorState.fault:
+                continue
+            available += 1
+            if car.elev_id == elev_id:
+                continue
+            up, down = car.up_targets, car.down_targets
+            if not up and not down:
+                floor = car.cur_floor
+            else:
+                floor = self.parked.get(car.elev_id)
+                if floor is None or len(up) + len(down) != 1 or (floor not in up and floor not in down):
+                    continue
+            covered[floor] = covered.get(floor, 0) + 1
+
+        car = cars[elev_id]
+        for weight, floor in hot:
+            if covered.get(floor, 0) < max(1, round(weight / total * available)):
+                if floor == car.cur_floor:
+                    return None
+                self.parked[elev_id] = floor
+                self.parks += 1
+                return floor
+        return None
+
+
+# 连续days天的工作日交通 每天用不同的随机种子
+def workdays(peak_rate, floors, days, seed=0):
+    from workload import DayTraffic, Trip
+
+    for day in range(days):
+        for trip in DayTraffic(peak_rate, floors, seed * days + day):
+            yield Trip(trip.time + day * DAY, trip.origin, trip.destination)
+
+
+if __name__ == '__main__':
+    # 用法: python parking.py [天数] [峰值每小时出行次数] [电梯数] [层数] [调度策略]
+    # 同样的几天工作日交通 分别在不停靠和空闲停靠时各跑一次 比较每天的平均等待时间
+    # 第一天停靠的依据只有当天已经发生的按钮 之后几天还有前几天同一时段的记录
+    from benchmark import summarize
+    from dispatch_policy import make_policy
+    from sim_engine import Simulation
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1200
+    elevator_num = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    floors = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+    policy = sys.argv[5] if len(sys.argv) > 5 else "nearest"
+
+    for name, parking in [("不停靠", None), ("空闲停靠", IdleParking(floors))]:
+        sim = Simulation(elevator_num, floors, policy=make_policy(policy))
+        sim.parking = parking
+        sim.feed(workdays(rate, floors, days))
+        start = time.perf_counter()
+        for day in range(days):
+            waited = len(sim.wait_times)
+            rode = len(sim.rider_wait_times)
+            sim.run(until=(day + 1) * DAY)
+            hall_wait = summarize(sim.wait_times[waited:])
+            rider_wait = summarize(sim.rider_wait_times[rode:])
+            print(name, "第", day + 1, "天 外部按钮平均等待", round(hall_wait["avg"], 2), "秒 p95",
+                  round(hall_wait["p95"], 2), "秒 乘客平均候梯", round(rider_wait["avg"], 2), "秒 p95",
+                  round(rider_wait["p95"], 2), "秒")
+        print(name, "用时", round(time.perf_counter() - start, 2), "秒",
+              "停靠" + str(parking.parks) + "次" if parking is not None else "")
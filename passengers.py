@@ -0,0 +1,122 @@
+import sys
+import time
+
+from benchmark import summarize
+from dispatch_policy import EtaPolicy
+from elevator_model import TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME, LOBBY, ElevatorState, OuterTask, \
+    can_add_outer_target
+from sim_engine import THROUGHPUT_INTERVAL, Simulation
+from workload import HOUR, PATTERNS
+
+# 乘客级的模拟 电梯载客量和目的楼层派梯
+# 乘客（workload.Trip）在模拟引擎中从到达、等电梯、上电梯到下电梯逐个跟踪 见sim_engine.py
+# Simulation(capacity=...)限制每台电梯的载客数 满载时没挤上去的人留在原楼层 关门后重新按按钮
+# 目的楼层派梯：在大堂等楼层 乘客在按钮面板上输入目的楼层 马上分到一台电梯
+# 去相同楼层的人尽量分到同一台电梯 每台电梯途中停靠的次数少了 高峰时的运送能力更大
+
+
+class DestinationDispatch:
+    # floors为装了目的楼层面板的楼层 其余楼层仍然是普通的上下键
+    def __init__(self, floors=(LOBBY,), time_per_floor=TIME_PER_FLOOR, opening_door_time=OPENING_DOOR_TIME,
+                 open_door_time=OPEN_DOOR_TIME):
+        self.floors = frozenset(floors)
+        self.eta = EtaPolicy(time_per_floor, opening_door_time, open_door_time).eta
+        self.stop_time = 2 * opening_door_time + open_door_time
+
+    # 为刚输入目的楼层的乘客挑选电梯 返回电梯编号 没有能接的电梯时返回-1 乘客改为按普通的外部按钮
+    # 不超额分配 每台电梯等它的人最多为载客量 高峰时排不上的人按普通按钮等下一台
+    # 代价为电梯到达出发楼层的时间 目的楼层不在电梯的停靠中时再加上多停一次的时间
+    # 每个乘客的开销与电梯数和载客量成正比 与等电梯的总人数无关
+    def choose(self, sim, trip):
+        task = OuterTask(trip.origin, trip.move_state)
+        best_cost = None
+        best_car = -1
+        for car in sim.cars:
+            if car.state == ElevatorState.fault:
+                continue
+            up, down = car.up_targets, car.down_targets
+            # 刚离开出发楼层的电梯接不了
+            if not can_add_outer_target(task, car.state, car.cur_floor, up, down) and trip.origin not in up and \
+                    trip.origin not in down:
+                continue
+            # 满载或者分到的人已经坐满的电梯不再分人
+            if sim.capacity is not None and len(car.riders) + car.assigned >= sim.capacity:
+                continue
+            cost = self.eta(car, task)
+            # 不加停靠也比已有的贵 不用再看分到它的人去哪里
+            if best_cost is not None and cost >= best_cost:
+                continue
+            if trip.destination not in up and trip.destination not in down and not any(
+                    other.destination == trip.destination
+                    for other in sim.assigned_waiting.get((car.elev_id, trip.origin), ())):
+                cost += self.stop_time
+            # 代价相同时取编号最小的
+            if best_cost is None or cost < best_cost:
+                best_cost = cost
+                best_car = car.elev_id
+        return best_car
+
+
+# 每5分钟送达的乘客数 [(这5分钟开始的时刻, 人数)] 单位 毫秒
+def throughput(sim):
+    return [(interval * THROUGHPUT_INTERVAL, count) for interval, count in sorted(sim.delivered.items())]
+
+
+# 模拟结束时还在等电梯的乘客已经等了的时间 单位 毫秒
+def waited_so_far(sim):
+    queues = list(sim.waiting.values()) + list(sim.assigned_waiting.values())
+    return [sim.now - trip.time for queue in queues for trip in queue]
+
+
+# 一次模拟的乘客统计 时间单位 秒
+# rider_wait只算已经上了电梯的人 过载时等得最久的人还没上去 all_wait把他们到结束为止等了的时间也算进去
+# 这只是他们等待时间的下限 所以过载时all_wait也偏小 要和still_waiting一起看
+def passenger_report(sim, wall_time):
+    counts = [count for _, count in throughput(sim)]
+    backlog = waited_so_far(sim)
+    return {
+        "delivered": len(sim.ride_times),
+        "peak_5min": max(counts, default=0),  # 送达人数最多的5分钟
+        "rider_wait": summarize(sim.rider_wait_times),
+        "backlog_wait": summarize(backlog),  # 还在等的人已经等了的时间
+        "all_wait": summarize(sim.rider_wait_times + backlog),
+        "ride_time": summarize(sim.ride_times),
+        "max_waiting": sim.max_waiting,  # 同时等电梯的最多人数
+        "still_waiting": sim.waiting_now,
+        "left_behind": sim.left_behind,
+        "events": sim.events_processed,
+        "wall_time": wall_time,
+    }
+
+
+def run(elevator_num, floors, pattern, rate, hours, capacity, destination, seed=2022):
+    sim = Simulation(elevator_num, floors, policy=EtaPolicy(), capacity=capacity)
+    if destination:
+        sim.destination_dispatch = DestinationDispatch()
+    sim.feed(PATTERNS[pattern](rate, floors, seed, until=hours * HOUR))
+    start = time.perf_counter()
+    sim.run(until=hours * HOUR)
+    return passenger_report(sim, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    # 用法: python passengers.py [电梯数] [层数] [每小时出行次数] [载客量] [小时数] [流量类型]
+    # 同样的出行分别用普通的上下键（eta调度）和大堂的目的楼层派梯各跑一次
+    elevator_num = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    floors = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    capacity = int(sys.argv[4]) if len(sys.argv) > 4 else 20
+    hours = float(sys.argv[5]) if len(sys.argv) > 5 else 1
+    pattern = sys.argv[6] if len(sys.argv) > 6 else "up_peak"
+
+    for name, destination in [("上下键", False), ("目的楼层派梯", True)]:
+        result = run(elevator_num, floors, pattern, rate, hours, capacity, destination)
+        print(name, "送达", result["delivered"], "人 最多的5分钟送达", result["peak_5min"], "人",
+              "平均等待", round(result["rider_wait"]["avg"], 1), "秒 p95", round(result["rider_wait"]["p95"], 1), "秒",
+              "平均乘坐", round(result["ride_time"]["avg"], 1), "秒")
+        print("    同时等电梯最多", result["max_waiting"], "人 结束时还在等", result["still_waiting"], "人",
+              "已经等了平均", round(result["backlog_wait"]["avg"], 1), "秒 最久", round(result["backlog_wait"]["max"], 1),
+              "秒 算上他们的平均等待", round(result["all_wait"]["avg"], 1), "秒 p95",
+              round(result["all_wait"]["p95"], 1), "秒")
+        print("    满载没上去", result["left_behind"], "人次",
+              "事件", result["events"], "个 用时", round(result["wall_time"], 2), "秒")
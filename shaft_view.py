@@ -0,0 +1,207 @@
+from PyQt5.QtCore import Qt, QLine, QRect, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QWidget
+
+from elevator_model import TIME_PER_FLOOR, OPENING_DOOR_TIME, ElevatorState, MoveState
+
+# 电梯井的示意图 一次画出所有电梯和楼层 不再为每台电梯的每一层各建一个按钮
+# 放在QScrollArea中 每次只画露出来的部分 楼层和电梯再多 每帧的开销也只和窗口大小有关
+# 点击时按坐标算出是哪台电梯的哪个按钮 再发出对应的信号
+
+# 各部分的大小 单位 像素
+HALL_WIDTH = 72  # 左边外部按钮一列的宽度 楼层号 上行 下行
+CAR_WIDTH = 64  # 每台电梯一列的宽度
+HEADER_HEIGHT = 56  # 上方显示楼层和故障、开门、关门键的高度
+ROW_HEIGHT = 22  # 每层楼的高度
+
+WHITE = QColor(255, 255, 255)
+GRID = QColor(200, 200, 200)
+PRESSED = QColor(255, 255, 0)  # 按下的按钮
+STOP = QColor(255, 255, 160)  # 电梯将要停靠的楼层
+HALL_CALL = QColor(255, 192, 203)  # 未完成的外部任务
+CAR_IDLE = QColor(150, 200, 255)
+CAR_MOVING = QColor(60, 120, 230)
+CAR_FAULT = QColor(160, 160, 160)
+
+
+# 门的当前进度 由快照中的进度和快照之后经过的时间推算 now为当前的模拟时刻
+def door_progress(car, now):
+    elapsed = now - car.updated_at
+    if car.state == ElevatorState.opening_door:
+        return min(1.0, car.open_progress + elapsed / OPENING_DOOR_TIME)
+    if car.state == ElevatorState.closing_door:
+        return max(0.0, car.open_progress - elapsed / OPENING_DOOR_TIME)
+    return car.open_progress
+
+
+# 电梯当前的位置 运行中时在两层之间 同样由快照的时刻推算
+def car_position(car, now):
+    if car.state == ElevatorState.going_up:
+        return car.cur_floor + min(1.0, (now - car.updated_at) / TIME_PER_FLOOR)
+    if car.state == ElevatorState.going_down:
+        return car.cur_floor - min(1.0, (now - car.updated_at) / TIME_PER_FLOOR)
+    return car.cur_floor
+
+
+# 画面是否需要随时间变化 有电梯在运行或开关门时每帧都要重画
+def is_animating(car):
+    return car.state in (ElevatorState.going_up, ElevatorState.going_down, ElevatorState.opening_door,
+                         ElevatorState.closing_door)
+
+
+# 每台电梯上方的三个按键在列中的位置 (名称, 左边, 宽度)
+HEADER_BUTTONS = [("故障", 0, 24), ("开", 24, 20), ("关", 44, 20)]
+
+
+class ShaftView(QWidget):
+    car_call_clicked = pyqtSignal(int, int)  # 电梯编号 楼层
+    hall_call_clicked = pyqtSignal(int, object)  # 楼层 MoveState
+    fault_clicked = pyqtSignal(int)
+    open_clicked = pyqtSignal(int)
+    close_clicked = pyqtSignal(int)
+
+    # now()返回当前的模拟时刻 用于推算运行和开关门的动画
+    def __init__(self, car_num, floors, now):
+        super().__init__()  # 父类构造函数
+        self.car_num = car_num
+        self.floors = floors
+        self.now = now
+        self.snapshot = None
+        self.hall_calls = frozenset()  # 快照中的外部任务 用于快速判断
+        self.setFixedSize(HALL_WIDTH + car_num * CAR_WIDTH, HEADER_HEIGHT + floors * ROW_HEIGHT)
+
+    def set_snapshot(self, snapshot):
+        # 只有电梯变化时 快照中的外部任务还是原来的那个元组
+        if self.snapshot is None or self.snapshot.hall_calls is not snapshot.hall_calls:
+            self.hall_calls = frozenset(snapshot.hall_calls)
+        self.snapshot = snapshot
+
+    # 换上新的快照并立即重画有变化的部分 文字最费时间
+    # 外部任务没变时不画左边一列 电梯都没变（只是动画在走）时不画上方的显示和按键
+    def refresh(self, snapshot):
+        last = self.snapshot
+        self.set_snapshot(snapshot)
+        if last is None or last.hall_calls is not snapshot.hall_calls:
+            self.repaint()
+        elif any(old.version != new.version for old, new in zip(last.cars, snapshot.cars)):
+            self.repaint(HALL_WIDTH, 0, self.width() - HALL_WIDTH, self.height())
+        else:
+            self.repaint(HALL_WIDTH, HEADER_HEIGHT, self.width() - HALL_WIDTH, self.height() - HEADER_HEIGHT)
+
+    def floor_top(self, floor):
+        return HEADER_HEIGHT + (self.floors - floor) * ROW_HEIGHT
+
+    def paintEvent(self, event):
+        if self.snapshot is None:
+            return
+        rect = event.rect()
+        # 露出来的楼层和电梯 楼层从上往下画
+        top_floor = self.floors - max(0, (rect.top() - HEADER_HEIGHT) // ROW_HEIGHT)
+        bottom_floor = max(1, self.floors - (rect.bottom() - HEADER_HEIGHT) // ROW_HEIGHT)
+        first_car = max(0, (rect.left() - HALL_WIDTH) // CAR_WIDTH)
+        last_car = min(self.car_num - 1, (rect.right() - HALL_WIDTH) // CAR_WIDTH)
+        now = self.now()
+
+        painter = QPainter(self)
+        painter.fillRect(rect, WHITE)
+        painter.setPen(GRID)
+
+        # 外部按钮
+        if rect.left() < HALL_WIDTH:
+            for floor in range(bottom_floor, top_floor + 1):
+                y = self.floor_top(floor)
+                painter.setPen(Qt.black)
+                painter.drawText(QRect(0, y, 30, ROW_HEIGHT), Qt.AlignCenter, str(floor))
+                if floor != self.floors:
+                    self.__draw_button(painter, QRect(30, y + 1, 20, ROW_HEIGHT - 2), "↑",
+                                       HALL_CALL if (floor, MoveState.up) in self.hall_calls else WHITE)
+                if floor != 1:
+                    self.__draw_button(painter, QRect(50, y + 1, 20, ROW_HEIGHT - 2), "↓",
+                                       HALL_CALL if (floor, MoveState.down) in self.hall_calls else WHITE)
+
+        for elev_id in range(first_car, last_car + 1):
+            car = self.snapshot.cars[elev_id]
+            x = HALL_WIDTH + elev_id * CAR_WIDTH
+            # 上方的楼层显示和按键
+            if rect.top() < HEADER_HEIGHT:
+                if car.state == ElevatorState.going_up:
+                    display = "↑" + str(car.cur_floor)
+                elif car.state == ElevatorState.going_down:
+                    display = "↓" + str(car.cur_floor)
+                else:
+                    display = str(car.cur_floor)
+                painter.setPen(Qt.black)
+                painter.drawText(QRect(x, 0, CAR_WIDTH, 26), Qt.AlignCenter, display)
+                pressed = [car.state == ElevatorState.fault, car.is_open_button_clicked, car.is_close_button_clicked]
+                for (name, left, width), is_pressed in zip(HEADER_BUTTONS, pressed):
+                    self.__draw_button(painter, QRect(x + left + 1, 28, width - 2, 24), name,
+                                       PRESSED if is_pressed else WHITE)
+
+            # 内部的数字键 将要停靠的楼层标为黄色
+            for floor in car.up_targets:
+                if bottom_floor <= floor <= top_floor:
+                    painter.fillRect(x, self.floor_top(floor), CAR_WIDTH, ROW_HEIGHT, STOP)
+            for floor in car.down_targets:
+                if bottom_floor <= floor <= top_floor:
+                    painter.fillRect(x, self.floor_top(floor), CAR_WIDTH, ROW_HEIGHT, STOP)
+
+            # 电梯本身 开关门时用渐变的颜色表示门的进度
+            position = car_position(car, now)
+            if bottom_floor - 1 <= position <= top_floor + 1:
+                if car.state == ElevatorState.fault:
+                    color = CAR_FAULT
+                elif car.state in (ElevatorState.opening_door, ElevatorState.open_door, ElevatorState.closing_door):
+                    color = QColor(255, int(255 * (1 - door_progress(car, now))), 255)
+                elif car.state in (ElevatorState.going_up, ElevatorState.going_down):
+                    color = CAR_MOVING
+                else:
+                    color = CAR_IDLE
+                y = HEADER_HEIGHT + int((self.floors - position) * ROW_HEIGHT)
+                painter.fillRect(x + 6, y + 2, CAR_WIDTH - 12, ROW_HEIGHT - 4, color)
+
+        # 格子线一次画完 不逐格画
+        if first_car <= last_car:
+            left = HALL_WIDTH + first_car * CAR_WIDTH
+            right = HALL_WIDTH + (last_car + 1) * CAR_WIDTH
+            top = self.floor_top(top_floor)
+            bottom = self.floor_top(bottom_floor) + ROW_HEIGHT
+            lines = [QLine(left, self.floor_top(floor), right, self.floor_top(floor))
+                     for floor in range(bottom_floor, top_floor + 1)]
+            lines.append(QLine(left, bottom, right, bottom))
+            lines.extend(QLine(x, top, x, bottom) for x in range(left, right + 1, CAR_WIDTH))
+            painter.setPen(GRID)
+            painter.drawLines(lines)
+        painter.end()
+
+    @staticmethod
+    def __draw_button(painter, rect, text, color):
+        painter.fillRect(rect, color)
+        painter.setPen(GRID)
+        painter.drawRect(rect)
+        painter.setPen(Qt.black)
+        painter.drawText(rect, Qt.AlignCenter, text)
+
+    def mousePressEvent(self, event):
+        x, y = event.x(), event.y()
+        if x < HALL_WIDTH:
+            if y < HEADER_HEIGHT:
+                return
+            floor = self.floors - (y - HEADER_HEIGHT) // ROW_HEIGHT
+            if 30 <= x < 50 and floor != self.floors:
+                self.hall_call_clicked.emit(floor, MoveState.up)
+            elif 50 <= x < 70 and floor != 1:
+                self.hall_call_clicked.emit(floor, MoveState.down)
+            return
+        elev_id = (x - HALL_WIDTH) // CAR_WIDTH
+        if elev_id >= self.car_num:
+            return
+        if y >= HEADER_HEIGHT:
+            self.car_call_clicked.emit(elev_id, self.floors - (y - HEADER_HEIGHT) // ROW_HEIGHT)
+            return
+        if y < 28:
+            return
+        offset = (x - HALL_WIDTH) % CAR_WIDTH
+        for (name, left, width), signal in zip(HEADER_BUTTONS, [self.fault_clicked, self.open_clicked,
+                                                               self.close_clicked]):
+            if left <= offset < left + width:
+                signal.emit(elev_id)
@@ -0,0 +1,110 @@
+import threading
+import time
+
+# 模拟时钟
+# 图形界面中的电梯线程、handler、回放线程和界面刷新都从这里读时间 单位 毫秒
+# 倍速可以随时修改 也可以暂停或者单步前进
+# 修改后调用所有的监听函数 由它们叫醒正在等待的线程 各线程再按新的倍速重新计算还要等多久
+
+SPEEDS = [0, 1, 10, 100]  # 界面上可选的倍速 0表示暂停
+STEP_TIME = 100  # 单步前进一次的模拟时间 单位 毫秒
+
+
+class SimClock:
+    def __init__(self, speed=1.0):
+        self.__lock = threading.Lock()
+        # 供wait_until使用 时钟有变化时通知
+        self.__changed = threading.Condition(self.__lock)
+        self.__base = 0.0  # 上次修改时的模拟时刻
+        self.__wall_base = time.perf_counter()  # 上次修改时的实际时刻
+        self.__speed = speed
+        self.__resume_speed = speed or 1.0  # 暂停前的倍速 恢复和单步时使用
+        self.__limit = None  # 单步时模拟时间走到这里就停下
+        self.__listeners = []
+
+    # 调用时需已持有self.__lock
+    def __now(self):
+        if self.__speed == 0:
+            return self.__base
+        now = self.__base + (time.perf_counter() - self.__wall_base) * 1000 * self.__speed
+        if self.__limit is not None and now >= self.__limit:
+            # 单步走完了 转为暂停
+            self.__base = self.__limit
+            self.__speed = 0
+            self.__limit = None
+            return self.__base
+        return now
+
+    def now(self):
+        with self.__lock:
+            return self.__now()
+
+    @property
+    def speed(self):
+        with self.__lock:
+            self.__now()
+            return self.__speed
+
+    @property
+    def paused(self):
+        return self.speed == 0
+
+    # 修改倍速 0表示暂停
+    def set_speed(self, speed):
+        self.__change(speed, None)
+
+    def pause(self):
+        self.set_speed(0)
+
+    def resume(self):
+        self.set_speed(self.__resume_speed)
+
+    # 以暂停前的倍速前进duration毫秒 然后暂停
+    def step(self, duration=STEP_TIME):
+        with self.__lock:
+            limit = self.__now() + duration
+        self.__change(self.__resume_speed, limit)
+
+    def __change(self, speed, limit):
+        with self.__lock:
+            self.__base = self.__now()
+            self.__wall_base = time.perf_counter()
+            self.__speed = speed
+            self.__limit = limit
+            if speed:
+                self.__resume_speed = speed
+            self.__changed.notify_all()
+        for listener in self.__listeners:
+            listener()
+
+    # 倍速变化时调用listener() 调用时不持有时钟的锁
+    def add_listener(self, listener):
+        self.__listeners.append(listener)
+
+    # 模拟时间再过duration毫秒 按当前倍速需要等待的实际毫秒数
+    # 暂停时返回None 表示要等到时钟有变化为止
+    def wall_time(self, duration):
+        with self.__lock:
+            now = self.__now()
+            if self.__speed == 0:
+                return None
+            if self.__limit is not None:
+                # 单步只走到limit 之后的部分等时钟有变化再算
+                duration = min(duration, self.__limit - now)
+            return max(0.0, duration) / self.__speed
+
+    # 阻塞到模拟时刻at 供没有自己的条件变量的线程使用
+    def wait_until(self, at):
+        with self.__lock:
+            while True:
+                now = self.__now()
+                if now >= at:
+                    return now
+                if self.__speed == 0:
+                    self.__changed.wait()
+                    continue
+                remaining = at - now
+                if self.__limit is not None:
+                    remaining = min(remaining, self.__limit - now)
+                # 单步走完时没有人通知 超时后重新检查
+                self.__changed.wait(remaining / self.__speed / 1000)
@@ -0,0 +1,550 @@
+import heapq
+import itertools
+from collections import deque
+import random
+import sys
+import time
+
+from call_trace import TraceKind, TraceWriter
+from dispatch_policy import make_policy
+from elevator_model import ELEVATOR_NUM, ELEVATOR_FLOORS, TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME, \
+    ElevatorState, MoveState, HallCallRegistry, OuterTask, StopSet, CarSnapshot, add_outer_target
+
+# 无界面的离散事件模拟引擎
+# 与图形界面使用相同的电梯状态、扫描(SCAN)逻辑和handler的距离规则
+# 但所有时间都是模拟时间 不需要真的sleep 因此可以远快于真实时间地运行
+
+DAY = 24 * 60 * 60 * 1000  # 一天 单位 毫秒
+THROUGHPUT_INTERVAL = 5 * 60 * 1000  # 按每5分钟统计送达的乘客数
+
+
+# 模拟引擎中的一台电梯 对应图形界面中的CarState
+class SimCar:
+    def __init__(self, elev_id):
+        self.elev_id = elev_id  # 电梯编号
+        # 以下字段与CarState中的同名字段含义相同
+        self.state = ElevatorState.normal
+        self.cur_floor = 1
+        self.up_targets = StopSet()
+        self.down_targets = StopSet(descending=True)
+        self.move_state = MoveState.up
+        # 门已经打开的时间 对应Elevator.door_operation中的opening_time 单位 毫秒
+        self.door_level = 0
+        # 当前动作（移动一层/开门/关门）开始的模拟时刻
+        self.phase_start = 0
+        # 当前是否有未完成的动作（移动或开关门）
+        self.busy = False
+        # 当前动作结束的事件在队列中的时刻和序号 用于保存检查点 见checkpoint.py
+        self.due = 0
+        self.due_seq = 0
+        # 每次发出新的事件或取消事件时加一 旧的事件到期时发现令牌不符就直接丢弃
+        self.token = 0
+        # 电梯里的乘客 元素为(出行, 上电梯的时刻)
+        self.riders = []
+        # 目的楼层派梯分到这台电梯、还没有上电梯的乘客数 见passengers.py
+        self.assigned = 0
+
+    # 开门的进度条 范围为0-1的浮点数
+    def open_progress(self, now, opening_door_time):
+        if self.state == ElevatorState.opening_door:
+            return (self.door_level + now - self.phase_start) / opening_door_time
+        elif self.state == ElevatorState.open_door:
+            return 1.0
+        elif self.state == ElevatorState.closing_door:
+            return (self.door_level - (now - self.phase_start)) / opening_door_time
+        return 0.0
+
+    def snapshot(self, now, opening_door_time):
+        # 引擎是单线程的 快照只在调度时临时生成 直接引用目标集合而不复制 版本号用动作令牌代替
+        return CarSnapshot(self.elev_id, self.token, self.state, self.cur_floor, self.move_state,
+                           self.up_targets, self.down_targets,
+                           self.open_progress(now, opening_door_time), False, False)
+
+
+class Simulation:
+    def __init__(self, elevator_num=ELEVATOR_NUM, floors=ELEVATOR_FLOORS, time_per_floor=TIME_PER_FLOOR,
+                 opening_door_time=OPENING_DOOR_TIME, open_door_time=OPEN_DOOR_TIME, policy=None, capacity=None):
+        self.elevator_num = elevator_num
+        self.floors = floors
+        self.time_per_floor = time_per_floor
+        self.opening_door_time = opening_door_time
+        self.open_door_time = open_door_time
+        # handler的调度策略 见dispatch_policy.py 默认为原来的最近电梯规则
+        self.policy = policy if policy is not None else make_policy("nearest")
+        # 每台电梯最多载客数 不给则不限
+        # 满载的电梯不再接外部任务 到了乘客要去的楼层以外的地方也没人能上
+        self.capacity = capacity
+        # 目的楼层派梯 设为passengers.DestinationDispatch时 在它的楼层上乘客先输入目的楼层再分配电梯
+        self.destination_dispatch = None
+        # 空闲电梯的停靠 设为parking.IdleParking时 电梯没有任务时开往需求大的楼层
+        self.parking = None
+
+        self.now = 0  # 模拟时钟 单位 毫秒
+        self.cars = [SimCar(i) for i in range(elevator_num)]
+        self.outer_requests = HallCallRegistry()  # 外部按钮产生的需求
+        self.events_processed = 0  # 已处理的事件数
+        self.wait_times = []  # 每个外部任务从产生到完成所用的时间 单位 毫秒
+        self.dispatch_cpu = 0.0  # handler调度所用的CPU时间 单位 秒
+
+        # 由出行流(见workload.py)产生的乘客
+        self.rider_wait_times = []  # 乘客从按下外部按钮到上电梯的时间 单位 毫秒
+        self.ride_times = []  # 乘客从上电梯到下电梯的时间 单位 毫秒
+        self.__trips = iter(())  # 正在读取的出行流
+        self.waiting = {}  # (楼层, 方向) -> 在该层等电梯的出行
+        self.assigned_waiting = {}  # (电梯编号, 楼层) -> 目的楼层派梯分到这台电梯、在该层等它的出行
+        self.waiting_now = 0  # 正在等电梯的人数
+        self.max_waiting = 0  # 同时等电梯的最多人数
+        self.left_behind = 0  # 电梯满载而没能上去的人次
+        self.delivered = {}  # 第几个5分钟 -> 这5分钟内送达的乘客数
+
+        self.trace = None  # 设为TraceWriter时记录运行过程 见call_trace.py
+
+        # 事件优先队列 元素为 (时刻, 优先级, 序号, 回调, 参数)
+        # 同一时刻先处理电梯自己的事件(优先级0) 再处理外部输入(优先级1) 同一优先级按加入顺序处理
+        # 这样回放记录时 外部输入与电梯事件的先后顺序与记录时相同
+        self.__queue = []
+        self.__seq = itertools.count()
+
+    # 从检查点恢复后调用 按保存时的时刻和序号重新安排正在动作的电梯的事件 见checkpoint.py
+    # 之后的事件序号都比它们大 同一时刻的事件与不中断地运行时按相同的顺序处理
+    def resume_cars(self):
+        busy = [car for car in self.cars if car.busy]
+        self.__seq = itertools.count(max([car.due_seq for car in busy], default=-1) + 1)
+        for car in busy:
+            if car.state in (ElevatorState.going_up, ElevatorState.going_down):
+                fn = self.__arrive
+            else:
+                fn = self.__door_phase_done
+            heapq.heappush(self.__queue, (car.due, 0, car.due_seq, fn, (car, car.token)))
+
+    # 在模拟时刻at调用fn(*args)
+    def schedule(self, at, fn, *args):
+        heapq.heappush(self.__queue, (max(at, self.now), 0, next(self.__seq), fn, args))
+
+    # 在模拟时刻at注入外部输入(按钮、乘客到达等)
+    def inject(self, at, fn, *args):
+        heapq.heappush(self.__queue, (max(at, self.now), 1, next(self.__seq), fn, args))
+
+    # 运行到模拟时刻until为止 不给则一直运行到没有事件
+    def run(self, until=None):
+        while self.__queue:
+            if until is not None and self.__queue[0][0] > until:
+                break
+            at, _, _, fn, args = heapq.heappop(self.__queue)
+            self.now = at
+            fn(*args)
+            self.events_processed += 1
+            # 同一时刻的事件都处理完后handler调度一次 相当于图形界面里不停运行的Handler
+            if not self.__queue or self.__queue[0][0] != at:
+                self.dispatch()
+        if until is not None:
+            self.now = max(self.now, until)
+
+    # 按出行流依次产生乘客 每个乘客到达时才读取下一个 出行流再长也不会一次性放进内存
+    def feed(self, trips):
+        self.__trips = iter(trips)
+        self.__next_trip()
+
+    def __next_trip(self):
+        trip = next(self.__trips, None)
+        if trip is not None:
+            self.inject(trip.time, self.__trip_arrive, trip)
+
+    # 乘客到达 在出发楼层按下外部按钮
+    def __trip_arrive(self, trip):
+        self.waiting_now += 1
+        self.max_waiting = max(self.max_waiting, self.waiting_now)
+        dispatch = self.destination_dispatch
+        key = (trip.origin, trip.move_state)
+        if dispatch is None or trip.origin not in dispatch.floors:
+            self.waiting.setdefault(key, deque()).append(trip)
+            self.call_hall(trip.origin, trip.move_state)
+        elif self.waiting.get(key):
+            # 前面还有没分到电梯的人 按先来后到排在他们后面 能分多少分多少
+            # 否则过载时新来的人总能分到刚空出来的电梯 先来的人一直等下去
+            self.waiting[key].append(trip)
+            self.call_hall(trip.origin, trip.move_state)
+            self.__assign_queued(key)
+        elif not self.assign_rider(trip):
+            self.waiting.setdefault(key, deque()).append(trip)
+            self.call_hall(trip.origin, trip.move_state)
+        self.__next_trip()
+
+    # 按先来后到为在key等电梯的人分配电梯 直到没有能接的电梯为止
+    def __assign_queued(self, key):
+        queue = self.waiting[key]
+        while queue:
+            trip = queue.popleft()
+            if not self.assign_rider(trip):
+                queue.appendleft(trip)
+                break
+        # 门开着的电梯可能已经把剩下的人接走并删掉了这个队列
+        if not queue:
+            self.waiting.pop(key, None)
+
+    # 目的楼层派梯 由destination_dispatch为乘客挑选电梯 让电梯停靠出发楼层 所有电梯都故障时返回False
+    def assign_rider(self, trip):
+        elev_id = self.destination_dispatch.choose(self, trip)
+        if elev_id == -1:
+            return False
+        car = self.cars[elev_id]
+        self.assigned_waiting.setdefault((elev_id, trip.origin), deque()).append(trip)
+        car.assigned += 1
+        if car.cur_floor == trip.origin and car.state == ElevatorState.open_door:
+            # 门正开着 直接上去
+            self.__exchange(car)
+        else:
+            self.call_assigned(elev_id, trip.origin, trip.move_state)
+        return True
+
+    # 门完全打开时乘客上下电梯
+    def __exchange(self, car):
+        # 到达目的地的乘客下电梯
+        staying = []
+        for trip, boarded_at in car.riders:
+            if trip.destination == car.cur_floor:
+                self.ride_times.append(self.now - boarded_at)
+            else:
+                staying.append((trip, boarded_at))
+        if len(staying) < len(car.riders):
+            interval = int(self.now // THROUGHPUT_INTERVAL)
+            self.delivered[interval] = self.delivered.get(interval, 0) + len(car.riders) - len(staying)
+        car.riders = staying
+
+        # 目的楼层派梯分到这台电梯的乘客先上
+        key = (car.elev_id, car.cur_floor)
+        if key in self.assigned_waiting:
+            queue = self.assigned_waiting[key]
+            boarded = self.__board(car, queue)
+            car.assigned -= boarded
+            if not queue:
+                del self.assigned_waiting[key]
+
+        # 在这一层等电梯的乘客 方向相同（或电梯在原方向上除了这一层已经没有任务）的上电梯并按下目的楼层
+        targets = car.up_targets if car.move_state == MoveState.up else car.down_targets
+        for move_state in MoveState:
+            if move_state != car.move_state and len(targets) > 1:
+                continue
+            key = (car.cur_floor, move_state)
+            if key in self.waiting:
+                queue = self.waiting[key]
+                self.__board(car, queue)
+                if not queue:
+                    del self.waiting[key]
+
+    # queue中的乘客按先来后到上电梯 满载时剩下的人留下 返回上去的人数
+    def __board(self, car, queue):
+        count = len(queue)
+        if self.capacity is not None:
+            count = min(count, self.capacity - len(car.riders))
+            if count < len(queue):
+                self.left_behind += len(queue) - count
+        for _ in range(count):
+            trip = queue.popleft()
+            self.rider_wait_times.append(self.now - trip.time)
+            car.riders.append((trip, self.now))
+            self.call_car(car.elev_id, trip.destination)
+        self.waiting_now -= count
+        return count
+
+    # 关门后还留在这一层的乘客（方向相反、门开着时才来的或者没挤上去的）重新按一次外部按钮
+    # 分到这台电梯却没挤上去的 重新分配电梯
+    def __press_again(self, car):
+        floor = car.cur_floor
+        for move_state in MoveState:
+            if self.waiting.get((floor, move_state)):
+                self.call_hall(floor, move_state)
+        queue = self.assigned_waiting.pop((car.elev_id, floor), None)
+        if queue:
+            self.__reassign(car, queue)
+
+    def __reassign(self, car, queue):
+        car.assigned -= len(queue)
+        for trip in queue:
+            if not self.assign_rider(trip):
+                self.waiting.setdefault((trip.origin, trip.move_state), deque()).append(trip)
+                self.call_hall(trip.origin, trip.move_state)
+
+    def __record(self, kind, elev_id=-1, floor=0, arg=0):
+        if self.trace is not None:
+            self.trace.record(self.now, kind, elev_id, floor, arg)
+
+    # 以下几个函数对应图形界面中的各个按钮
+    # 外部上下键
+    def call_hall(self, floor, move_state):
+        self.__record(TraceKind.hall_call, -1, floor, move_state.value)
+        if self.parking is not None:
+            self.parking.record(floor, move_state, self.now)
+        if all(car.state == ElevatorState.fault for car in self.cars):
+            return None
+        # 同一楼层同一方向已经有未完成的任务时返回None
+        return self.outer_requests.add(floor, move_state, created_at=self.now)
+
+    # 目的楼层派梯直接交给这台电梯的停靠 与外部任务的规则相同 但不经过handler
+    # 电梯故障或者已经要停靠该层时返回False
+    def call_assigned(self, elev_id, floor, move_state):
+        self.__record(TraceKind.assigned_call, elev_id, floor, move_state.value)
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.fault or not add_outer_target(OuterTask(floor, move_state), car.state,
+                                                                     car.cur_floor, car.up_targets, car.down_targets):
+            return False
+        self.__step(car)
+        return True
+
+    # 电梯内部数字键
+    def call_car(self, elev_id, floor):
+        self.__record(TraceKind.car_call, elev_id, floor)
+        car = self.cars[elev_id]
+        # 故障或者相同楼层不处理
+        if car.state == ElevatorState.fault or floor == car.cur_floor:
+            return
+        if floor > car.cur_floor:
+            car.up_targets.add(floor)
+        elif floor < car.cur_floor:
+            car.down_targets.add(floor)
+        self.__step(car)
+
+    # 故障键 按一次故障 再按一次恢复
+    def toggle_fault(self, elev_id):
+        self.__record(TraceKind.fault, elev_id)
+        car = self.cars[elev_id]
+        if car.state != ElevatorState.fault:
+            car.state = ElevatorState.fault
+            self.__fault_tackle(car)
+            # 分到这台电梯的乘客重新分配
+            for key in [key for key in self.assigned_waiting if key[0] == elev_id]:
+                self.__reassign(car, self.assigned_waiting.pop(key))
+        else:
+            car.state = ElevatorState.normal
+            # 要在当前楼层下的乘客按数字键没有用 先重新开门让他们下去
+            if any(trip.destination == car.cur_floor for trip, boarded_at in car.riders):
+                targets = car.up_targets if car.move_state == MoveState.up else car.down_targets
+                targets.add(car.cur_floor)
+            # 故障时目标被清除了 电梯里的乘客重新按一次目的楼层
+            for trip, boarded_at in car.riders:
+                self.call_car(elev_id, trip.destination)
+            self.__step(car)
+
+    # 开门键 只在门正在关或已经打开时有效
+    def press_open(self, elev_id):
+        self.__record(TraceKind.open, elev_id)
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.closing_door:
+            # 门正在关上.. 从当前位置重新打开
+            car.door_level -= self.now - car.phase_start
+            self.__door_phase(car, ElevatorState.opening_door, self.opening_door_time - car.door_level)
+        elif car.state == ElevatorState.open_door:
+            # 门已经开了，延续开门时间
+            self.__door_phase(car, ElevatorState.open_door, self.open_door_time)
+
+    # 关门键 只在门正在开或已经打开时有效
+    def press_close(self, elev_id):
+        self.__record(TraceKind.close, elev_id)
+        car = self.cars[elev_id]
+        if car.state == ElevatorState.opening_door:
+            car.door_level += self.now - car.phase_start
+            self.__door_phase(car, ElevatorState.closing_door, car.door_level)
+            # 门没有完全打开就关上 乘客也要在关门前上下 否则这一层的停靠被删去后没人管他们
+            self.__exchange(car)
+        elif car.state == ElevatorState.open_door:
+            self.__door_phase(car, ElevatorState.closing_door, car.door_level)
+
+    # handler 与Handler.run中的一轮相同
+    def dispatch(self):
+        if self.outer_requests.has_unassigned():
+            start = time.process_time()
+            cars = [car.snapshot(self.now, self.opening_door_time) for car in self.cars]
+            if self.capacity is not None:
+                # 满载的电梯不接新的外部任务 对调度策略来说与故障相同
+                cars = [snapshot._replace(state=ElevatorState.fault) if len(car.riders) >= self.capacity else snapshot
+                        for car, snapshot in zip(self.cars, cars)]
+            for outer_task, elev_id in self.policy.assign(cars, self.outer_requests.unassigned(), self.floors):
+                self.__assign(outer_task, elev_id)
+            self.dispatch_cpu += time.process_time() - start
+
+    def __assign(self, outer_task, elev_id):
+        car = self.cars[elev_id]
+        if self.capacity is not None and len(car.riders) >= self.capacity:
+            return
+        if not add_outer_target(outer_task, car.state, car.cur_floor, car.up_targets, car.down_targets):
+            return
+        # 设为等待态
+        self.outer_requests.assign(outer_task, elev_id)
+        self.__record(TraceKind.assign, elev_id, outer_task.target, outer_task.move_state.value)
+        self.__step(car)
+
+    # 对应Elevator.run的循环体 电梯空闲时决定下一个动作
+    def __step(self, car):
+        while not car.busy and car.state != ElevatorState.fault:
+            # 向上扫描状态时
+            if car.move_state == MoveState.up:
+                if car.up_targets:
+                    if car.up_targets.first() == car.cur_floor:
+                        self.__door_phase(car, ElevatorState.opening_door, self.opening_door_time)
+                    elif car.up_targets.first() > car.cur_floor:
+                        self.__go_one_floor(car, MoveState.up)
+                    return
+                # 当没有上行目标而出现下行目标时 更换状态
+                elif car.down_targets:
+                    car.move_state = MoveState.down
+                elif not self.__park(car):
+                    return
+
+            # 向下扫描状态时
+            else:
+                if car.down_targets:
+                    if car.down_targets.first() == car.cur_floor:
+                        self.__door_phase(car, ElevatorState.opening_door, self.opening_door_time)
+                    elif car.down_targets.first() < car.cur_floor:
+                        self.__go_one_floor(car, MoveState.down)
+                    return
+                # 当没有下行目标而出现上行目标时 更换状态
+                elif car.up_targets:
+                    car.move_state = MoveState.up
+                elif not self.__park(car):
+                    return
+
+    # 电梯没有任务时 由parking决定是否开往别的楼层停靠 加入了目标则返回True
+    # 停靠不是乘客的按钮 不记入运行记录
+    def __park(self, car):
+        if self.parking is None:
+            return False
+        floor = self.parking.choose(car.elev_id, self.cars, self.now)
+        if floor is None:
+            return False
+        if floor > car.cur_floor:
+            car.up_targets.add(floor)
+        else:
+            car.down_targets.add(floor)
+        return True
+
+    # 移动一层楼 到达时间为TIME_PER_FLOOR之后
+    def __go_one_floor(self, car, move_state):
+        car.state = ElevatorState.going_up if move_state == MoveState.up else ElevatorState.going_down
+        car.busy = True
+        car.phase_start = self.now
+        car.token += 1
+        self.__schedule_car(car, self.now + self.time_per_floor, self.__arrive)
+
+    def __arrive(self, car, token):
+        if token != car.token:
+            return
+        if car.state == ElevatorState.going_up:
+            car.cur_floor += 1
+        else:
+            car.cur_floor -= 1
+        car.state = ElevatorState.normal
+        car.busy = False
+        self.__record(TraceKind.arrive, car.elev_id, car.cur_floor)
+        self.__step(car)
+
+    # 开关门的一个阶段 duration毫秒后进入下一阶段
+    def __door_phase(self, car, state, duration):
+        car.state = state
+        self.__record(TraceKind.door, car.elev_id, car.cur_floor, state.value)
+        car.busy = True
+        car.phase_start = self.now
+        car.token += 1
+        self.__schedule_car(car, self.now + duration, self.__door_phase_done)
+
+    # 安排电梯当前动作结束的事件 记下时刻和序号
+    def __schedule_car(self, car, at, fn):
+        car.due = at
+        car.due_seq = next(self.__seq)
+        heapq.heappush(self.__queue, (at, 0, car.due_seq, fn, (car, car.token)))
+
+    def __door_phase_done(self, car, token):
+        if token != car.token:
+            return
+        if car.state == ElevatorState.opening_door:
+            car.door_level = self.opening_door_time
+            self.__door_phase(car, ElevatorState.open_door, self.open_door_time)
+            self.__exchange(car)
+        elif car.state == ElevatorState.open_door:
+            self.__door_phase(car, ElevatorState.closing_door, car.door_level)
+        else:
+            # 门关好了 到达以后 把完成的任务删去
+            car.door_level = 0
+            car.state = ElevatorState.normal
+            car.busy = False
+            self.__record(TraceKind.door, car.elev_id, car.cur_floor, car.state.value)
+            # 内部的任务
+            if car.move_state == MoveState.up:
+                car.up_targets.pop_first()
+            else:
+                car.down_targets.pop_first()
+            # 外部按钮的任务
+            for outer_task in self.outer_requests.finish_floor(car.cur_floor):
+                self.wait_times.append(self.now - outer_task.created_at)
+            self.__step(car)
+            # 电梯先按自己的任务动起来 再处理留下的乘客 回放记录时他们产生的输入也在电梯的事件之后施加
+            self.__press_again(car)
+
+    # 当故障发生时 取消正在进行的动作 清除原先的所有任务
+    def __fault_tackle(self, car):
+        car.token += 1
+        car.busy = False
+        car.door_level = 0
+        # 把原先分配给它的任务交给handler重新分配
+        self.outer_requests.release_elevator(car.elev_id)
+        car.up_targets.clear()
+        car.down_targets.clear()
+
+
+# 与ElevatorUi.__generate_tasks相同的随机任务（30%外部按钮 70%内部按钮）
+# 任务按泊松过程到达 平均每interval毫秒一个 每次到达时才安排下一个 不会一次性生成
+def random_traffic(sim, rng, interval, until):
+    def arrival():
+        if rng.randint(0, 100) < 30:  # 30% 产生外部任务
+            floor = rng.randint(1, sim.floors)
+            if floor == 1:  # 1楼只能向上
+                sim.call_hall(floor, MoveState.up)
+            elif floor == sim.floors:  # 顶楼只能向下
+                sim.call_hall(floor, MoveState.down)
+            else:  # 其余则随机指派方向
+                sim.call_hall(floor, rng.choice([MoveState.up, MoveState.down]))
+        else:  # 产生内部任务
+            sim.call_car(rng.randint(0, sim.elevator_num - 1), rng.randint(1, sim.floors))
+        next_at = sim.now + rng.expovariate(1 / interval)
+        if next_at < until:
+            sim.inject(next_at, arrival)
+
+    sim.schedule(rng.expovariate(1 / interval), arrival)
+
+
+if __name__ == '__main__':
+    # 用法: python sim_engine.py [平均任务间隔(毫秒)] [随机种子]
+    #   或: python sim_engine.py day 峰值每小时出行次数 [随机种子]  按workload.py中的工作日交通模拟乘客
+    #   末尾加上 --trace 文件名 则把运行过程记录到文件中 可以用call_trace.py回放
+    #   末尾加上 --policy 策略名 则使用dispatch_policy.py中的该调度策略
+    sim = Simulation()
+    if "--policy" in sys.argv:
+        i = sys.argv.index("--policy")
+        sim.policy = make_policy(sys.argv[i + 1])
+        del sys.argv[i:i + 2]
+    if "--trace" in sys.argv:
+        i = sys.argv.index("--trace")
+        sim.trace = TraceWriter(sys.argv[i + 1])
+        del sys.argv[i:i + 2]
+    if len(sys.argv) > 1 and sys.argv[1] == "day":
+        from workload import DayTraffic
+        rate = float(sys.argv[2]) if len(sys.argv) > 2 else 1200
+        seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+        sim.feed(DayTraffic(rate, sim.floors, seed))
+    else:
+        interval = float(sys.argv[1]) if len(sys.argv) > 1 else 5000
+        seed = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+        random_traffic(sim, random.Random(seed), interval, DAY)
+    start = time.perf_counter()
+    sim.run(until=DAY)
+    elapsed = time.perf_counter() - start
+    if sim.trace is not None:
+        sim.trace.close()
+
+    print("模拟了", DAY // 1000, "秒 用时", round(elapsed, 2), "秒 共处理", sim.events_processed, "个事件")
+    if sim.wait_times:
+        print("完成外部任务", len(sim.wait_times), "个 平均等待", round(sum(sim.wait_times) / len(sim.wait_times) / 1000, 2), "秒")
+    if sim.rider_wait_times:
+        print("乘客", len(sim.rider_wait_times), "人 平均候梯", round(sum(sim.rider_wait_times) / len(sim.rider_wait_times) / 1000, 2),
+              "秒 平均乘梯", round(sum(sim.ride_times) / max(len(sim.ride_times), 1) / 1000, 2), "秒")
+    print("未完成的外部任务", len(sim.outer_requests), "个")
@@ -0,0 +1,125 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from benchmark import run_case
+from elevator_model import ELEVATOR_NUM, ELEVATOR_FLOORS, TIME_PER_FLOOR, OPENING_DOOR_TIME, OPEN_DOOR_TIME
+
+# 参数扫描
+# 对电梯数、层数、运行速度、开关门时间、调度策略、流量和随机种子的每一种组合各跑一次无界面模拟
+# 各次模拟互不相关 用进程池在所有CPU核上并行 每跑完一次就把结果追加写入JSONL文件
+# 输出文件已经存在时 跳过其中已经完成的组合 中断后可以接着跑
+# 用法示例: python sweep.py -o sweep.jsonl --elevators 4,6,8 --floors 20,30 --policy nearest,eta --seeds 5
+
+# 扫描的参数 (参数名, 类型, 默认值)
+GRID = [
+    ("elevators", int, str(ELEVATOR_NUM)),
+    ("floors", int, str(ELEVATOR_FLOORS)),
+    ("time_per_floor", float, str(TIME_PER_FLOOR)),
+    ("opening_door_time", float, str(OPENING_DOOR_TIME)),
+    ("open_door_time", float, str(OPEN_DOOR_TIME)),
+    ("policy", str, "nearest"),
+    ("pattern", str, "up_peak"),
+    ("rate", float, "900"),
+]
+
+
+# 一次模拟 在子进程中运行
+def run_point(point):
+    result = run_case("sweep", point["elevators"], point["floors"], point["pattern"], point["rate"], point["hours"],
+                      point["seed"], policy=point["policy"], time_per_floor=point["time_per_floor"],
+                      opening_door_time=point["opening_door_time"], open_door_time=point["open_door_time"])
+    del result["name"]
+    return result
+
+
+# 一次模拟的参数组合 用于判断是否已经跑过 point也可以是run_point的结果
+def point_key(point):
+    return tuple(point[name] for name, _, _ in GRID) + (point["hours"], point["seed"])
+
+
+def grid_points(values, hours, seeds):
+    names = [name for name, _, _ in GRID]
+    for combination in itertools.product(*(values[name] for name in names)):
+        for seed in seeds:
+            point = dict(zip(names, combination))
+            point["hours"] = hours
+            point["seed"] = seed
+            yield point
+
+
+def finished_keys(path):
+    keys = set()
+    if not os.path.exists(path):
+        return keys
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:  # 上次中断时写了一半的行
+                continue
+            keys.add(point_key(result))
+    return keys
+
+
+def sweep(points, path, workers=None):
+    done = finished_keys(path)
+    points = [point for point in points if point_key(point) not in done]
+    print("需要运行", len(points), "次 已跳过", len(done), "次", file=sys.stderr)
+    start = time.perf_counter()
+    with open(path, "a") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_point, point) for point in points]
+        for finished, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            print(finished, "/", len(points), "电梯", result["elevators"], "层数", result["floors"], result["policy"],
+                  "平均等待", round(result["hall_wait"]["avg"], 2), "秒 已用", round(time.perf_counter() - start, 1), "秒",
+                  file=sys.stderr)
+
+
+# 把各个随机种子的结果按参数组合汇总 每个组合取各次结果的平均
+def aggregate(path):
+    groups = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            key = tuple(result[name] for name, _, _ in GRID)
+            groups.setdefault(key, []).append(result)
+    summary = []
+    for key, results in sorted(groups.items(), key=lambda item: str(item[0])):
+        row = dict(zip([name for name, _, _ in GRID], key))
+        row["runs"] = len(results)
+        for metric in ["avg", "p95", "p99"]:
+            row["hall_wait_" + metric] = sum(r["hall_wait"][metric] for r in results) / len(results)
+            row["rider_wait_" + metric] = sum(r["rider_wait"][metric] for r in results) / len(results)
+        row["ride_time_avg"] = sum(r["ride_time"]["avg"] for r in results) / len(results)
+        row["passengers_per_hour"] = sum(r["passengers_per_hour"] for r in results) / len(results)
+        row["calls_per_hour"] = sum(r["calls_per_hour"] for r in results) / len(results)
+        summary.append(row)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="电梯参数扫描 各参数可以用逗号分隔多个取值")
+    parser.add_argument("-o", "--output", default="sweep.jsonl", help="结果文件 每行一次模拟")
+    for name, _, default in GRID:
+        parser.add_argument("--" + name.replace("_", "-"), default=default)
+    parser.add_argument("--hours", type=float, default=1, help="每次模拟的小时数")
+    parser.add_argument("--seeds", type=int, default=3, help="每个组合跑几个随机种子")
+    parser.add_argument("--workers", type=int, default=None, help="进程数 默认为CPU核数")
+    parser.add_argument("--summary", action="store_true", help="只汇总已有的结果 不运行")
+    args = parser.parse_args()
+
+    if not args.summary:
+        values = {name: [kind(value) for value in getattr(args, name).split(",")] for name, kind, _ in GRID}
+        sweep(list(grid_points(values, args.hours, range(args.seeds))), args.output, args.workers)
+    for row in aggregate(args.output):
+        print(json.dumps(row, ensure_ascii=False))
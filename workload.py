@@ -0,0 +1,155 @@
+import random
+import sys
+from collections import namedtuple
+
+from elevator_model import ELEVATOR_FLOORS, LOBBY, MoveState
+
+# 交通流量生成器
+# 按需逐个生成带时间戳的出行 不会把整批任务放在内存里 给定相同的随机种子结果完全相同
+
+HOUR = 60 * 60 * 1000  # 一小时 单位 毫秒
+
+
+# 一次出行：time时刻有人在origin楼层按下外部按钮 要去destination楼层
+class Trip(namedtuple("Trip", ["time", "origin", "destination"])):
+    __slots__ = ()
+
+    # 需要的电梯运行方向
+    @property
+    def move_state(self):
+        return MoveState.up if self.destination > self.origin else MoveState.down
+
+
+# 泊松到达的出行流 平均每小时rate次 从start时刻开始 到until时刻为止（不给则无限生成）
+# 子类通过pick决定每次出行的起点和终点
+class TrafficStream:
+    def __init__(self, rate, floors=ELEVATOR_FLOORS, seed=None, start=0, until=None):
+        self.rate = rate  # 每小时的出行次数
+        self.floors = floors
+        self.until = until
+        self.time = start  # 上一次出行的时刻
+        self.rng = random.Random(seed)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.time += self.rng.expovariate(self.rate / HOUR)
+        if self.until is not None and self.time >= self.until:
+            raise StopIteration
+        origin, destination = self.pick()
+        return Trip(self.time, origin, destination)
+
+    # 两个不同的随机楼层
+    def random_pair(self, low=1):
+        origin = self.rng.randint(low, self.floors)
+        destination = self.rng.randint(low, self.floors - 1)
+        if destination >= origin:
+            destination += 1
+        return origin, destination
+
+    def pick(self):
+        raise NotImplementedError
+
+
+# 均匀的层间交通 起点终点都随机
+class UniformTraffic(TrafficStream):
+    def pick(self):
+        return self.random_pair()
+
+
+# 按比例混合 进入大堂、离开大堂和层间交通
+class MixedTraffic(TrafficStream):
+    def __init__(self, rate, incoming, outgoing, floors=ELEVATOR_FLOORS, seed=None, start=0, until=None):
+        super().__init__(rate, floors, seed, start, until)
+        self.incoming = incoming  # 从大堂出发去楼上的比例
+        self.outgoing = outgoing  # 从楼上回到大堂的比例 其余为层间交通
+
+    def pick(self):
+        r = self.rng.random()
+        if r < self.incoming:
+            return LOBBY, self.rng.randint(LOBBY + 1, self.floors)
+        elif r < self.incoming + self.outgoing:
+            return self.rng.randint(LOBBY + 1, self.floors), LOBBY
+        return self.random_pair(LOBBY + 1)
+
+
+# 早高峰 绝大多数人从大堂上楼
+class UpPeak(MixedTraffic):
+    def __init__(self, rate, floors=ELEVATOR_FLOORS, seed=None, start=0, until=None):
+        super().__init__(rate, 0.85, 0.05, floors, seed, start, until)
+
+
+# 午餐 下楼和上楼的人差不多
+class LunchPeak(MixedTraffic):
+    def __init__(self, rate, floors=ELEVATOR_FLOORS, seed=None, start=0, until=None):
+        super().__init__(rate, 0.45, 0.45, floors, seed, start, until)
+
+
+# 晚高峰 绝大多数人下楼回到大堂
+class DownPeak(MixedTraffic):
+    def __init__(self, rate, floors=ELEVATOR_FLOORS, seed=None, start=0, until=None):
+        super().__init__(rate, 0.05, 0.85, floors, seed, start, until)
+
+
+PATTERNS = {
+    "uniform": UniformTraffic,
+    "up_peak": UpPeak,
+    "lunch": LunchPeak,
+    "down_peak": DownPeak,
+}
+
+# 一个工作日的各个时段 (开始小时, 结束小时, 流量类型, 相对于峰值的流量比例)
+WORKDAY = [
+    (0, 7, "uniform", 0.02),
+    (7, 8, "up_peak", 0.5),
+    (8, 9, "up_peak", 1.0),
+    (9, 11, "uniform", 0.2),
+    (11, 12, "lunch", 0.4),
+    (12, 13, "lunch", 0.6),
+    (13, 17, "uniform", 0.2),
+    (17, 18, "down_peak", 1.0),
+    (18, 19, "down_peak", 0.5),
+    (19, 24, "uniform", 0.03),
+]
+
+
+# 一整天的交通 按WORKDAY依次切换时段 每个时段用自己的随机种子
+class DayTraffic:
+    def __init__(self, peak_rate, floors=ELEVATOR_FLOORS, seed=None, schedule=WORKDAY):
+        self.peak_rate = peak_rate  # 峰值时每小时的出行次数
+        self.floors = floors
+        self.seed = seed
+        self.schedule = schedule
+        self.segment = -1  # 当前时段的下标
+        self.stream = iter(())
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while True:
+            trip = next(self.stream, None)
+            if trip is not None:
+                return trip
+            self.segment += 1
+            if self.segment >= len(self.schedule):
+                raise StopIteration
+            start, end, pattern, share = self.schedule[self.segment]
+            seed = None if self.seed is None else self.seed * len(self.schedule) + self.segment
+            self.stream = PATTERNS[pattern](self.peak_rate * share, self.floors, seed, start * HOUR, end * HOUR)
+
+
+if __name__ == '__main__':
+    # 用法: python workload.py 流量类型 每小时出行次数 小时数 [随机种子]
+    # 流量类型为uniform/up_peak/lunch/down_peak/day 逐行输出 时刻(毫秒),起点,终点
+    pattern = sys.argv[1]
+    rate = float(sys.argv[2])
+    hours = float(sys.argv[3])
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    if pattern == "day":
+        trips = DayTraffic(rate, seed=seed)
+    else:
+        trips = PATTERNS[pattern](rate, seed=seed, until=hours * HOUR)
+    for trip in trips:
+        print(str(int(trip.time)) + "," + str(trip.origin) + "," + str(trip.destination))